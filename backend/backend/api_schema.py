@@ -0,0 +1,251 @@
+"""
+OpenAPI schema (drf_yasg) built once per code version instead of on every
+request: generating it walks every view and serializer.
+
+The schema is built by `manage.py build_api_schema` (at deploy time), or
+else on the first request for it, then kept in memory and on disk (in
+`CACHE_DIR`, one set of files per code version). It's served from there as
+JSON or YAML with precompressed gzip (and brotli, if the `brotli` package is
+installed) bodies, each with its own ETag (304 for `If-None-Match`).
+
+The code version is `settings.API_SCHEMA["CODE_VERSION"]`, else the
+`CODE_VERSION` env var, else the git commit checked out, else (and always
+with `DEBUG`, to see uncommitted changes) a hash of the sizes / mtimes of
+the project's `.py` files.
+
+Usage
+-----
+
+    GET /api/v1/schema.json  (or .yaml)
+
+    $ python manage.py build_api_schema
+"""
+import gzip
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict, NamedTuple, Optional
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.views import APIView
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+REPO_DIR = os.path.dirname(settings.BASE_DIR)
+
+DEFAULTS = {
+    "TITLE": "API",
+    "VERSION": "v1",
+    "CODE_VERSION": None,
+    "CACHE_DIR": os.path.join(REPO_DIR, "data", "local", "api_schema"),
+    # for clients: revalidate (cheap, with the ETag) after this long
+    "MAX_AGE": 300,
+}
+
+FORMATS = {"json": "application/json", "yaml": "application/yaml"}
+ENCODINGS = ("br", "gzip")  # (preferred first)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "API_SCHEMA", {})}
+
+
+class SchemaBody(NamedTuple):
+    """One format of the schema, with its precompressed variants."""
+
+    content: bytes
+    etag: str
+    encoded: Dict[str, bytes]  # encoding: body
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        """ETag of the body in `encoding` (None: identity): strong ETags must
+        differ between bodies that aren't byte for byte the same.
+        """
+        return self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+
+
+_schemas: Dict[str, Dict[str, SchemaBody]] = {}  # code version: format: body
+_lock = threading.Lock()
+_code_version: Optional[str] = None
+
+
+def get_code_version() -> str:
+    """(Found once per process, but with `DEBUG` where code reloads.)"""
+    global _code_version
+    if _code_version is None or settings.DEBUG:
+        _code_version = _find_code_version()
+    return _code_version
+
+
+def _find_code_version() -> str:
+    config = get_config()
+    version = config["CODE_VERSION"] or os.getenv("CODE_VERSION")
+    if not version and not settings.DEBUG:
+        version = _git_commit(REPO_DIR)
+    if version:
+        return version
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(settings.BASE_DIR):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d != "__pycache__")
+        for name in sorted(files):
+            if name.endswith(".py"):
+                st = os.stat(os.path.join(root, name))
+                h.update(f"{root}/{name}:{st.st_size}:{st.st_mtime_ns}".encode("utf-8"))
+    return "src-" + h.hexdigest()[:16]
+
+
+def _git_commit(repo_dir: str) -> Optional[str]:
+    """Commit checked out in `repo_dir`, read from `.git` (no `git` run)."""
+    git_dir = os.path.join(repo_dir, ".git")
+    try:
+        with open(os.path.join(git_dir, "HEAD")) as f:
+            head = f.read().strip()
+        if not head.startswith("ref: "):
+            return head  # (detached)
+        ref = head[5:]
+        try:
+            with open(os.path.join(git_dir, ref)) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            with open(os.path.join(git_dir, "packed-refs")) as f:
+                for line in f:
+                    if line.rstrip().endswith(" " + ref):
+                        return line.split()[0]
+    except OSError:
+        pass
+    return None
+
+
+def build_schema() -> Dict[str, bytes]:
+    """Generate the schema: `{format: content}`."""
+    from drf_yasg import openapi
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    config = get_config()
+    generator = OpenAPISchemaGenerator(openapi.Info(title=config["TITLE"], default_version=config["VERSION"]))
+    schema = generator.get_schema(request=None, public=True)
+    return {
+        "json": OpenAPICodecJson(validators=[]).encode(schema),
+        "yaml": OpenAPICodecYaml(validators=[]).encode(schema),
+    }
+
+
+def _schema_body(content: bytes) -> SchemaBody:
+    encoded = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encoded["br"] = brotli.compress(content)
+    return SchemaBody(content, '"%s"' % hashlib.sha256(content).hexdigest()[:32], encoded)
+
+
+def _cache_path(code_version: str, fmt: str) -> str:
+    safe_version = "".join(c if c.isalnum() or c in "-_." else "_" for c in code_version)
+    return os.path.join(get_config()["CACHE_DIR"], f"schema-{safe_version}.{fmt}")
+
+
+def _read_disk(code_version: str) -> Optional[Dict[str, bytes]]:
+    contents = {}
+    for fmt in FORMATS:
+        try:
+            with open(_cache_path(code_version, fmt), "rb") as f:
+                contents[fmt] = f.read()
+        except OSError:
+            return None
+    return contents
+
+
+def _write_disk(code_version: str, contents: Dict[str, bytes]):
+    os.makedirs(get_config()["CACHE_DIR"], exist_ok=True)
+    for fmt, content in contents.items():
+        path = _cache_path(code_version, fmt)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)  # (atomic, for concurrent workers)
+
+
+def get_schema(rebuild: bool = False) -> Dict[str, SchemaBody]:
+    """The schema of the current code version, `{format: body}`: from memory,
+    else from disk, else built (and saved).
+    """
+    code_version = get_code_version()
+    schema = _schemas.get(code_version)
+    if schema is not None and not rebuild:
+        return schema
+    with _lock:  # (built by one thread, the others wait for it)
+        schema = _schemas.get(code_version)
+        if schema is not None and not rebuild:
+            return schema
+        contents = None if rebuild else _read_disk(code_version)
+        if contents is None:
+            contents = build_schema()
+            try:
+                _write_disk(code_version, contents)
+            except OSError as exc:
+                logger.warning("Couldn't save the API schema in %s: %s", get_config()["CACHE_DIR"], exc)
+            logger.info("API schema built for code version %s", code_version)
+        schema = {fmt: _schema_body(content) for fmt, content in contents.items()}
+        _schemas.clear()  # (only the current version is served)
+        _schemas[code_version] = schema
+        return schema
+
+
+def _accepted_encoding(request, encoded: Dict[str, bytes]) -> Optional[str]:
+    """Encoding of `encoded` the client prefers (highest q-value, then
+    `ENCODINGS` order), None if it accepts none of them.
+    """
+    q_values = {}
+    for part in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        coding, *params = part.split(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        q_values[coding] = q
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = q_values.get(encoding, q_values.get("*", 0.0))
+        if encoding in encoded and q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class SchemaView(APIView):
+    """The OpenAPI schema, `fmt` "json" or "yaml" (default permissions)."""
+
+    swagger_schema = None  # (not in the schema itself)
+
+    def get(self, request, fmt="json"):
+        if fmt not in FORMATS:
+            raise Http404(f"No API schema format {fmt!r}")
+        body = get_schema()[fmt]
+        encoding = _accepted_encoding(request, body.encoded)
+        etag = body.etag_for(encoding)
+        if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                body.encoded[encoding] if encoding else body.content, content_type=FORMATS[fmt]
+            )
+            if encoding:
+                response["Content-Encoding"] = encoding
+        response["ETag"] = etag
+        response["Cache-Control"] = f"private, max-age={get_config()['MAX_AGE']}"
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
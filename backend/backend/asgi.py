@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+
+from .asgi_handler import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+# same as `django.core.asgi.get_asgi_application()`, but with our handler
+# that can stream responses reading from the DB (see `backend.asgi_handler`)
+django.setup(set_prefix=False)
+application = ASGIHandler()
@@ -0,0 +1,370 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import contextvars
+import functools
+import types
+
+from django.conf import settings
+from django.core import signals
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed, RequestAborted
+from django.core.handlers.asgi import ASGIHandler as DjangoASGIHandler
+from django.core.handlers.exception import response_for_exception
+from django.http import FileResponse
+from django.urls import Resolver404, URLResolver, get_resolver, set_script_prefix, set_urlconf
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.log import log_response
+from django.utils.module_loading import import_string
+
+from .async_db import run_in_db_thread
+
+
+def is_async_view(view):
+    """Whether `view` is served in the event loop (see `coreapp.api_async`)."""
+    return getattr(view, "async_view", None) is not None or asyncio.iscoroutinefunction(view)
+
+
+@functools.lru_cache(maxsize=None)
+def has_async_views(resolver) -> bool:
+    """Whether any view of `resolver` is async (cached, like Django caches resolvers)."""
+
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                if walk(pattern.url_patterns):
+                    return True
+            elif is_async_view(pattern.callback):
+                return True
+        return False
+
+    return walk(resolver.url_patterns)
+
+
+class RequestThreads:
+    """
+    Threads running the sync code of requests, `size` of them at most. A
+    request checks one out for its whole duration: all its sync calls run in
+    that thread, and no other request's until it's given back, so the DB
+    connections of a request (opened by the view, used while its response is
+    streamed, closed by `request_finished`) are its own. Requests wait for a
+    free thread when all are checked out.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._idle = []  # (single thread executors, last used first)
+        self._loop = None
+        self._semaphore = None
+
+    @contextlib.asynccontextmanager
+    async def checkout(self):
+        """Yields `run`: `await run(f, *args, **kwargs)` calls `f` in the thread."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:  # (asyncio primitives are bound to a loop)
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.size)
+        async with self._semaphore:
+            if self._idle:
+                executor = self._idle.pop()
+            else:
+                executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="asgi-request")
+            try:
+                yield functools.partial(self._run, loop, executor)
+            finally:
+                self._idle.append(executor)
+
+    @staticmethod
+    async def _run(loop, executor, f, *args, **kwargs):
+        # (in a copy of the context, like `sync_to_async`, eg. for the script prefix)
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(executor, functools.partial(context.run, f, *args, **kwargs))
+
+
+class ASGIHandler(DjangoASGIHandler):
+    """
+    Django's ASGI handler, except that all the sync work of a request
+    (`request_started`, the view, iterating streaming responses one part at a
+    time, `response.close()` / `request_finished`) runs in a thread of its own
+    (see `RequestThreads`, `ASGI_THREADS` setting, default 10), which it
+    doesn't share with other requests until it's done.
+
+    PROBLEMS IT SOLVES: Django 3.0
+    - iterates `StreamingHttpResponse` content right in the event loop, so a
+      generator reading from the DB (eg. a `queryset.iterator()`) raises
+      `SynchronousOnlyOperation`, and any slow generator blocks every other
+      request served by the worker
+    - runs the view in a thread pool thread but sends `request_finished` (which
+      closes / recycles DB connections, see `CONN_MAX_AGE`) from the event loop
+      thread, so connections opened by views are never closed or given back to
+      the pool (`backend.db.postgresql_pooled`), and every thread keeps its own
+    - runs all sync views in the one thread-sensitive thread, one at a time,
+      where streams would also interleave with the other requests' calls (and
+      their `request_finished` close the connection under a `.iterator()`)
+    - has no async views (added in Django 3.1): here views that are coroutine
+      functions, or carry their coroutine function as `async_view` (see
+      `coreapp.api_async`), run in the event loop and don't hold a request
+      thread, so a worker can have hundreds of requests waiting on slow I/O at
+      once. They go through the same middleware (see `load_async_middleware`),
+      whose sync calls, like the views' ORM calls, run in the DB threads of
+      `backend.async_db` (`ASYNC_DB_THREADS` setting). NOTE: `ATOMIC_REQUESTS`
+      doesn't apply to them.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.threads = RequestThreads(getattr(settings, "ASGI_THREADS", 10))
+        self._async_middleware_chain = None
+
+    async def __call__(self, scope, receive, send):
+        # (same as Django's, but in the request's thread)
+        if scope['type'] != 'http':
+            raise ValueError(
+                'Django can only handle ASGI/HTTP connections, not %s.'
+                % scope['type']
+            )
+        try:
+            body_file = await self.read_body(receive)
+        except RequestAborted:
+            return
+        set_script_prefix(self.get_script_prefix(scope))
+        match = self.resolve_async_view(scope)
+        if match is not None:
+            await self.handle_async(scope, body_file, send, match)
+            return
+        async with self.threads.checkout() as run:
+            await run(signals.request_started.send, sender=self.__class__, scope=scope)
+            request, error_response = self.create_request(scope, body_file)
+            if request is None:
+                await self.send_response(error_response, send, run)
+                return
+            response = await run(self.get_response, request)
+            response._handler_class = self.__class__
+            if isinstance(response, FileResponse):
+                response.block_size = self.chunk_size
+            await self.send_response(response, send, run)
+
+    def resolve_async_view(self, scope):
+        """The `ResolverMatch` of the request if its view is async, else None
+        (no resolving at all when the URLconf has no async views).
+        """
+        resolver = get_resolver()
+        if not has_async_views(resolver):
+            return None
+        # (same `path_info` as `ASGIRequest`'s)
+        script_name = scope.get("root_path", "")
+        path_info = scope["path"]
+        if script_name and path_info.startswith(script_name):
+            path_info = path_info[len(script_name):]
+        try:
+            match = resolver.resolve(path_info)
+        except Resolver404:
+            return None
+        return match if is_async_view(match.func) else None
+
+    async def handle_async(self, scope, body_file, send, match):
+        await run_in_db_thread(signals.request_started.send, sender=self.__class__, scope=scope)
+        request, error_response = self.create_request(scope, body_file)
+        if request is None:
+            await self.send_response(error_response, send, run_in_db_thread)
+            return
+        request.resolver_match = match
+        response = await self.get_async_response(request)
+        response._handler_class = self.__class__
+        if isinstance(response, FileResponse):
+            response.block_size = self.chunk_size
+        if response.streaming:
+            # (parts generated in one thread of their own, see `RequestThreads`)
+            async with self.threads.checkout() as run:
+                await self.send_response(response, send, run)
+        else:
+            await self.send_response(response, send, run_in_db_thread)
+
+    def load_async_middleware(self):
+        """Build the middleware chain of async views from `settings.MIDDLEWARE`,
+        like `load_middleware` does for the sync ones. Middleware must either
+        be a `MiddlewareMixin` (its `process_request` / `process_response`
+        are called in the DB threads) or have an `async_call(request)` method
+        awaiting `self.get_response(request)`.
+        """
+        view_middleware = []
+        template_response_middleware = []
+        exception_middleware = []
+
+        handler = self._convert_exception_to_response(
+            functools.partial(
+                self._get_async_view_response,
+                view_middleware,
+                template_response_middleware,
+                exception_middleware,
+            )
+        )
+        for middleware_path in reversed(settings.MIDDLEWARE):
+            middleware = import_string(middleware_path)
+            try:
+                mw_instance = middleware(handler)
+            except MiddlewareNotUsed:
+                continue
+            if hasattr(mw_instance, "async_call"):
+                layer = mw_instance.async_call
+            elif isinstance(mw_instance, MiddlewareMixin):
+                layer = functools.partial(self._call_middleware_mixin, mw_instance, handler)
+            else:
+                raise ImproperlyConfigured(
+                    "Middleware %s can't serve async views: make it a MiddlewareMixin, "
+                    "or give it an async_call() method." % middleware_path
+                )
+
+            if hasattr(mw_instance, "process_view"):
+                view_middleware.insert(0, mw_instance.process_view)
+            if hasattr(mw_instance, "process_template_response"):
+                template_response_middleware.append(mw_instance.process_template_response)
+            if hasattr(mw_instance, "process_exception"):
+                exception_middleware.append(mw_instance.process_exception)
+
+            handler = self._convert_exception_to_response(layer)
+
+        self._async_middleware_chain = handler
+
+    async def get_async_response(self, request):
+        # (same as `get_response`)
+        if self._async_middleware_chain is None:
+            self.load_async_middleware()
+        set_urlconf(settings.ROOT_URLCONF)
+        response = await self._async_middleware_chain(request)
+        response._resource_closers.append(request.close)
+        if response.status_code >= 400:
+            log_response(
+                "%s: %s", response.reason_phrase, request.path, response=response, request=request,
+            )
+        return response
+
+    @staticmethod
+    def _convert_exception_to_response(get_response):
+        # (same as Django's `convert_exception_to_response`)
+        @functools.wraps(get_response)
+        async def inner(request):
+            try:
+                return await get_response(request)
+            except Exception as exc:
+                return await run_in_db_thread(response_for_exception, request, exc)
+
+        return inner
+
+    @staticmethod
+    async def _call_middleware_mixin(middleware, get_response, request):
+        # (same as `MiddlewareMixin.__call__`)
+        response = None
+        if hasattr(middleware, "process_request"):
+            response = await run_in_db_thread(middleware.process_request, request)
+        response = response or await get_response(request)
+        if hasattr(middleware, "process_response"):
+            response = await run_in_db_thread(middleware.process_response, request, response)
+        return response
+
+    async def _get_async_view_response(
+        self, view_middleware, template_response_middleware, exception_middleware, request
+    ):
+        # (same as `_get_response`, the view resolved by `resolve_async_view`)
+        callback, callback_args, callback_kwargs = request.resolver_match
+        view = getattr(callback, "async_view", None) or callback
+
+        def process_exception(exc):
+            for middleware_method in exception_middleware:
+                response = middleware_method(request, exc)
+                if response:
+                    return response
+            raise exc
+
+        response = None
+        for middleware_method in view_middleware:
+            response = await run_in_db_thread(
+                middleware_method, request, callback, callback_args, callback_kwargs
+            )
+            if response:
+                break
+
+        if response is None:
+            try:
+                response = await view(request, *callback_args, **callback_kwargs)
+            except Exception as exc:
+                response = await run_in_db_thread(process_exception, exc)
+
+        if response is None:
+            view_name = callback.__name__ if isinstance(callback, types.FunctionType) else (
+                callback.__class__.__name__ + ".__call__"
+            )
+            raise ValueError(
+                "The view %s.%s didn't return an HttpResponse object. It "
+                "returned None instead." % (callback.__module__, view_name)
+            )
+
+        elif hasattr(response, "render") and callable(response.render):
+            # (templates and serializers can run queries, eg. lazy querysets)
+            for middleware_method in template_response_middleware:
+                response = await run_in_db_thread(middleware_method, request, response)
+                if response is None:
+                    raise ValueError(
+                        "%s.process_template_response didn't return an "
+                        "HttpResponse object. It returned None instead."
+                        % (middleware_method.__self__.__class__.__name__)
+                    )
+
+            try:
+                response = await run_in_db_thread(response.render)
+            except Exception as exc:
+                response = await run_in_db_thread(process_exception, exc)
+
+        return response
+
+    async def send_response(self, response, send, run):
+        """Send `response`, its sync calls awaited with `run`, and close it
+        (sending `request_finished`) even when sending fails (eg. the client
+        disconnected).
+        """
+        try:
+            await self._send_response(response, send, run)
+        finally:
+            await run(response.close)
+
+    async def _send_response(self, response, send, run):
+        # Collect cookies into headers (same as Django's `send_response`).
+        response_headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            response_headers.append((bytes(header), bytes(value)))
+        for c in response.cookies.values():
+            response_headers.append(
+                (b'Set-Cookie', c.output(header='').encode('ascii').strip())
+            )
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': response_headers,
+        })
+
+        if response.streaming:
+            done = object()
+            # Access `__iter__` and not `streaming_content` directly in case
+            # it has been overridden in a subclass.
+            parts = iter(response)
+            while True:
+                part = await run(next, parts, done)
+                if part is done:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+            await send({'type': 'http.response.body'})
+        else:
+            for chunk, last in self.chunk_bytes(response.content):
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': not last,
+                })
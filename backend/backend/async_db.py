@@ -0,0 +1,95 @@
+"""
+ORM access from async code: sync DB calls run on a dedicated pool of
+`ASYNC_DB_THREADS` threads (setting, default 10), so the event loop is never
+blocked and the number of DB connections opened for async work stays bounded
+(each thread keeps at most one connection per DB, closed / given back to the
+pool of `backend.db.postgresql_pooled` after each call as per `CONN_MAX_AGE`).
+
+Calls run in a copy of the caller's context (like `sync_to_async`), so
+context variables set by the middleware (eg. the DB routing's primary
+pinning) apply to them, as do the execute wrappers added with
+`execute_wrapper()` (eg. query recorders).
+
+Usage
+-----
+
+    from backend.async_db import db_sync_to_async, run_in_db_thread
+
+    user = await run_in_db_thread(User.objects.get, pk=1)
+
+    @db_sync_to_async
+    def get_titles(source_id):
+        return list(Item.objects.filter(source_id=source_id).values_list("title", flat=True))
+
+    titles = await get_titles(42)
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import contextvars
+import functools
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# execute wrappers of the DB calls made from the current context
+_execute_wrappers = contextvars.ContextVar("async_db_execute_wrappers", default=())
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "ASYNC_DB_THREADS", 10), thread_name_prefix="async-db"
+            )
+        return _executor
+
+
+@contextlib.contextmanager
+def execute_wrapper(wrapper):
+    """Like `connection.execute_wrapper(wrapper)`, for all the DBs, around the
+    DB calls run from the current context (eg. an async request).
+    """
+    token = _execute_wrappers.set((*_execute_wrappers.get(), wrapper))
+    try:
+        yield
+    finally:
+        _execute_wrappers.reset(token)
+
+
+def _call_closing_connections(f, args, kwargs):
+    # (like Django does around each request: drop obsolete / broken
+    # connections, and close or give back to the pool the ones not persistent)
+    close_old_connections()
+    try:
+        with contextlib.ExitStack() as stack:
+            for wrapper in _execute_wrappers.get():
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(wrapper))
+            return f(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_db_thread(f, *args, **kwargs):
+    """Await `f(*args, **kwargs)`, run in one of the DB threads."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_db_executor(), functools.partial(context.run, _call_closing_connections, f, args, kwargs)
+    )
+
+
+def db_sync_to_async(f):
+    """Decorator making sync function `f` an async one run in the DB threads."""
+
+    @functools.wraps(f)
+    async def wrapper(*args, **kwargs):
+        return await run_in_db_thread(f, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,233 @@
+"""
+Bounded pool of DB-API connections shared by the threads of a process, with
+health checks: an idle connection is pinged before it's handed out again
+when it was idle for more than `ping_after_s`, and recycled after
+`max_idle_s` idle or `max_age_s` since it was opened.
+
+Used by the `backend.db.postgresql_pooled` DB backend (see its docstring for
+settings). Stats of all pools (wait time, saturation...) are published as
+Prometheus metrics by `backend.instrumentation.metrics_view`.
+"""
+from collections import deque
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class _Pooled:
+    __slots__ = ("conn", "created_at", "released_at")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = self.released_at = time.monotonic()
+
+
+class ConnectionPool:
+    def __init__(self, name, connect, *, ping, reset, close, max_size=10, timeout_s=10.0,
+                 ping_after_s=30.0, max_idle_s=300.0, max_age_s=3600.0):
+        self.name = name
+        self.connect = connect
+        self.ping = ping
+        self.reset = reset
+        self.close = close
+        self.max_size = max_size
+        self.timeout_s = timeout_s
+        self.ping_after_s = ping_after_s
+        self.max_idle_s = max_idle_s
+        self.max_age_s = max_age_s
+
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.retired = False  # (replaced, see `get_pool`: connections are closed on release)
+        self.idle = deque()
+        self.in_use = {}  # id(conn) -> _Pooled
+
+        self.checkouts = 0
+        self.waits = 0  # checkouts that found the pool saturated
+        self.wait_s = 0.0
+        self.timeouts = 0
+        self.created = 0
+        self.discarded = 0
+        self.ping_failures = 0
+
+    def acquire(self):
+        if not self.slots.acquire(blocking=False):
+            t0 = time.monotonic()
+            acquired = self.slots.acquire(timeout=self.timeout_s)
+            with self.lock:
+                self.waits += 1
+                self.wait_s += time.monotonic() - t0
+                if not acquired:
+                    self.timeouts += 1
+            if not acquired:
+                raise PoolTimeout(
+                    f"No connection free in pool {self.name!r} after {self.timeout_s}s "
+                    f"({self.max_size} in use)"
+                )
+        try:
+            pooled = self._get_idle() or self._create()
+        except BaseException:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.checkouts += 1
+            self.in_use[id(pooled.conn)] = pooled
+        return pooled.conn
+
+    def release(self, conn, discard=False):
+        with self.lock:
+            pooled = self.in_use.pop(id(conn), None)
+        if pooled is None:
+            return  # (not ours / already released)
+        try:
+            if not discard:
+                try:
+                    self.reset(conn)
+                except Exception:
+                    discard = True
+            if discard or self.retired or self._expired(pooled, time.monotonic()):
+                self._discard(pooled)
+            else:
+                pooled.released_at = time.monotonic()
+                with self.lock:
+                    self.idle.append(pooled)
+        finally:
+            self.slots.release()
+
+    def close_all(self):
+        """Close the idle connections (in use ones are closed on release)."""
+        with self.lock:
+            idle, self.idle = list(self.idle), deque()
+        for pooled in idle:
+            self._discard(pooled)
+
+    def retire(self):
+        """Close all connections, the ones in use when released."""
+        self.retired = True
+        self.close_all()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "max_size": self.max_size,
+                "in_use": len(self.in_use),
+                "idle": len(self.idle),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "wait_seconds": self.wait_s,
+                "timeouts": self.timeouts,
+                "created": self.created,
+                "discarded": self.discarded,
+                "ping_failures": self.ping_failures,
+            }
+
+    def _get_idle(self):
+        while True:
+            with self.lock:
+                # most recently used first, so extra connections age out
+                pooled = self.idle.pop() if self.idle else None
+            if pooled is None:
+                return None
+            now = time.monotonic()
+            if self._expired(pooled, now) or now - pooled.released_at > self.max_idle_s:
+                self._discard(pooled)
+                continue
+            if now - pooled.released_at > self.ping_after_s:
+                try:
+                    self.ping(pooled.conn)
+                except Exception:
+                    logger.info("Discarding dead connection of pool %r", self.name)
+                    with self.lock:
+                        self.ping_failures += 1
+                    self._discard(pooled)
+                    continue
+            return pooled
+
+    def _create(self):
+        pooled = _Pooled(self.connect())
+        with self.lock:
+            self.created += 1
+        return pooled
+
+    def _expired(self, pooled, now):
+        return self.max_age_s is not None and now - pooled.created_at > self.max_age_s
+
+    def _discard(self, pooled):
+        with self.lock:
+            self.discarded += 1
+        try:
+            self.close(pooled.conn)
+        except Exception:
+            pass
+
+
+_pools = {}
+_pool_keys = {}  # name -> key the pool was made for
+_pools_lock = threading.Lock()
+
+
+def get_pool(name, make_pool, key=None):
+    """This process' pool `name`, made with `make_pool()` the first time, and
+    again whenever `key` (eg. the connection parameters) changed, retiring
+    the previous pool (eg. the test runner switching a DB to its test DB).
+    """
+    pool = _pools.get(name)
+    if pool is None or _pool_keys[name] != key:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None or _pool_keys[name] != key:
+                if pool is not None:
+                    logger.info("Replacing pool %r, its connection parameters changed", name)
+                    pool.retire()
+                pool = _pools[name] = make_pool()
+                _pool_keys[name] = key
+    return pool
+
+
+def all_pools():
+    return list(_pools.values())
+
+
+def close_all_pools():
+    for pool in all_pools():
+        pool.close_all()
+
+
+def render_prometheus():
+    """Prometheus text exposition of the stats of all pools."""
+    metrics = (
+        ("max_size", "max_size", "gauge", "Max connections of the pool"),
+        ("in_use", "in_use", "gauge", "Connections checked out"),
+        ("idle", "idle", "gauge", "Idle connections"),
+        ("checkouts", "checkouts_total", "counter", "Connections checked out"),
+        ("waits", "waits_total", "counter", "Checkouts that found all connections in use"),
+        ("wait_seconds", "wait_seconds_total", "counter", "Time spent waiting for a free connection"),
+        ("timeouts", "timeouts_total", "counter", "Checkouts that timed out waiting"),
+        ("created", "created_total", "counter", "Connections opened"),
+        ("discarded", "discarded_total", "counter", "Connections closed (dead, expired or broken)"),
+        ("ping_failures", "ping_failures_total", "counter", "Idle connections found dead by the health check"),
+    )
+    stats = [(pool.name, pool.stats()) for pool in all_pools()]
+    if not stats:
+        return ""
+    lines = []
+    for key, name, kind, help_text in metrics:
+        lines.append(f"# HELP backend_db_pool_{name} {help_text}")
+        lines.append(f"# TYPE backend_db_pool_{name} {kind}")
+        for pool_name, values in stats:
+            lines.append(f'backend_db_pool_{name}{{pool="{pool_name}"}} {values[key]}')
+    return "\n".join(lines) + "\n"
+
+
+if hasattr(os, "register_at_fork"):
+    # connections are never shared with child processes (eg. gunicorn workers
+    # forked from a preloaded master), they make their own pools
+    os.register_at_fork(after_in_child=_pools.clear)
+    os.register_at_fork(after_in_child=_pool_keys.clear)
@@ -0,0 +1,98 @@
+"""
+Django's PostgreSQL backend, with connections taken from / given back to a
+bounded pool (`backend.db.pool`) shared by all threads of the process,
+instead of opened / closed by each thread.
+
+Usage
+-----
+
+    DATABASES = {
+        "default": {
+            "ENGINE": "backend.db.postgresql_pooled",
+            ...,
+            # give connections back to the pool at the end of each request
+            "CONN_MAX_AGE": 0,
+            # optional, these are the defaults:
+            "POOL": {
+                "MAX_SIZE": 10,  # per process (so the DB budget is workers * MAX_SIZE)
+                "TIMEOUT_S": 10,  # wait for a free connection, then raise PoolTimeout
+                "PING_AFTER_S": 30,  # ping connections idle for longer before reuse
+                "MAX_IDLE_S": 300,
+                "MAX_AGE_S": 3600,
+            },
+        },
+    }
+"""
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+from psycopg2 import extensions
+
+from backend.db.pool import ConnectionPool, get_pool
+
+POOL_DEFAULTS = {
+    "MAX_SIZE": 10,
+    "TIMEOUT_S": 10.0,
+    "PING_AFTER_S": 30.0,
+    "MAX_IDLE_S": 300.0,
+    "MAX_AGE_S": 3600.0,
+}
+
+
+def _ping(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+def _reset(conn):
+    if conn.closed:
+        raise ConnectionError("connection closed")
+    if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+        conn.rollback()
+    # (so health check pings don't start transactions)
+    conn.autocommit = True
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+    _pool = None  # (the one `connection` was taken from)
+
+    def get_pool(self, conn_params):
+        def make_pool():
+            config = {**POOL_DEFAULTS, **self.settings_dict.get("POOL", {})}
+            return ConnectionPool(
+                self.alias,
+                lambda: self.Database.connect(**conn_params),
+                ping=_ping,
+                reset=_reset,
+                close=lambda conn: conn.close(),
+                max_size=config["MAX_SIZE"],
+                timeout_s=config["TIMEOUT_S"],
+                ping_after_s=config["PING_AFTER_S"],
+                max_idle_s=config["MAX_IDLE_S"],
+                max_age_s=config["MAX_AGE_S"],
+            )
+
+        # (a new pool when the settings change, eg. NAME to the test DB's)
+        return get_pool(self.alias, make_pool, key=conn_params)
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool(conn_params)
+        connection = pool.acquire()
+        self._pool = pool
+        # (same as the parent's)
+        options = self.settings_dict["OPTIONS"]
+        try:
+            self.isolation_level = options["isolation_level"]
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # Django keeps using a connection closed inside `atomic()` until the
+        # block exits (it only raises on queries), so never hand it out again
+        discard = self.in_atomic_block
+        with self.wrap_database_errors:
+            self._pool.release(self.connection, discard=discard)
@@ -16,7 +16,17 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+        "CONN_MAX_AGE": 60,
     },
+    # "default": {
+    #     "ENGINE": "backend.db.postgresql_pooled",
+    #     "NAME": "...",
+    #     "USER": "...",
+    #     "PASSWORD": "...",
+    #     "HOST": "localhost",
+    #     "CONN_MAX_AGE": 0,
+    #     "POOL": {"MAX_SIZE": 10},
+    # },
 }
 
 ENABLE_DJANGO_TOOLBAR = True
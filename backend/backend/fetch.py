@@ -0,0 +1,304 @@
+"""
+Shared HTTP fetch layer: pooled keep-alive connections, global and per-host
+concurrency limits, conditional GET (ETag / Last-Modified) and size-capped
+body streaming, with both sync and async APIs.
+
+Usage
+-----
+>>> from backend.fetch import get_default_fetcher
+>>> fetcher = get_default_fetcher()
+>>> r = fetcher.get("https://example.com/feed.xml")
+>>> r.status_code, r.from_cache, len(r.content)
+(200, False, 5123)
+
+...and from async code:
+
+>>> r = await fetcher.aget("https://example.com/feed.xml")
+
+Responses are regular `requests.Response` objects with the body already read
+(so the connection goes back to the pool), plus a `from_cache` attribute that
+is True when a conditional GET got a 304 and the cached response was returned.
+"""
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+import copy
+import threading
+from typing import Dict, Iterator, Mapping, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from .html_decode import iter_decode_html
+
+
+DEFAULT_MAX_BODY_BYTES = 10 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+# when the body isn't wanted, drain at most this much to keep the connection alive
+DRAIN_LIMIT_BYTES = 64 * 1024
+
+
+class BodyTooLarge(IOError):
+    pass
+
+
+class ConditionalCache:
+    """
+    LRU of `url -> last 200 response` carrying an ETag or Last-Modified,
+    bounded both by number of entries and total body bytes.
+    """
+
+    def __init__(self, maxsize: int = 10_000, max_bytes: int = 256 * 1024 * 1024):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, requests.Response]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[requests.Response]:
+        with self._lock:
+            r = self._entries.get(url)
+            if r is not None:
+                self._entries.move_to_end(url)
+            return r
+
+    def set(self, url: str, response: requests.Response) -> None:
+        if len(response.content) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(url, None)
+            if old is not None:
+                self.total_bytes -= len(old.content)
+            self._entries[url] = response
+            self.total_bytes += len(response.content)
+            while len(self._entries) > self.maxsize or self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted.content)
+
+    def validators(self, url: str) -> Dict[str, str]:
+        r = self.get(url)
+        if r is None:
+            return {}
+        headers = {}
+        if "ETag" in r.headers:
+            headers["If-None-Match"] = r.headers["ETag"]
+        if "Last-Modified" in r.headers:
+            headers["If-Modified-Since"] = r.headers["Last-Modified"]
+        return headers
+
+
+class Fetcher:
+    """
+    Thread-safe HTTP client meant to be shared by a whole worker process.
+
+    - one `requests.Session` whose adapter keeps up to `max_per_host` keep-alive
+      connections per host
+    - at most `max_connections` requests in flight overall and `max_per_host`
+      per host (extra callers wait)
+    - GETs are conditional when a previous 200 response had validators
+    - bodies are streamed and `BodyTooLarge` is raised past `max_body_bytes`
+    """
+
+    def __init__(
+        self,
+        *,
+        max_connections: int = 64,
+        max_per_host: int = 8,
+        timeout_s: float = 10.0,
+        max_body_bytes: int = DEFAULT_MAX_BODY_BYTES,
+        user_agent: Optional[str] = None,
+        conditional_cache_size: int = 10_000,
+    ):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout_s = timeout_s
+        self.max_body_bytes = max_body_bytes
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=max_connections, pool_maxsize=max_per_host
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if user_agent is not None:
+            self.session.headers["User-Agent"] = user_agent
+
+        self.conditional_cache = ConditionalCache(conditional_cache_size)
+        self._global_slots = threading.BoundedSemaphore(max_connections)
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_slots_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def _slots_for(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc.lower()
+        with self._host_slots_lock:
+            slots = self._host_slots.get(host)
+            if slots is None:
+                slots = self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return slots
+
+    def get(
+        self,
+        url: str,
+        *,
+        allow_redirects: bool = True,
+        headers: Optional[Mapping[str, str]] = None,
+        timeout_s: Optional[float] = None,
+        max_body_bytes: Optional[int] = None,
+        read_body: bool = True,
+        conditional: bool = True,
+    ) -> requests.Response:
+        """
+        GET `url`. With `read_body=False` only status and headers are wanted:
+        small bodies (eg. of redirects) are drained so the connection can be
+        reused, anything bigger is dropped with its connection.
+        """
+        req_headers = dict(headers or {})
+        if conditional and read_body:
+            req_headers.update(self.conditional_cache.validators(url))
+
+        with self._open(url, allow_redirects, req_headers, timeout_s) as r:
+            if read_body:
+                self._read_body(r, self.max_body_bytes if max_body_bytes is None else max_body_bytes)
+            else:
+                self._drain(r)
+
+        r.from_cache = False
+        if conditional and read_body:
+            if r.status_code == 304:
+                cached = self.conditional_cache.get(url)
+                if cached is not None:
+                    cached = copy.copy(cached)
+                    cached.from_cache = True
+                    return cached
+            elif r.status_code == 200 and ("ETag" in r.headers or "Last-Modified" in r.headers):
+                self.conditional_cache.set(url, r)
+        return r
+
+    def iter_html(
+        self,
+        url: str,
+        *,
+        headers: Optional[Mapping[str, str]] = None,
+        timeout_s: Optional[float] = None,
+        max_body_bytes: Optional[int] = None,
+    ) -> Iterator[str]:
+        """
+        GET `url` and yield its body decoded to text piece by piece as it
+        arrives (see `backend.html_decode.iter_decode_html`), never holding
+        the whole body in memory. Not conditional, raises on non-2xx statuses.
+
+        The connection and the concurrency slots are held until the body has
+        been read: exhaust the generator, or `close()` it (eg. with
+        `contextlib.closing`) when stopping early.
+        """
+        max_body_bytes = self.max_body_bytes if max_body_bytes is None else max_body_bytes
+        with ExitStack() as stack:
+            r = stack.enter_context(self._open(url, True, dict(headers or {}), timeout_s))
+            r.raise_for_status()
+            release = stack.pop_all()
+
+        def chunks():
+            yield from self._iter_capped(r, max_body_bytes)
+            release.close()  # (as soon as the body is read, before the last text is)
+
+        try:
+            yield from iter_decode_html(chunks(), r.headers.get("Content-Type"))
+        finally:
+            release.close()
+
+    @contextmanager
+    def _open(self, url, allow_redirects, headers, timeout_s) -> Iterator[requests.Response]:
+        # (per host first: callers waiting on a busy host don't hold global slots)
+        with self._slots_for(url), self._global_slots:
+            r = self.session.get(
+                url,
+                allow_redirects=allow_redirects,
+                headers=headers,
+                timeout=self.timeout_s if timeout_s is None else timeout_s,
+                stream=True,
+            )
+            try:
+                yield r
+            finally:
+                r.close()
+
+    @staticmethod
+    def _iter_capped(r: requests.Response, max_body_bytes: int) -> Iterator[bytes]:
+        content_length = r.headers.get("Content-Length")
+        if content_length and content_length.isdigit() and int(content_length) > max_body_bytes:
+            raise BodyTooLarge(f"Response body too large: {r.url}, {content_length} bytes")
+        size = 0
+        for chunk in r.iter_content(CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_body_bytes:
+                raise BodyTooLarge(f"Response body too large: {r.url}, >{max_body_bytes} bytes")
+            yield chunk
+
+    @classmethod
+    def _read_body(cls, r: requests.Response, max_body_bytes: int) -> None:
+        r._content = b"".join(cls._iter_capped(r, max_body_bytes))
+        r._content_consumed = True
+
+    @staticmethod
+    def _drain(r: requests.Response) -> None:
+        """Read and drop the body, so the connection goes back to the pool,
+        when it's small enough, else close the connection.
+        """
+        content_length = r.headers.get("Content-Length")
+        drained = False
+        if content_length and content_length.isdigit() and int(content_length) <= DRAIN_LIMIT_BYTES:
+            try:
+                drained = len(r.raw.read(int(content_length), decode_content=False)) == int(content_length)
+            except Exception:
+                pass  # (closed below)
+        if not drained:
+            # (`r.close()` would give the connection back to the pool with the
+            # body still unread when `_content_consumed`)
+            r.raw.close()
+        r._content = b""
+        r._content_consumed = True
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_connections, thread_name_prefix="fetcher"
+                )
+            return self._executor
+
+    async def aget(self, url: str, **kwargs) -> requests.Response:
+        """Async version of `get`, same arguments (runs on the fetcher's own threads)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: self.get(url, **kwargs))
+
+    def close(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        self.session.close()
+
+
+_default_fetcher: Optional[Fetcher] = None
+_default_fetcher_lock = threading.Lock()
+
+
+def get_default_fetcher() -> Fetcher:
+    """Process-wide `Fetcher` with default limits."""
+    global _default_fetcher
+    with _default_fetcher_lock:
+        if _default_fetcher is None:
+            _default_fetcher = Fetcher()
+        return _default_fetcher
+
+
+def fetch(url: str, **kwargs) -> requests.Response:
+    return get_default_fetcher().get(url, **kwargs)
+
+
+async def afetch(url: str, **kwargs) -> requests.Response:
+    return await get_default_fetcher().aget(url, **kwargs)
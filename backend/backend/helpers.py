@@ -16,16 +16,32 @@ from datetime import datetime
 
 
 def make_json_convertible(data):
-    out_data = data
+    """Turn datetimes and sets nested in dicts / lists into JSON friendly types.
+
+    Containers are only copied when something inside them actually changes,
+    otherwise `data` itself is returned. For serialising there's no need to
+    call this at all, `backend.jsonlib.dumps` handles these types directly.
+    """
     if isinstance(data, datetime):
-        out_data = data.isoformat()
+        return data.isoformat()
     elif isinstance(data, set):
-        out_data = list(data)
+        return list(data)
     elif isinstance(data, dict):
-        out_data = {}
+        out_data = None
         for k, v in data.items():
-            out_data[k] = make_json_convertible(v)
+            out_v = make_json_convertible(v)
+            if out_v is not v:
+                if out_data is None:
+                    out_data = dict(data)
+                out_data[k] = out_v
+        return data if out_data is None else out_data
     elif isinstance(data, list):
-        out_data = [make_json_convertible(it)
-                    for it in data]
-    return out_data
+        out_data = None
+        for i, it in enumerate(data):
+            out_it = make_json_convertible(it)
+            if out_it is not it:
+                if out_data is None:
+                    out_data = list(data)
+                out_data[i] = out_it
+        return data if out_data is None else out_data
+    return data
@@ -0,0 +1,127 @@
+"""
+Charset sniffing and single-pass decoding of HTML bodies.
+
+The encoding is picked only once, looking at (in this order, like browsers do):
+a BOM, the `charset` of the Content-Type header, and `<meta>` / XML
+declarations in the first `SNIFF_BYTES` of the body. If none is found we guess
+between UTF-8 and windows-1252 from those same first bytes. The body is then
+decoded exactly once, either whole (`decode_html`) or one chunk at a time
+(`iter_decode_html`) so only the small sniffing buffer is ever held as bytes.
+"""
+import codecs
+import re
+from typing import Iterable, Iterator, Optional, Union
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+SNIFF_BYTES = 4096
+DEFAULT_ENCODING = "utf-8"
+FALLBACK_ENCODING = "cp1252"
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+_HEADER_CHARSET_RE = re.compile(r"charset\s*=\s*[\"']?\s*([\w.:+-]+)", re.I)
+_META_CHARSET_RE = re.compile(rb"<meta[^>]+?charset\s*=\s*[\"']?\s*([\w.:+-]+)", re.I)
+_XML_ENCODING_RE = re.compile(rb"^\s*<\?xml[^>]+?encoding\s*=\s*[\"']\s*([\w.:+-]+)", re.I)
+
+
+def normalize_encoding(name: Optional[Union[str, bytes]]) -> Optional[str]:
+    """Python codec name for a charset label, or None if unknown.
+
+    Latin-1 and ASCII labels map to windows-1252, like all browsers do.
+    """
+    if not name:
+        return None
+    if isinstance(name, bytes):
+        name = name.decode("ascii", errors="ignore")
+    try:
+        codec_name = codecs.lookup(name.strip()).name
+    except LookupError:
+        return None
+    if codec_name in ("latin-1", "iso8859-1", "ascii"):
+        return FALLBACK_ENCODING
+    return codec_name
+
+
+def _looks_like_utf8(head: BytesLike, truncated: bool) -> bool:
+    try:
+        str(head, "utf-8")
+    except UnicodeDecodeError as exc:
+        # a multi-byte sequence cut at the end of the sniffing window is fine
+        return truncated and exc.reason == "unexpected end of data" and exc.end == len(head)
+    return True
+
+
+def sniff_encoding(
+    head: BytesLike, content_type: Optional[str] = None, truncated: Optional[bool] = None
+) -> str:
+    """Pick the encoding of a document from its first bytes and Content-Type.
+
+    `truncated`: whether the document goes on after `head` (by default, when
+    `head` is longer than `SNIFF_BYTES`).
+    """
+    head = memoryview(head)
+    if truncated is None:
+        truncated = len(head) > SNIFF_BYTES
+    head = head[:SNIFF_BYTES]
+    for bom, encoding in _BOMS:
+        if head[: len(bom)] == bom:
+            return encoding
+
+    if content_type:
+        m = _HEADER_CHARSET_RE.search(content_type)
+        encoding = normalize_encoding(m.group(1)) if m else None
+        if encoding:
+            return encoding
+
+    m = _XML_ENCODING_RE.search(head) or _META_CHARSET_RE.search(head)
+    encoding = normalize_encoding(m.group(1)) if m else None
+    # a <meta> can't truthfully declare an ASCII-incompatible encoding
+    if encoding and not encoding.startswith(("utf-16", "utf-32")):
+        return encoding
+
+    return DEFAULT_ENCODING if _looks_like_utf8(head, truncated) else FALLBACK_ENCODING
+
+
+def decode_html(body: BytesLike, content_type: Optional[str] = None, errors: str = "replace") -> str:
+    """Decode a whole body in one pass (no intermediate copies of `body`)."""
+    return str(body, sniff_encoding(body, content_type), errors)
+
+
+def iter_decode_html(
+    chunks: Iterable[BytesLike],
+    content_type: Optional[str] = None,
+    errors: str = "replace",
+) -> Iterator[str]:
+    """
+    Decode a body arriving as `chunks` (eg. `response.iter_content(...)`),
+    yielding text pieces. At most `SNIFF_BYTES` (+ one chunk) are buffered
+    before the encoding is known, after that each chunk is decoded as it comes.
+    """
+    chunks = iter(chunks)
+    head = bytearray()
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= SNIFF_BYTES:
+            break
+
+    # (a full head may have been cut by the chunking, more chunks may follow)
+    encoding = sniff_encoding(head, content_type, truncated=len(head) >= SNIFF_BYTES)
+    decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+    text = decoder.decode(head)
+    del head
+    if text:
+        yield text
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
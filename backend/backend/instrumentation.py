@@ -0,0 +1,282 @@
+"""
+Production-safe request instrumentation: per-view wall time, DB query count,
+SQL time, render (serialisation) time and response size, for a sample of
+requests, plus automatic flagging of N+1 query patterns.
+
+Configured by `settings.PERF_METRICS` (see `DEFAULTS` below for all keys):
+
+    PERF_METRICS = {
+        "SAMPLE_RATE": 0.05,  # 0 (default) disables the middleware entirely
+        "EXPORTERS": ["prometheus", "file"],  # and/or "statsd"
+    }
+
+Exporters:
+- "prometheus": aggregates in-process, served as Prometheus text by
+  `metrics_view` (`/metrics`, only to `ALLOWED_IPS` or staff users). NOTE:
+  each worker process has its own numbers, scrape them all or use statsd.
+- "statsd": one UDP packet per metric per sampled request (never blocks)
+- "file": one JSON line per sampled request appended to `FILE_PATH`
+
+`metrics_view` also serves the stats of the DB connection pools (see
+`backend.db.pool`), for all requests, sampled or not.
+
+With `SAMPLE_RATE` 0 the middleware raises `MiddlewareNotUsed`, so Django
+drops it at startup and it costs nothing at all.
+"""
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+import logging
+import random
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+from . import async_db, jsonlib
+from .db import pool as db_pool
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "SAMPLE_RATE": 0.0,
+    "EXPORTERS": ["prometheus"],
+    "FILE_PATH": "perf_metrics.ndjson",
+    "STATSD_HOST": "127.0.0.1",
+    "STATSD_PORT": 8125,
+    "STATSD_PREFIX": "backend",
+    # same SQL (modulo params) run this many times in a request => N+1 suspect
+    "N_PLUS_ONE_THRESHOLD": 10,
+    # REMOTE_ADDRs allowed to read `/metrics` (staff users always are), eg.
+    # the Prometheus server's. NOT "127.0.0.1" behind a local reverse proxy:
+    # every request would come from there
+    "ALLOWED_IPS": [],
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "PERF_METRICS", {})}
+
+
+class QueryRecorder:
+    """`connection.execute_wrapper` counting queries and SQL time."""
+
+    def __init__(self):
+        self.count = 0
+        self.time_s = 0.0
+        self.sql_counts = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time_s += time.perf_counter() - t0
+            self.count += 1
+            self.sql_counts[sql] += 1
+
+
+class Sample:
+    __slots__ = ("view", "method", "status", "wall_s", "db_count", "db_time_s", "render_s", "size", "n_plus_one")
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+class PrometheusExporter:
+    """In-process aggregation of samples per (view, method)."""
+
+    metrics = (
+        ("requests_total", "counter", "Sampled requests"),
+        ("request_seconds_total", "counter", "Wall time of sampled requests"),
+        ("db_queries_total", "counter", "DB queries of sampled requests"),
+        ("db_seconds_total", "counter", "SQL time of sampled requests"),
+        ("render_seconds_total", "counter", "Response rendering (serialisation) time of sampled requests"),
+        ("response_bytes_total", "counter", "Response body size of sampled requests"),
+        ("n_plus_one_total", "counter", "Sampled requests flagged as having N+1 queries"),
+    )
+
+    def __init__(self, config):
+        self.lock = threading.Lock()
+        self.values = defaultdict(lambda: [0, 0.0, 0, 0.0, 0.0, 0, 0])
+
+    def export(self, sample):
+        with self.lock:
+            v = self.values[(sample.view, sample.method)]
+            v[0] += 1
+            v[1] += sample.wall_s
+            v[2] += sample.db_count
+            v[3] += sample.db_time_s
+            v[4] += sample.render_s or 0.0
+            v[5] += sample.size or 0
+            v[6] += 1 if sample.n_plus_one else 0
+
+    def render(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        lines = []
+        for i, (name, kind, help_text) in enumerate(self.metrics):
+            lines.append(f"# HELP backend_{name} {help_text}")
+            lines.append(f"# TYPE backend_{name} {kind}")
+            for (view, method), v in items:
+                lines.append(f'backend_{name}{{view="{_escape(view)}",method="{method}"}} {v[i]}')
+        return "\n".join(lines) + "\n"
+
+
+class StatsdExporter:
+    def __init__(self, config):
+        self.addr = (config["STATSD_HOST"], config["STATSD_PORT"])
+        self.prefix = config["STATSD_PREFIX"]
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    def export(self, sample):
+        key = f"{self.prefix}.{_statsd_key(sample.view)}.{sample.method.lower()}"
+        lines = [
+            f"{key}.requests:1|c",
+            f"{key}.wall:{sample.wall_s * 1000:.3f}|ms",
+            f"{key}.db_queries:{sample.db_count}|h",
+            f"{key}.db:{sample.db_time_s * 1000:.3f}|ms",
+        ]
+        if sample.render_s is not None:
+            lines.append(f"{key}.render:{sample.render_s * 1000:.3f}|ms")
+        if sample.size is not None:
+            lines.append(f"{key}.response_bytes:{sample.size}|h")
+        if sample.n_plus_one:
+            lines.append(f"{key}.n_plus_one:1|c")
+        try:
+            self.sock.sendto("\n".join(lines).encode("utf-8"), self.addr)
+        except OSError:
+            pass  # metrics must never break requests
+
+
+class FileExporter:
+    def __init__(self, config):
+        self.path = config["FILE_PATH"]
+        self.lock = threading.Lock()
+
+    def export(self, sample):
+        line = jsonlib.dumps_bytes({"ts": time.time(), **sample.as_dict()}) + b"\n"
+        with self.lock, open(self.path, "ab") as f:
+            f.write(line)
+
+
+EXPORTER_CLASSES = {
+    "prometheus": PrometheusExporter,
+    "statsd": StatsdExporter,
+    "file": FileExporter,
+}
+_exporters = {}
+
+
+def get_exporter(name):
+    if name not in _exporters:
+        _exporters[name] = EXPORTER_CLASSES[name](get_config())
+    return _exporters[name]
+
+
+class PerfMetricsMiddleware:
+    def __init__(self, get_response):
+        config = get_config()
+        self.sample_rate = config["SAMPLE_RATE"]
+        if not self.sample_rate:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.n_plus_one_threshold = config["N_PLUS_ONE_THRESHOLD"]
+        self.exporters = [get_exporter(name) for name in config["EXPORTERS"]]
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        request._perf_render_s = None
+        t0 = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+        wall_s = time.perf_counter() - t0
+
+        try:
+            self.record(request, response, recorder, wall_s)
+        except Exception:  # metrics must never break requests
+            logger.exception("Failed to record perf metrics")
+        return response
+
+    async def async_call(self, request):
+        # (async views, see `backend.asgi_handler`: their queries run in the DB threads)
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        recorder = QueryRecorder()
+        request._perf_render_s = None
+        t0 = time.perf_counter()
+        with async_db.execute_wrapper(recorder):
+            response = await self.get_response(request)
+        wall_s = time.perf_counter() - t0
+
+        try:
+            await async_db.run_in_db_thread(self.record, request, response, recorder, wall_s)
+        except Exception:  # metrics must never break requests
+            logger.exception("Failed to record perf metrics")
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF `Response`s are rendered (ie. serialised) after this, time it
+        if hasattr(request, "_perf_render_s"):
+            t0 = time.perf_counter()
+
+            def done(response):
+                request._perf_render_s = time.perf_counter() - t0
+
+            response.add_post_render_callback(done)
+        return response
+
+    def record(self, request, response, recorder, wall_s):
+        sample = Sample()
+        match = getattr(request, "resolver_match", None)
+        sample.view = (match.view_name or match._func_path) if match else "<unresolved>"
+        sample.method = request.method
+        sample.status = response.status_code
+        sample.wall_s = wall_s
+        sample.db_count = recorder.count
+        sample.db_time_s = recorder.time_s
+        sample.render_s = request._perf_render_s
+        sample.size = None if response.streaming else len(response.content)
+        sample.n_plus_one = None
+        if recorder.sql_counts:
+            sql, n = recorder.sql_counts.most_common(1)[0]
+            if n >= self.n_plus_one_threshold:
+                sample.n_plus_one = {"sql": sql[:500], "count": n}
+                logger.warning(
+                    "Possible N+1 queries in %s %s: %d x %s", sample.method, sample.view, n, sql[:200]
+                )
+        for exporter in self.exporters:
+            exporter.export(sample)
+
+
+def metrics_view(request):
+    """Prometheus text exposition of the "prometheus" exporter's numbers and
+    of the DB connection pools."""
+    config = get_config()
+    allowed = request.META.get("REMOTE_ADDR") in config["ALLOWED_IPS"] or (
+        request.user.is_authenticated and request.user.is_staff
+    )
+    if not allowed:
+        return HttpResponseForbidden()
+    body = db_pool.render_prometheus()
+    if "prometheus" in config["EXPORTERS"] and config["SAMPLE_RATE"]:
+        body = get_exporter("prometheus").render() + body
+    return HttpResponse(body, content_type="text/plain; version=0.0.4")
+
+
+def _escape(label_value):
+    return label_value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _statsd_key(view):
+    return "".join(c if c.isalnum() or c in "_-" else "_" for c in view)
@@ -0,0 +1,125 @@
+"""
+JSON serialisation backend: `orjson` when installed, stdlib `json` otherwise.
+
+Usage
+-----
+>>> dumps({"at": dtm.datetime(2020, 4, 24, 6, 53), "tags": {"a"}})
+'{"at":"2020-04-24T06:53:00","tags":["a"]}'
+>>> dumps_bytes(data)  # skips the bytes -> str decode when writing to sockets/files
+>>> dump(data, fp)  # fp: binary or text stream
+
+Output is compact by default (`indent=2` for humans). Besides what plain
+JSON supports, datetimes / dates / times, sets, Decimals (as strings, to keep
+precision), UUIDs and objects with a `_json` attribute are handled while
+encoding, no pre-walk copy of the data (like `make_json_convertible`) needed.
+Anything else unknown is serialised as `str(o)`.
+
+Both backends give the same output: NaN and +/-Infinity (not valid JSON)
+are written as `null` (orjson's behaviour), and rejected when parsing.
+"""
+import datetime as dtm
+from decimal import Decimal
+import io
+import json
+import math
+from typing import IO, Any, Optional
+import uuid
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def default(o: Any) -> Any:
+    """Converter for types plain JSON doesn't support (stdlib `default=` style)."""
+    if isinstance(o, (dtm.datetime, dtm.date, dtm.time)):
+        return o.isoformat()
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    if isinstance(o, (Decimal, uuid.UUID)):
+        return str(o)
+    if hasattr(o, "_json"):
+        return o._json
+    return str(o)
+
+
+if orjson is not None:
+    _ORJSON_OPTS = orjson.OPT_NON_STR_KEYS
+
+    def _orjson_dumps(data: Any, indent: Optional[int], sort_keys: bool) -> Optional[bytes]:
+        if indent not in (None, 2):
+            return None
+        opts = _ORJSON_OPTS
+        if indent:
+            opts |= orjson.OPT_INDENT_2
+        if sort_keys:
+            opts |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(data, default=default, option=opts)
+        except TypeError:  # eg. ints > 64 bits, let stdlib handle these
+            return None
+
+
+def _stdlib_dumps(data: Any, indent: Optional[int], sort_keys: bool) -> str:
+    kwargs = dict(
+        indent=indent,
+        sort_keys=sort_keys,
+        ensure_ascii=False,
+        separators=(",", ": ") if indent else (",", ":"),
+        allow_nan=False,
+    )
+    try:
+        return json.dumps(data, default=default, **kwargs)
+    except ValueError as e:
+        if not str(e).startswith("Out of range float"):
+            raise
+    # (rare: only then is the data copied, with the non-finite floats as None)
+    return json.dumps(_finite(data), default=lambda o: _finite(default(o)), **kwargs)
+
+
+def _finite(data: Any) -> Any:
+    if isinstance(data, float):
+        return data if math.isfinite(data) else None
+    if isinstance(data, dict):
+        return {k: _finite(v) for k, v in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [_finite(v) for v in data]
+    return data
+
+
+def _reject_constant(name: str):
+    raise ValueError(f"Invalid JSON constant: {name}")
+
+
+def dumps_bytes(data: Any, indent: Optional[int] = None, sort_keys: bool = False) -> bytes:
+    """Serialise to UTF-8 encoded JSON."""
+    if orjson is not None:
+        out = _orjson_dumps(data, indent, sort_keys)
+        if out is not None:
+            return out
+    return _stdlib_dumps(data, indent, sort_keys).encode("utf-8")
+
+
+def dumps(data: Any, indent: Optional[int] = None, sort_keys: bool = False) -> str:
+    if orjson is not None:
+        out = _orjson_dumps(data, indent, sort_keys)
+        if out is not None:
+            return out.decode("utf-8")
+    return _stdlib_dumps(data, indent, sort_keys)
+
+
+def dump(data: Any, fp: IO, indent: Optional[int] = None, sort_keys: bool = False) -> None:
+    """Write JSON to a binary (bytes written directly) or text stream."""
+    if isinstance(fp, io.TextIOBase):
+        fp.write(dumps(data, indent=indent, sort_keys=sort_keys))
+    else:
+        fp.write(dumps_bytes(data, indent=indent, sort_keys=sort_keys))
+
+
+def loads(s: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(s)
+    return json.loads(s, parse_constant=_reject_constant)
@@ -0,0 +1,268 @@
+"""
+Running many commands concurrently (eg. from maintenance scripts looping over
+thousands of items), with their output streamed line by line to callbacks
+or files instead of held in memory.
+
+Commands run in a bounded pool (`concurrency` at once), each in its own
+process group so a timeout or a cancellation (eg. Ctrl+C, or the first
+failure without `can_fail`) kills it with everything it started.
+
+Usage
+-----
+
+    from backend.procs import run_many
+
+    results = run_many(
+        [["convert", path, path + ".webp"] for path in paths],
+        concurrency=8,
+        timeout_s=60,
+        can_fail=True,
+        on_stderr=lambda i, line: print(i, line.decode(errors="replace"), end=""),
+    )
+    failed = [r.cmd for r in results if not r.ok]
+
+    # or, from async code, one command:
+    result = await arun(["pg_dump", "mydb"], stdout_path="mydb.sql", timeout_s=3600)
+"""
+import asyncio
+import collections
+import os
+import signal
+import time
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional, Sequence
+
+from .utils import err_print, ts_print
+
+# lines longer than this are passed on in pieces
+MAX_LINE_BYTES = 2 ** 20
+# seconds between SIGTERM and SIGKILL when stopping a command
+KILL_GRACE_S = 5.0
+# stderr lines kept (even when streamed) for error messages
+ERR_TAIL_LINES = 20
+
+LineCallback = Callable[[bytes], Any]
+
+
+class RunResult(NamedTuple):
+    cmd: Sequence[str]
+    returncode: Optional[int]  # (None if it couldn't be started)
+    out: Optional[bytes]  # (None when streamed to a callback / file)
+    err: Optional[bytes]
+    err_tail: bytes  # last stderr lines, streamed or not
+    seconds: float
+    timed_out: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+
+class CommandError(Exception):
+    """A command exited with an error, or timed out."""
+
+    def __init__(self, result: RunResult):
+        super().__init__("Error executing command", " ".join(result.cmd), result.returncode, result.err_tail)
+        self.result = result
+
+
+async def arun(
+    cmd: Sequence[str],
+    *,
+    cinput: Optional[bytes] = None,
+    shell: bool = False,
+    cwd: Optional[str] = None,
+    env: Optional[dict] = None,
+    on_stdout: Optional[LineCallback] = None,
+    on_stderr: Optional[LineCallback] = None,
+    stdout_path: Optional[str] = None,
+    stderr_path: Optional[str] = None,
+    timeout_s: Optional[float] = None,
+    can_fail: bool = False,
+    echo: bool = True,
+) -> RunResult:
+    """Run `cmd`, its output lines (bytes, with their "\\n") going to
+    `on_stdout` / `on_stderr` and / or the files at `stdout_path` /
+    `stderr_path`, and collected in the result only when going to neither.
+    Raises `CommandError` on failure (or timeout) unless `can_fail`.
+    """
+    if echo:
+        ts_print("+", " ".join(cmd))
+    t0 = time.perf_counter()
+    err_tail = collections.deque(maxlen=ERR_TAIL_LINES)
+    try:
+        if shell:
+            proc = await asyncio.create_subprocess_shell(
+                " ".join(cmd), stdin=asyncio.subprocess.PIPE if cinput is not None else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                cwd=cwd, env=env, start_new_session=True,
+            )
+        else:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdin=asyncio.subprocess.PIPE if cinput is not None else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                cwd=cwd, env=env, start_new_session=True,
+            )
+    except OSError as exc:
+        if echo:
+            err_print("ERROR (exception):", exc)
+        if not can_fail:
+            raise
+        err = str(exc).encode("utf-8", errors="ignore")
+        return RunResult(cmd, None, b"", err, err, time.perf_counter() - t0)
+
+    out_sink = _Sink(on_stdout, stdout_path)
+    err_sink = _Sink(on_stderr, stderr_path, err_tail)
+    timed_out = False
+    try:
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    _feed(proc.stdin, cinput),
+                    _pump(proc.stdout, out_sink),
+                    _pump(proc.stderr, err_sink),
+                    proc.wait(),
+                ),
+                timeout_s,
+            )
+        except asyncio.TimeoutError:
+            timed_out = True
+            await _stop(proc)
+        except asyncio.CancelledError:
+            _kill_group(proc, signal.SIGKILL)
+            await proc.wait()
+            raise
+    finally:
+        out_sink.close()
+        err_sink.close()
+
+    result = RunResult(
+        cmd, proc.returncode, out_sink.captured(), err_sink.captured(), b"".join(err_tail),
+        time.perf_counter() - t0, timed_out,
+    )
+    if not result.ok:
+        if echo:
+            err_print("ERROR (%s):" % ("timeout" if timed_out else "code %d" % proc.returncode), result.err_tail)
+        if not can_fail:
+            raise CommandError(result)
+    return result
+
+
+async def arun_many(
+    cmds: Iterable[Sequence[str]],
+    *,
+    concurrency: Optional[int] = None,
+    on_stdout: Optional[Callable[[int, bytes], Any]] = None,
+    on_stderr: Optional[Callable[[int, bytes], Any]] = None,
+    log_dir: Optional[str] = None,
+    can_fail: bool = False,
+    **kwargs,
+) -> List[RunResult]:
+    """Run `cmds`, `concurrency` (default: the number of CPUs) at a time,
+    returning their results in the same order. Output lines go to
+    `on_stdout(i, line)` / `on_stderr(i, line)` (`i`: the index of the
+    command), and / or to `<log_dir>/<i>.out` / `<i>.err` files. Without
+    `can_fail` the first failure stops all the others and raises its
+    `CommandError`. Other keyword arguments are passed to `arun`.
+    """
+    cmds = list(cmds)
+    semaphore = asyncio.Semaphore(concurrency or os.cpu_count() or 1)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+
+    async def run_one(i, cmd):
+        async with semaphore:
+            return await arun(
+                cmd,
+                on_stdout=(lambda line: on_stdout(i, line)) if on_stdout else None,
+                on_stderr=(lambda line: on_stderr(i, line)) if on_stderr else None,
+                stdout_path=os.path.join(log_dir, f"{i}.out") if log_dir else None,
+                stderr_path=os.path.join(log_dir, f"{i}.err") if log_dir else None,
+                can_fail=can_fail,
+                **kwargs,
+            )
+
+    tasks = [asyncio.ensure_future(run_one(i, cmd)) for i, cmd in enumerate(cmds)]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        # (on a failure, or if cancelled: kill the rest)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def run_many(cmds: Iterable[Sequence[str]], **kwargs) -> List[RunResult]:
+    """Sync version of `arun_many`."""
+    return asyncio.run(arun_many(cmds, **kwargs))
+
+
+class _Sink:
+    """Where the lines of one output stream go."""
+
+    def __init__(self, callback: Optional[LineCallback], path: Optional[str], tail=None):
+        self.callback = callback
+        self.file = open(path, "wb") if path else None
+        self.tail = tail
+        self.chunks = [] if callback is None and path is None else None
+
+    def write(self, line: bytes):
+        if self.callback is not None:
+            self.callback(line)
+        if self.file is not None:
+            self.file.write(line)
+        if self.chunks is not None:
+            self.chunks.append(line)
+        if self.tail is not None:
+            self.tail.append(line)
+
+    def captured(self) -> Optional[bytes]:
+        return b"".join(self.chunks) if self.chunks is not None else None
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+async def _pump(stream: asyncio.StreamReader, sink: _Sink):
+    pending = b""
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            sink.write(line + b"\n")
+        while len(pending) > MAX_LINE_BYTES:
+            sink.write(pending[:MAX_LINE_BYTES])
+            pending = pending[MAX_LINE_BYTES:]
+    if pending:
+        sink.write(pending)
+
+
+async def _feed(stdin: Optional[asyncio.StreamWriter], data: Optional[bytes]):
+    if stdin is None:
+        return
+    try:
+        stdin.write(data)
+        await stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):  # (exited without reading it all)
+        pass
+    finally:
+        stdin.close()
+
+
+async def _stop(proc):
+    _kill_group(proc, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(proc.wait(), KILL_GRACE_S)
+    except asyncio.TimeoutError:
+        _kill_group(proc, signal.SIGKILL)
+        await proc.wait()
+
+
+def _kill_group(proc, sig):
+    try:
+        os.killpg(proc.pid, sig)
+    except ProcessLookupError:
+        pass
@@ -0,0 +1,199 @@
+"""
+Offline public suffix / registered-domain (eTLD+1) extraction, replacing
+`tldextract`. Uses the copy of https://publicsuffix.org/list/ bundled in
+`backend/data/public_suffix_list.dat` (refresh it by hand now and then), so
+nothing is ever fetched at runtime.
+
+Usage
+-----
+>>> registered_domain("news.bbc.co.uk")
+'bbc.co.uk'
+>>> split_domain("www.shop.nakahara.kawasaki.jp")
+DomainParts(subdomain='www', domain='shop', suffix='nakahara.kawasaki.jp')
+>>> registered_domain(hostname_from_url("https://t.co/abc?x=1"))
+'t.co'
+
+The list is parsed once, lazily on first use, into three hash sets (rules,
+wildcard rules, exceptions) so a lookup costs at most one set probe per label
+of the hostname. Results of the module-level functions are memoised.
+"""
+from functools import lru_cache
+import os
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+PUBLIC_SUFFIX_LIST_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "public_suffix_list.dat"
+)
+
+
+class DomainParts(NamedTuple):
+    subdomain: str
+    domain: str
+    suffix: str
+
+
+class PublicSuffixList:
+    """Public suffix rules, see https://github.com/publicsuffix/list/wiki/Format"""
+
+    def __init__(self, rules: Iterable[str]):
+        self.rules = set()
+        self.wildcards = set()  # "*.ck" is stored as "ck"
+        self.exceptions = set()  # "!www.ck" is stored as "www.ck"
+        for rule in rules:
+            for variant in _ascii_variants(rule):
+                if variant.startswith("!"):
+                    self.exceptions.add(variant[1:])
+                elif variant.startswith("*."):
+                    self.wildcards.add(variant[2:])
+                else:
+                    self.rules.add(variant)
+
+    @classmethod
+    def from_file(cls, path: str = PUBLIC_SUFFIX_LIST_PATH, include_private: bool = False) -> "PublicSuffixList":
+        """Load a `public_suffix_list.dat`, by default only its ICANN section
+        (like `tldextract` does), as private suffixes (eg. `blogspot.com`)
+        would make every blog its own registered domain.
+        """
+        rules = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("// ===BEGIN PRIVATE DOMAINS===") and not include_private:
+                    break
+                if line and not line.startswith("//"):
+                    rules.append(line.split()[0].lower())
+        return cls(rules)
+
+    def suffix_len(self, labels: List[str]) -> int:
+        """Number of trailing `labels` that make up the public suffix."""
+        n = len(labels)
+        for i in range(n):
+            candidate = ".".join(labels[i:])
+            if candidate in self.exceptions:
+                return n - i - 1
+            if candidate in self.rules:
+                return n - i
+            if i + 1 < n and ".".join(labels[i + 1:]) in self.wildcards:
+                return n - i
+        return 1  # implicit "*" rule
+
+    def split(self, host: str) -> DomainParts:
+        labels = host.split(".")
+        n_suffix = self.suffix_len(labels)
+        n = len(labels)
+        if n_suffix >= n:
+            return DomainParts("", "", host)
+        return DomainParts(
+            ".".join(labels[: n - n_suffix - 1]),
+            labels[n - n_suffix - 1],
+            ".".join(labels[n - n_suffix:]),
+        )
+
+
+def _ascii_variants(rule: str) -> Tuple[str, ...]:
+    """The rule itself plus its punycode form when it has non-ASCII labels."""
+    if rule.isascii():
+        return (rule,)
+    prefix = ""
+    for marker in ("!", "*."):
+        if rule.startswith(marker):
+            prefix, rule = marker, rule[len(marker):]
+            break
+    try:
+        return (prefix + rule, prefix + rule.encode("idna").decode("ascii"))
+    except UnicodeError:
+        return (prefix + rule,)
+
+
+_default_list: Optional[PublicSuffixList] = None
+_default_list_lock = threading.Lock()
+
+
+def get_default_list() -> PublicSuffixList:
+    """The bundled list (ICANN section), loaded on first call."""
+    global _default_list
+    if _default_list is None:
+        with _default_list_lock:
+            if _default_list is None:
+                _default_list = PublicSuffixList.from_file()
+    return _default_list
+
+
+def hostname_from_url(url: Optional[str]) -> Optional[str]:
+    """Lowercased host of `url` (no scheme, userinfo, port or path), also of
+    protocol-relative (`//bit.ly/x`) and scheme-less (`bit.ly/x`) URLs.
+    """
+    if not url:
+        return None
+    i_scheme = url.find("://")
+    if i_scheme != -1:
+        start = i_scheme + 3
+    else:
+        start = 2 if url.startswith("//") else 0
+    end = len(url)
+    for sep in "/?#":
+        i = url.find(sep, start)
+        if i != -1 and i < end:
+            end = i
+    host = url[start:end]
+    if "@" in host:
+        host = host.rpartition("@")[2]
+    if host.startswith("["):  # IPv6 literal
+        return host[: host.find("]") + 1].lower() or None
+    return host.partition(":")[0].rstrip(".").lower() or None
+
+
+def _is_ip(host: str) -> bool:
+    return host.startswith("[") or host.replace(".", "").isdigit()
+
+
+@lru_cache(maxsize=100_000)
+def split_domain(host: Optional[str]) -> Optional[DomainParts]:
+    """(subdomain, domain, suffix) of a lowercased hostname, None for empty input / IPs.
+
+    A trailing dot (fully qualified `example.com.`) is ignored.
+    """
+    if host:
+        host = host.rstrip(".")
+    if not host or _is_ip(host):
+        return None
+    return get_default_list().split(host)
+
+
+@lru_cache(maxsize=100_000)
+def public_suffix(host: Optional[str]) -> Optional[str]:
+    parts = split_domain(host)
+    return parts.suffix if parts else None
+
+
+@lru_cache(maxsize=100_000)
+def registered_domain(host: Optional[str]) -> Optional[str]:
+    """The eTLD+1 of a hostname, or None for bare suffixes / IPs / empty input."""
+    parts = split_domain(host)
+    if not parts or not parts.domain:
+        return None
+    return f"{parts.domain}.{parts.suffix}"
+
+
+def registered_domains(hosts: Iterable[Optional[str]]) -> List[Optional[str]]:
+    """Bulk `registered_domain`, resolving each distinct host only once."""
+    psl = get_default_list()
+    by_host: Dict[Optional[str], Optional[str]] = {}
+    out = []
+    for host in hosts:
+        try:
+            out.append(by_host[host])
+            continue
+        except KeyError:
+            pass
+        domain = None
+        name = host.rstrip(".") if host else host
+        if name and not _is_ip(name):
+            labels = name.split(".")
+            n_suffix = psl.suffix_len(labels)
+            if n_suffix < len(labels):
+                domain = ".".join(labels[-n_suffix - 1:])
+        by_host[host] = domain
+        out.append(domain)
+    return out
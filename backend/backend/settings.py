@@ -49,11 +49,14 @@ INSTALLED_APPS = [
 ] + EXTRA_APPS
 
 MIDDLEWARE = [
+    "backend.instrumentation.PerfMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # (only used with replicas in DB_ROUTING)
+    "coreapp.db_routers.PrimaryPinningMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "admin_reorder.middleware.ModelAdminReorder",
@@ -73,11 +76,8 @@ ADMIN_REORDER = (
         ),
     },
     {"app": "coreapp", "label": "Basic Stats", "models": (
-        "coreapp.VTableCountsTotals",
-        "coreapp.VItemsCreatedByHourLast24",
-        "coreapp.VItemsCreatedByDayLast7",
-        "coreapp.VArticlesCreatedByHourLast24",
-        "coreapp.VArticlesCreatedByDayLast7",
+        "coreapp.HourlyStatsRollup",
+        "coreapp.DailyStatsRollup",
     )},
     {"app": "auth", "models": ("coreapp.User", "auth.Group", "auth.Permission")},
 )
@@ -90,6 +90,13 @@ if ENABLE_DJANGO_TOOLBAR:
     INSTALLED_APPS.append("debug_toolbar")
     MIDDLEWARE.append("debug_toolbar.middleware.DebugToolbarMiddleware"),
 
+# Request performance metrics (see `backend/instrumentation.py`), sampling is
+# off by default, eg. set `PERF_METRICS = {"SAMPLE_RATE": 0.05}` in local_settings
+PERF_METRICS = {
+    "SAMPLE_RATE": 0.0,
+    "EXPORTERS": ["prometheus"],
+}
+
 ROOT_URLCONF = "backend.urls"
 
 TEMPLATES = [
@@ -118,17 +125,40 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+        # keep connections open between requests (for up to a minute)
+        "CONN_MAX_AGE": 60,
     },
     # 'default': {
-    #     'ENGINE': 'django.db.backends.postgresql',
+    #     # Django's postgresql backend + a pool of connections shared by threads
+    #     # and health checked (see `backend/db/postgresql_pooled/base.py`)
+    #     'ENGINE': 'backend.db.postgresql_pooled',
     #     'NAME': 'giftfisher',
     #     'USER': 'postgres',
     #     'PASSWORD': 'Ur@n!um824',
-    #     'HOST': 'localhost'
+    #     'HOST': 'localhost',
+    #     # connections go back to the pool after each request
+    #     'CONN_MAX_AGE': 0,
+    #     'POOL': {'MAX_SIZE': 10},
     # }
 }
 
 
+# threads running the sync views (one request at a time each) under ASGI
+# (see `backend/asgi_handler.py`), each can hold a DB connection (the env var
+# is also read by `gunicorn_conf.py`, for its DB connection budget)
+ASGI_THREADS = int(os.getenv("ASGI_THREADS", "10"))
+
+# threads running the ORM calls of async views (see `backend/async_db.py`,
+# `coreapp/api_async.py`), each can hold a DB connection too
+ASYNC_DB_THREADS = int(os.getenv("ASYNC_DB_THREADS", "10"))
+
+# models rows can be bulk ingested into (see `coreapp/bulk_ingest.py`), eg.:
+# BULK_INGEST_TARGETS = {
+#     "items": {"model": "coreapp.Item", "unique_field": "url_canonical", "canonical_url_from": "url"},
+# }
+BULK_INGEST_TARGETS = {}
+
+
 # Custom user mode
 # https://docs.djangoproject.com/en/2.0/topics/auth/customizing/#substituting-a-custom-user-model
 AUTH_USER_MODEL = "coreapp.User"
@@ -185,11 +215,13 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
     "DEFAULT_AUTHENTICATION_CLASSES": (
+        # or "coreapp.token_auth.JWTTokenUserAuthentication" to skip loading the
+        # user from the DB on every request (see its docstring)
         "rest_framework_simplejwt.authentication.JWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.BasicAuthentication",
     ),
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "coreapp.pagination.KeysetPagination",
     "PAGE_SIZE": 10000,
     "TEST_REQUEST_DEFAULT_FORMAT": "json",
 }
@@ -208,7 +240,30 @@ IMPORT_EXPORT_TMP_STORAGE_CLASS = "interactions.helpers.Utf8TempFolderStorage"
 #     },
 # }
 
-# DATABASE_ROUTERS = ["coreapp.db_routers.CoreDBRouter"]
+# Worker warmup (see `backend/warmup.py`), run when gunicorn's env has WARMUP=1,
+# eg. `WARMUP = {"DB": True}` to also open DB connections (without preloading)
+WARMUP = {}
+
+# OpenAPI schema served at /api/v1/schema.json|yaml (see `backend/api_schema.py`)
+API_SCHEMA = {
+    "TITLE": "RAD Django DRF API",
+    "VERSION": "v1",
+}
+
+# Reads from replicas and `_db` hinted models (see `coreapp/db_routers.py`),
+# eg. in local_settings, with "replica1" / "replica2" in DATABASES:
+# DB_ROUTING = {
+#     "REPLICAS": {"replica1": 2, "replica2": 1},
+#     "REPLICATED_MODELS": ["coreapp.Item", "coreapp.ItemWeekTopic"],
+# }
+DATABASE_ROUTERS = ["coreapp.db_routers.ReplicaRouter"]
+
+# Stats rollups: per hour / day counts of rows created, shown in the admin's
+# "Basic Stats" section and refreshed by `manage.py refresh_stats_rollups`
+STATS_ROLLUP_SOURCES = {
+    # "items": {"model": "coreapp.Item", "timestamp_field": "created_at"},
+    # "articles": {"model": "coreapp.Article", "timestamp_field": "created_at"},
+}
 
 
 from .local_settings import *  # noqa
@@ -0,0 +1,23 @@
+"""
+Settings for the tests (`pytest`, see `pytest.ini`): the project settings with
+a SQLite DB, a local memory cache and fast password hashing.
+"""
+from .settings import *  # noqa
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.path.join(BASE_DIR, "test-db.sqlite3"),  # noqa (in memory while testing)
+    },
+    # (for the tests of `coreapp.db_routers`, not routed to here)
+    "replica1": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:", "TEST": {"MIRROR": "default"}},
+    "replica2": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:", "TEST": {"MIRROR": "default"}},
+}
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+DB_ROUTING = {}
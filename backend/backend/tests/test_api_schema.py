@@ -0,0 +1,60 @@
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase
+
+from backend.api_schema import SchemaView, _accepted_encoding, _schema_body
+
+ENCODED = {"br": b"br body", "gzip": b"gzip body"}
+
+
+def accepted(header, encoded=ENCODED):
+    return _accepted_encoding(RequestFactory().get("/", HTTP_ACCEPT_ENCODING=header), encoded)
+
+
+class AcceptedEncodingTests(SimpleTestCase):
+    def test_preferred_order(self):
+        self.assertEqual(accepted("gzip, deflate, br"), "br")
+        self.assertEqual(accepted("gzip, br", {"gzip": b""}), "gzip")
+
+    def test_q_values(self):
+        self.assertEqual(accepted("br;q=0.5, gzip"), "gzip")
+        self.assertEqual(accepted("br;q=0.0, gzip;q=0.1"), "gzip")
+        self.assertEqual(accepted("br; q=0, gzip ;Q=0.000"), None)
+        self.assertEqual(accepted("br;q=bad, gzip;q=0.2"), "gzip")
+
+    def test_wildcard(self):
+        self.assertEqual(accepted("*"), "br")
+        self.assertEqual(accepted("*;q=0.5, br;q=0"), "gzip")
+        self.assertEqual(accepted("identity, *;q=0"), None)
+
+    def test_none(self):
+        self.assertEqual(accepted(""), None)
+        self.assertEqual(accepted("deflate"), None)
+
+
+@mock.patch.object(SchemaView, "permission_classes", ())
+@mock.patch.object(SchemaView, "authentication_classes", ())
+class SchemaViewTests(SimpleTestCase):
+    def setUp(self):
+        self.body = _schema_body(b'{"openapi": "x"}')
+        patcher = mock.patch("backend.api_schema.get_schema", return_value={"json": self.body})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, **headers):
+        return SchemaView.as_view()(RequestFactory().get("/api/v1/schema.json", **headers), fmt="json")
+
+    def test_etag_per_encoding(self):
+        identity = self.get()
+        gzipped = self.get(HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(identity.content, self.body.content)
+        self.assertEqual(gzipped["Content-Encoding"], "gzip")
+        self.assertEqual(gzipped.content, self.body.encoded["gzip"])
+        self.assertNotEqual(identity["ETag"], gzipped["ETag"])
+        self.assertEqual(gzipped["ETag"], self.body.etag_for("gzip"))
+
+    def test_not_modified(self):
+        etag = self.get(HTTP_ACCEPT_ENCODING="gzip")["ETag"]
+        self.assertEqual(self.get(HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # (the gzipped body's ETag doesn't match the identity one)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 200)
@@ -0,0 +1,215 @@
+import asyncio
+import threading
+import time
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import URLResolver, path
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+from backend import async_db
+from backend.asgi_handler import ASGIHandler
+from coreapp.api_async import AsyncAPIView
+
+events = []
+
+
+class RecordingMiddleware(MiddlewareMixin):
+    def process_request(self, request):
+        events.append(("request", threading.current_thread().name))
+        request.recorded = True
+
+    def process_view(self, request, view, args, kwargs):
+        events.append(("view", view.__name__))
+
+    def process_exception(self, request, exception):
+        events.append(("exception", str(exception)))
+        return HttpResponse("handled", status=502)
+
+    def process_response(self, request, response):
+        events.append(("response", response.status_code))
+        response["X-Recorded"] = "1"
+        return response
+
+
+class AsyncCallMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    async def async_call(self, request):
+        events.append(("async_call", threading.current_thread().name))
+        return await self.get_response(request)
+
+
+class SyncOnlyMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+
+class SlowIOView(AsyncAPIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    async def get(self, request):
+        await asyncio.sleep(0.2)  # (eg. an HTTP call)
+        return Response({"recorded": request._request.recorded})
+
+
+class SyncHandlerView(AsyncAPIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        return Response({"thread": threading.current_thread().name})
+
+
+async def failing_view(request):
+    raise ValueError("boom")
+
+
+def sync_view(request):
+    return HttpResponse("sync")
+
+
+urlpatterns = [
+    path("slow/", SlowIOView.as_view()),
+    path("sync-handler/", SyncHandlerView.as_view()),
+    path("failing/", failing_view),
+    path("sync/", sync_view),
+]
+
+
+class SyncURLConf:
+    urlpatterns = [path("sync/", sync_view)]
+
+
+MIDDLEWARE = [
+    "backend.tests.test_asgi_async_views.AsyncCallMiddleware",
+    "backend.tests.test_asgi_async_views.RecordingMiddleware",
+]
+
+
+async def call(handler, path):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "method": "GET", "path": path, "query_string": b"", "headers": [],
+        "server": ("testserver", 80),
+    }
+    await handler(scope, receive, send)
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    return messages[0]["status"], dict(messages[0]["headers"]), body
+
+
+@override_settings(ROOT_URLCONF=__name__, ALLOWED_HOSTS=["testserver"], MIDDLEWARE=MIDDLEWARE)
+class AsyncViewTests(SimpleTestCase):
+    def setUp(self):
+        events.clear()
+
+    def test_through_middleware(self):
+        status, headers, body = asyncio.run(call(ASGIHandler(), "/slow/"))
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b'{"recorded":true}')
+        self.assertEqual(headers[b"X-Recorded"], b"1")
+        self.assertEqual(
+            [event[0] for event in events], ["async_call", "request", "view", "response"]
+        )
+        self.assertEqual(events[0][1], "MainThread")  # (async_call in the event loop)
+        self.assertTrue(events[1][1].startswith("async-db"))
+
+    def test_sync_handler_in_db_thread(self):
+        status, _headers, body = asyncio.run(call(ASGIHandler(), "/sync-handler/"))
+        self.assertEqual(status, 200)
+        self.assertIn(b'"thread":"async-db', body)
+
+    def test_exception_middleware(self):
+        status, _headers, body = asyncio.run(call(ASGIHandler(), "/failing/"))
+        self.assertEqual((status, body), (502, b"handled"))
+        self.assertIn(("exception", "boom"), events)
+
+    def test_many_slow_requests_dont_hold_request_threads(self):
+        handler = ASGIHandler()
+        handler.threads.size = 2
+
+        async def main():
+            return await asyncio.gather(*(call(handler, "/slow/") for _ in range(200)))
+
+        t0 = time.monotonic()
+        results = asyncio.run(main())
+        self.assertLess(time.monotonic() - t0, 0.2 * 200 / 10)  # (not one request at a time)
+        self.assertEqual({status for status, _headers, _body in results}, {200})
+
+    def test_sync_views_in_request_threads(self):
+        status, headers, body = asyncio.run(call(ASGIHandler(), "/sync/"))
+        self.assertEqual((status, body), (200, b"sync"))
+        self.assertEqual(headers[b"X-Recorded"], b"1")
+        self.assertNotIn("async_call", [event[0] for event in events])
+
+    @override_settings(MIDDLEWARE=MIDDLEWARE + ["backend.tests.test_asgi_async_views.SyncOnlyMiddleware"])
+    def test_sync_only_middleware(self):
+        with self.assertRaises(ImproperlyConfigured):
+            asyncio.run(call(ASGIHandler(), "/slow/"))
+
+    def test_called_synchronously(self):
+        request = RequestFactory().get("/slow/")
+        request.recorded = False
+        response = SlowIOView.as_view()(request)
+        self.assertEqual(response.data, {"recorded": False})
+
+    @override_settings(ROOT_URLCONF=SyncURLConf)
+    def test_no_resolving_without_async_views(self):
+        with mock.patch.object(URLResolver, "resolve") as resolve:
+            self.assertIsNone(ASGIHandler().resolve_async_view({"path": "/sync/"}))
+        resolve.assert_not_called()
+
+
+class RunInDBThreadTests(SimpleTestCase):
+    def test_bounded(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def query():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.pop()
+
+        async def main():
+            await asyncio.gather(*(async_db.run_in_db_thread(query) for _ in range(50)))
+
+        with mock.patch.object(async_db, "_executor", None), self.settings(ASYNC_DB_THREADS=3):
+            asyncio.run(main())
+        self.assertEqual(max(peak), 3)
+
+    def test_execute_wrappers(self):
+        def wrapper(execute, sql, params, many, context):
+            return execute(sql, params, many, context)
+
+        def has_wrapper():
+            return wrapper in connections["default"].execute_wrappers
+
+        async def main():
+            with async_db.execute_wrapper(wrapper):
+                return await async_db.run_in_db_thread(has_wrapper)
+
+        self.assertTrue(asyncio.run(main()))
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+
+from django.core import signals
+from django.db import connections
+from django.http import StreamingHttpResponse
+from django.test import SimpleTestCase, override_settings
+from django.urls import path
+
+from backend.asgi_handler import ASGIHandler
+
+events = []  # (thread id, event, connection id)
+
+
+def record(event):
+    events.append((threading.get_ident(), event, id(connections["default"])))
+
+
+def stream_view(request, label):
+    def parts():
+        for i in range(3):
+            record(f"{label}:part")
+            yield f"{label}{i}\n"
+
+    record(f"{label}:view")
+    return StreamingHttpResponse(parts())
+
+
+urlpatterns = [path("stream/<str:label>/", stream_view)]
+
+
+def on_request_started(sender, scope, **kwargs):
+    record("started")
+
+
+def on_request_finished(sender, **kwargs):
+    record("finished")
+
+
+async def call(handler, path, send=None):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def default_send(message):
+        messages.append(message)
+        await asyncio.sleep(0)  # (lets the other requests run)
+
+    scope = {
+        "type": "http", "method": "GET", "path": path, "query_string": b"", "headers": [],
+        "server": ("testserver", 80),
+    }
+    await handler(scope, receive, send or default_send)
+    return messages
+
+
+def thread_events():
+    """`{thread id: [event, ...]}`, in order."""
+    by_thread = {}
+    for thread_id, event, _connection_id in events:
+        by_thread.setdefault(thread_id, []).append(event)
+    return by_thread
+
+
+@override_settings(ROOT_URLCONF=__name__, ALLOWED_HOSTS=["testserver"])
+class ASGIHandlerTests(SimpleTestCase):
+    def setUp(self):
+        events.clear()
+        signals.request_started.connect(on_request_started)
+        signals.request_finished.connect(on_request_finished)
+        self.addCleanup(signals.request_started.disconnect, on_request_started)
+        self.addCleanup(signals.request_finished.disconnect, on_request_finished)
+
+    def test_streaming(self):
+        messages = asyncio.run(call(ASGIHandler(), "/stream/a/"))
+        self.assertEqual(messages[0]["status"], 200)
+        body = b"".join(m.get("body", b"") for m in messages[1:])
+        self.assertEqual(body, b"a0\na1\na2\n")
+        self.assertFalse(messages[-1].get("more_body", False))
+
+    def test_request_in_one_thread_and_connection(self):
+        asyncio.run(call(ASGIHandler(), "/stream/a/"))
+        by_thread = thread_events()
+        self.assertEqual(len(by_thread), 1)
+        self.assertNotIn(threading.get_ident(), by_thread)
+        self.assertEqual(
+            list(by_thread.values())[0], ["started", "a:view", "a:part", "a:part", "a:part", "finished"]
+        )
+        self.assertEqual(len({connection_id for _thread_id, _event, connection_id in events}), 1)
+
+    def test_concurrent_streams_dont_share_threads(self):
+        handler = ASGIHandler()
+
+        async def main():
+            await asyncio.gather(*(call(handler, f"/stream/{label}/") for label in "abc"))
+
+        asyncio.run(main())
+        by_thread = thread_events()
+        self.assertEqual(len(by_thread), 3)
+        for thread_events_ in by_thread.values():
+            label = thread_events_[1].split(":")[0]
+            self.assertEqual(
+                thread_events_,
+                ["started", f"{label}:view", f"{label}:part", f"{label}:part", f"{label}:part", "finished"],
+            )
+        self.assertEqual(len({connection_id for _thread_id, _event, connection_id in events}), 3)
+
+    def test_threads_are_bounded_and_reused(self):
+        handler = ASGIHandler()
+        handler.threads.size = 2
+
+        async def main():
+            await asyncio.gather(*(call(handler, f"/stream/{label}/") for label in "abcde"))
+
+        asyncio.run(main())
+        by_thread = thread_events()
+        self.assertEqual(len(by_thread), 2)
+        self.assertEqual(sum(events.count("finished") for events in by_thread.values()), 5)
+        for thread_events_ in by_thread.values():  # (one request after the other)
+            self.assertEqual(thread_events_[::6], ["started"] * (len(thread_events_) // 6))
+
+    def test_response_closed_when_client_disconnects(self):
+        async def send(message):
+            if message["type"] == "http.response.body":
+                raise OSError("client disconnected")
+
+        with self.assertRaises(OSError):
+            asyncio.run(call(ASGIHandler(), "/stream/a/", send))
+        (thread_events_,) = thread_events().values()
+        self.assertEqual(thread_events_, ["started", "a:view", "a:part", "finished"])
@@ -0,0 +1,98 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from backend.db import pool as db_pool
+from backend.db.pool import ConnectionPool, PoolTimeout, get_pool
+
+
+class FakeConnection:
+    def __init__(self, params=None):
+        self.params = params
+        self.closed = False
+        self.dead = False
+
+
+def make_pool(name="test", connect=FakeConnection, **kwargs):
+    def ping(conn):
+        if conn.dead:
+            raise ConnectionError("dead")
+
+    def reset(conn):
+        if conn.closed:
+            raise ConnectionError("closed")
+
+    def close(conn):
+        conn.closed = True
+
+    return ConnectionPool(name, connect, ping=ping, reset=reset, close=close, **kwargs)
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def test_reuse(self):
+        pool = make_pool()
+        conn = pool.acquire()
+        pool.release(conn)
+        self.assertIs(pool.acquire(), conn)
+        self.assertEqual(pool.stats()["created"], 1)
+
+    def test_bounded(self):
+        pool = make_pool(max_size=2, timeout_s=0.01)
+        pool.acquire()
+        pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+    def test_broken_connections_discarded(self):
+        pool = make_pool()
+        conn = pool.acquire()
+        conn.closed = True  # (fails `reset`)
+        pool.release(conn)
+        self.assertIsNot(pool.acquire(), conn)
+        self.assertEqual(pool.stats()["discarded"], 1)
+
+    def test_dead_idle_connections_discarded(self):
+        pool = make_pool(ping_after_s=0)
+        conn = pool.acquire()
+        pool.release(conn)
+        conn.dead = True
+        self.assertIsNot(pool.acquire(), conn)
+        self.assertEqual(pool.stats()["ping_failures"], 1)
+
+    def test_connect_failure_gives_slot_back(self):
+        pool = make_pool(connect=mock.Mock(side_effect=ConnectionError), max_size=1, timeout_s=0.01)
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                pool.acquire()
+        self.assertEqual(pool.stats()["timeouts"], 0)
+
+    def test_retired(self):
+        pool = make_pool()
+        idle, in_use = pool.acquire(), pool.acquire()
+        pool.release(idle)
+        pool.retire()
+        self.assertTrue(idle.closed)
+        pool.release(in_use)
+        self.assertTrue(in_use.closed)
+        self.assertEqual(pool.stats()["idle"], 0)
+
+
+@mock.patch.object(db_pool, "_pools", {})
+@mock.patch.object(db_pool, "_pool_keys", {})
+class GetPoolTests(SimpleTestCase):
+    def get_pool(self, params):
+        return get_pool("default", lambda: make_pool("default", lambda: FakeConnection(params)), key=params)
+
+    def test_same_params(self):
+        self.assertIs(self.get_pool({"database": "app"}), self.get_pool({"database": "app"}))
+
+    def test_params_changed(self):
+        pool = self.get_pool({"database": "app"})
+        conn = pool.acquire()
+        test_pool = self.get_pool({"database": "test_app"})
+        self.assertIsNot(test_pool, pool)
+        self.assertEqual(test_pool.acquire().params, {"database": "test_app"})
+        pool.release(conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(db_pool.all_pools(), [test_pool])
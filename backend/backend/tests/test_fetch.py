@@ -0,0 +1,69 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from backend.fetch import Fetcher
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, url, chunks=(b"<p>hello</p>",)):
+        self.url = url
+        self.headers = {"Content-Type": "text/html; charset=utf-8"}
+        self.chunks = chunks
+        self.closed = False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+class SlotsTests(SimpleTestCase):
+    def test_waiting_on_busy_host_holds_no_global_slot(self):
+        fetcher = Fetcher(max_connections=2, max_per_host=1)
+        release_a = threading.Event()
+
+        def get(url, **kwargs):
+            if url.startswith("http://a/"):
+                release_a.wait(5)
+            return FakeResponse(url)
+
+        with mock.patch.object(fetcher.session, "get", side_effect=get):
+            threads = [threading.Thread(target=fetcher.get, args=(f"http://a/{i}",)) for i in range(2)]
+            for thread in threads:
+                thread.start()
+            b_done = threading.Event()
+            threading.Thread(target=lambda: (fetcher.get("http://b/"), b_done.set())).start()
+            self.assertTrue(b_done.wait(2))
+            release_a.set()
+            for thread in threads:
+                thread.join()
+
+    def test_iter_html_releases_slots_once_body_read(self):
+        fetcher = Fetcher(max_connections=1)
+        response = FakeResponse("http://a/")
+        with mock.patch.object(fetcher.session, "get", return_value=response):
+            pieces = fetcher.iter_html("http://a/")
+            self.assertEqual(next(pieces), "<p>hello</p>")
+            self.assertTrue(response.closed)
+            self.assertTrue(fetcher._global_slots.acquire(blocking=False))
+            fetcher._global_slots.release()
+            self.assertEqual(list(pieces), [])
+
+    def test_iter_html_closed_early(self):
+        fetcher = Fetcher(max_connections=1)
+        response = FakeResponse("http://a/", chunks=[b"a" * 5000, b"b" * 5000])
+        with mock.patch.object(fetcher.session, "get", return_value=response):
+            pieces = fetcher.iter_html("http://a/")
+            next(pieces)
+            self.assertFalse(fetcher._global_slots.acquire(blocking=False))
+            pieces.close()
+            self.assertTrue(response.closed)
+            self.assertTrue(fetcher._global_slots.acquire(blocking=False))
@@ -0,0 +1,32 @@
+from django.test import SimpleTestCase
+
+from backend.html_decode import SNIFF_BYTES, decode_html, iter_decode_html, sniff_encoding
+
+
+def chunked(body, size):
+    return (body[i:i + size] for i in range(0, len(body), size))
+
+
+class SniffEncodingTests(SimpleTestCase):
+    def test_utf8_cut_at_sniffing_window(self):
+        body = ("a" * (SNIFF_BYTES - 1) + "é").encode()
+        self.assertEqual(sniff_encoding(body), "utf-8")
+        self.assertEqual(sniff_encoding(body[:SNIFF_BYTES], truncated=True), "utf-8")
+        self.assertEqual(sniff_encoding(body[:SNIFF_BYTES]), "cp1252")  # (a whole, invalid document)
+
+    def test_meta_charset(self):
+        self.assertEqual(sniff_encoding(b'<meta charset="iso-8859-1"><p>caf\xe9'), "cp1252")
+
+    def test_header_over_meta(self):
+        self.assertEqual(sniff_encoding(b'<meta charset="utf-8">', "text/html; charset=koi8-r"), "koi8-r")
+
+
+class IterDecodeHTMLTests(SimpleTestCase):
+    def test_head_exactly_sniff_bytes(self):
+        body = ("a" * (SNIFF_BYTES - 1) + "é").encode()
+        self.assertEqual("".join(iter_decode_html(chunked(body, SNIFF_BYTES))), "a" * (SNIFF_BYTES - 1) + "é")
+
+    def test_same_as_decode_html(self):
+        body = ("<p>" + "ü" * 5000 + "</p>").encode()
+        for size in (1, 100, SNIFF_BYTES, SNIFF_BYTES + 1):
+            self.assertEqual("".join(iter_decode_html(chunked(body, size))), decode_html(body))
@@ -0,0 +1,63 @@
+import datetime as dtm
+from decimal import Decimal
+import json
+from unittest import mock, skipIf
+import uuid
+
+from django.test import SimpleTestCase
+
+from backend import jsonlib
+
+DATA = {
+    "at": dtm.datetime(2020, 4, 24, 6, 53, 1, 500, tzinfo=dtm.timezone.utc),
+    "on": dtm.date(2020, 4, 24),
+    "tags": {"a"},
+    "price": Decimal("1.10"),
+    "id": uuid.UUID(int=1),
+    "text": 'héllo "world"\n\u2028',
+    "numbers": [0, -1, 2 ** 40, 0.5, 1.25, True, None],
+    "non_finite": [float("nan"), float("inf"), float("-inf")],
+    "nested": {"empty": [], "also_empty": {}, "1": [{"x": float("nan")}]},
+}
+
+
+def stdlib_dumps(data, **kwargs):
+    with mock.patch.object(jsonlib, "orjson", None):
+        return jsonlib.dumps(data, **kwargs)
+
+
+class StdlibBackendTests(SimpleTestCase):
+    def test_non_finite_floats_as_null(self):
+        self.assertEqual(stdlib_dumps([float("nan"), {"a": float("inf")}, 1.5]), '[null,{"a":null},1.5]')
+
+    def test_non_finite_floats_from_default(self):
+        class Obj:
+            _json = {"v": float("-inf")}
+
+        self.assertEqual(stdlib_dumps({"o": Obj()}), '{"o":{"v":null}}')
+
+    def test_other_value_errors_raised(self):
+        data = []
+        data.append(data)
+        with self.assertRaises(ValueError):
+            stdlib_dumps(data)
+
+    def test_loads_rejects_non_finite(self):
+        with mock.patch.object(jsonlib, "orjson", None):
+            with self.assertRaises(ValueError):
+                jsonlib.loads("[NaN]")
+            self.assertEqual(jsonlib.loads('{"a": [1.5, null]}'), {"a": [1.5, None]})
+
+
+@skipIf(jsonlib.orjson is None, "orjson isn't installed")
+class BackendsAgreeTests(SimpleTestCase):
+    def test_same_output(self):
+        for kwargs in ({}, {"indent": 2}, {"sort_keys": True}, {"indent": 2, "sort_keys": True}):
+            with self.subTest(**kwargs):
+                self.assertEqual(jsonlib.dumps(DATA, **kwargs), stdlib_dumps(DATA, **kwargs))
+
+    def test_same_parsing(self):
+        text = jsonlib.dumps(DATA)
+        self.assertEqual(jsonlib.loads(text), json.loads(text))
+        with self.assertRaises(ValueError):
+            jsonlib.loads("[Infinity]")
@@ -0,0 +1,38 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from backend.unshorten import ResolutionCache, unshorten_urls
+
+
+def fake_unshorten_url(url, max_depth, **kwargs):
+    return f"{url}/article", None
+
+
+@mock.patch("backend.unshorten.unshorten_url", side_effect=fake_unshorten_url)
+class UnshortenURLsTests(SimpleTestCase):
+    def test_results_in_order(self, unshorten_url):
+        urls = ["http://b.test/1", "http://a.test/2", "http://b.test/1"]
+        self.assertEqual(
+            unshorten_urls(urls, cache=ResolutionCache()),
+            [("http://b.test/1/article", None), ("http://a.test/2/article", None), ("http://b.test/1/article", None)],
+        )
+        self.assertEqual(unshorten_url.call_count, 2)
+
+    def test_cached_per_max_depth(self, unshorten_url):
+        cache = ResolutionCache()
+        unshorten_urls(["http://a.test/1"], cache=cache, max_depth=10)
+        unshorten_urls(["http://a.test/1"], cache=cache, max_depth=10)
+        self.assertEqual(unshorten_url.call_count, 1)
+        unshorten_urls(["http://a.test/1"], cache=cache, max_depth=1)
+        self.assertEqual(unshorten_url.call_count, 2)
+        self.assertEqual(unshorten_url.call_args[1]["max_depth"], 1)
+
+    def test_errors_not_cached(self, unshorten_url):
+        cache = ResolutionCache()
+        unshorten_url.side_effect = lambda url, **kwargs: (None, IOError("timeout"))
+        for _ in range(2):
+            ((resolved_url, error),) = unshorten_urls(["http://a.test/1"], cache=cache)
+            self.assertIsNone(resolved_url)
+            self.assertIsInstance(error, IOError)
+        self.assertEqual(unshorten_url.call_count, 2)
@@ -0,0 +1,259 @@
+"""
+Batch URL unshortening with a two-level resolution cache.
+
+Usage
+-----
+>>> from backend.unshorten import unshorten_urls
+>>> unshorten_urls(["https://bit.ly/xyz", "https://t.co/abc"], concurrency=32)
+[('https://example.com/article', None), (None, IOError(...))]
+
+Results have the same `(url, error)` shape as `backend.utils.unshorten_url`,
+in the same order as the input. Successful full resolutions are remembered in
+an in-process LRU and (optionally) in an on-disk SQLite store with a TTL, so
+the same short links coming back again and again cost nothing.
+"""
+import asyncio
+from collections import OrderedDict
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .fetch import Fetcher
+from .utils import unshorten_url
+
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "data",
+    "local",
+    "unshorten_cache.sqlite3",
+)
+
+
+class CacheStats:
+    """Hit/miss counters of a `ResolutionCache` (not reset automatically)."""
+
+    def __init__(self):
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+        }
+
+    def __repr__(self):
+        return f"CacheStats({self.as_dict()})"
+
+
+class SQLiteTTLStore:
+    """Persistent `short url -> resolved url` map with per-entry expiry."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS resolutions ("
+            " url TEXT PRIMARY KEY, resolved_url TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def get(self, url: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT resolved_url, expires_at FROM resolutions WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0], row[1]
+
+    def set_many(self, items: Iterable[Tuple[str, str, float]]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO resolutions (url, resolved_url, expires_at) VALUES (?, ?, ?)",
+                list(items),
+            )
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM resolutions WHERE expires_at < ?", (time.time(),))
+        return cur.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ResolutionCache:
+    """
+    In-process LRU in front of an optional `SQLiteTTLStore`.
+
+    Only successful full resolutions are cached (errors are often transient,
+    and depth-limited lookups don't give the final URL).
+    """
+
+    def __init__(
+        self,
+        *,
+        maxsize: int = 100_000,
+        ttl_s: float = 7 * 24 * 3600,
+        path: Optional[str] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self.stats = CacheStats()
+        self._lru: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = SQLiteTTLStore(path) if path else None
+
+    def get(self, url: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(url)
+            if entry is not None:
+                if entry[1] >= now:
+                    self._lru.move_to_end(url)
+                    self.stats.memory_hits += 1
+                    return entry[0]
+                del self._lru[url]
+        if self._disk is not None:
+            entry = self._disk.get(url)
+            if entry is not None:
+                with self._lock:
+                    self._remember(url, entry)
+                    self.stats.disk_hits += 1
+                return entry[0]
+        with self._lock:
+            self.stats.misses += 1
+        return None
+
+    def set_many(self, resolutions: Dict[str, str]) -> None:
+        if not resolutions:
+            return
+        expires_at = time.time() + self.ttl_s
+        with self._lock:
+            for url, resolved_url in resolutions.items():
+                self._remember(url, (resolved_url, expires_at))
+            self.stats.stores += len(resolutions)
+        if self._disk is not None:
+            self._disk.set_many((u, r, expires_at) for u, r in resolutions.items())
+
+    def set(self, url: str, resolved_url: str) -> None:
+        self.set_many({url: resolved_url})
+
+    def _remember(self, url: str, entry: Tuple[str, float]) -> None:
+        self._lru[url] = entry
+        self._lru.move_to_end(url)
+        while len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+
+def _cache_key(url: str, max_depth: int) -> str:
+    # (a chain resolved within `max_depth` hops may be too long for a smaller one)
+    return f"{max_depth} {url}"
+
+
+_default_cache: Optional[ResolutionCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> ResolutionCache:
+    """Process-wide cache persisted to `DEFAULT_CACHE_PATH`."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResolutionCache(path=DEFAULT_CACHE_PATH)
+        return _default_cache
+
+
+async def aunshorten_urls(
+    urls: Iterable[str],
+    *,
+    concurrency: int = 16,
+    cache: Optional[ResolutionCache] = None,
+    max_depth: int = 10,
+    timeout_s: float = 3.0,
+    user_agent: Optional[str] = None,
+    fetcher: Optional[Fetcher] = None,
+) -> List[Tuple[Optional[str], Any]]:
+    """
+    Async version of `unshorten_urls`, use this from code that already runs
+    inside an event loop. Redirect chains are followed by `unshorten_url` (so
+    loop and `max_depth` detection are unchanged), `concurrency` at a time, on
+    the threads of `fetcher` (see `Fetcher.aget`), which all requests go
+    through (default: a private one with `concurrency` connections, keep-alive
+    pooled per host).
+    """
+    urls = list(urls)
+    if cache is None:
+        cache = get_default_cache()
+
+    results: Dict[str, Tuple[Optional[str], Any]] = {}
+    todo = []
+    for url in dict.fromkeys(urls):  # dedupe, keep order
+        resolved_url = cache.get(_cache_key(url, max_depth))
+        if resolved_url is not None:
+            results[url] = (resolved_url, None)
+        else:
+            todo.append(url)
+
+    if todo:
+        loop = asyncio.get_running_loop()
+        own_fetcher = fetcher is None
+        if own_fetcher:
+            fetcher = Fetcher(max_connections=concurrency, max_per_host=concurrency)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        def resolve(url):
+            return unshorten_url(
+                url,
+                max_depth=max_depth,
+                timeout_s=timeout_s,
+                user_agent=user_agent,
+                fetcher=fetcher,
+            )
+
+        async def resolve_one(url):
+            async with semaphore:
+                results[url] = await loop.run_in_executor(fetcher.executor, resolve, url)
+
+        try:
+            await asyncio.gather(*(resolve_one(url) for url in todo))
+        finally:
+            if own_fetcher:
+                fetcher.close()  # (doesn't wait for its threads, never blocks the loop)
+
+        cache.set_many(
+            {
+                _cache_key(url, max_depth): results[url][0]
+                for url in todo
+                if results[url][1] is None and results[url][0] is not None
+            }
+        )
+
+    return [results[url] for url in urls]
+
+
+def unshorten_urls(urls: Iterable[str], *, concurrency: int = 16, **kwargs) -> List[Tuple[Optional[str], Any]]:
+    """
+    Resolve many (possibly) shortened URLs concurrently.
+
+    Returns a list of `(url, error)` pairs in input order, see
+    `aunshorten_urls` for the other keyword arguments. Cache hit/miss counters
+    are on `cache.stats` (eg. `get_default_cache().stats`).
+    """
+    return asyncio.run(aunshorten_urls(urls, concurrency=concurrency, **kwargs))
@@ -0,0 +1,96 @@
+"""
+Batch URL classification: extension, medium type, is-file and is-shortener
+for a whole list of links, splitting each URL only once.
+
+Usage
+-----
+>>> c = classify_urls(["https://ex.com/a.jpg?s=1", "https://bit.ly/xyz"])
+>>> c.extension, c.medium_type, c.is_file, c.is_shortener
+(['jpg', None], ['image', None], [True, False], [False, True])
+
+Results match the per-link helpers in `backend.utils` (`extension_from_url`,
+`medium_type_from_url_extension`, `is_url_to_file`, `is_shortened_url`).
+With `use_numpy=True` (default: when NumPy is installed) the columns are NumPy
+arrays instead: unicode arrays with '' for missing values and bool arrays.
+"""
+from typing import Any, Iterable, List, NamedTuple, Optional
+
+from .public_suffix import hostname_from_url, registered_domain
+from .utils import (
+    AUDIO_FILE_EXTENSIONS,
+    FILE_EXTENSIONS,
+    IMAGE_FILE_EXTENSIONS,
+    URL_SHOTENER_DOMAINS,
+    VIDEO_FILE_EXTENSIONS,
+)
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+# same precedence as `medium_type_from_url_extension`
+MEDIUM_TYPE_BY_EXTENSION = {
+    **{ext: "audio" for ext in AUDIO_FILE_EXTENSIONS},
+    **{ext: "video" for ext in VIDEO_FILE_EXTENSIONS},
+    **{ext: "image" for ext in IMAGE_FILE_EXTENSIONS},
+}
+FILE_EXTENSIONS_SET = frozenset(FILE_EXTENSIONS)
+SHORTENER_DOMAINS_SET = frozenset(URL_SHOTENER_DOMAINS)
+
+
+class UrlClassification(NamedTuple):
+    extension: Any  # List[Optional[str]] or np.ndarray of str
+    medium_type: Any  # List[Optional[str]] or np.ndarray of str
+    is_file: Any  # List[bool] or np.ndarray of bool
+    is_shortener: Any  # List[bool] or np.ndarray of bool
+
+
+def _extension(url: str) -> Optional[str]:
+    # same as `extension_from_url`: last ".xxx" before any "?" / "#"
+    end = len(url)
+    for sep in "#?":
+        i = url.find(sep)
+        if i != -1 and i < end:
+            end = i
+    _, dot, ext = url[:end].rpartition(".")
+    return ext if dot and ext else None
+
+
+def classify_urls(urls: Iterable[Optional[str]], use_numpy: Optional[bool] = None) -> UrlClassification:
+    extensions: List[Optional[str]] = []
+    medium_types: List[Optional[str]] = []
+    is_file: List[bool] = []
+    is_shortener: List[bool] = []
+    shortener_by_host = {}
+
+    for url in urls:
+        if not url:
+            extensions.append(None)
+            medium_types.append(None)
+            is_file.append(False)
+            is_shortener.append(False)
+            continue
+
+        ext = _extension(url)
+        extensions.append(ext)
+        medium_types.append(MEDIUM_TYPE_BY_EXTENSION.get(ext))
+        is_file.append(ext in FILE_EXTENSIONS_SET)
+
+        host = hostname_from_url(url)
+        shortener = shortener_by_host.get(host)
+        if shortener is None:
+            shortener = shortener_by_host[host] = registered_domain(host) in SHORTENER_DOMAINS_SET
+        is_shortener.append(shortener)
+
+    if use_numpy is None:
+        use_numpy = np is not None
+    if use_numpy:
+        return UrlClassification(
+            np.array([e or "" for e in extensions], dtype=str),
+            np.array([m or "" for m in medium_types], dtype=str),
+            np.array(is_file, dtype=bool),
+            np.array(is_shortener, dtype=bool),
+        )
+    return UrlClassification(extensions, medium_types, is_file, is_shortener)
@@ -24,20 +24,29 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
+import backend.api_schema
+import backend.instrumentation
+import coreapp.api_views
 import coreapp.page_views
+import coreapp.token_auth
 
 
 urlpatterns = [
     # Django Admin
     path('admin/', admin.site.urls),
     path('nested_admin/', include('nested_admin.urls')),
+    path('metrics', backend.instrumentation.metrics_view, name='metrics'),
     # Frotend
     path('robots.txt', TemplateView.as_view(template_name="robots.txt", content_type="text/plain")),
     path('', coreapp.page_views.index, name='index'),
     # API
     path('api/v1/', include([
-        path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+        path('token/', TokenObtainPairView.as_view(
+            serializer_class=coreapp.token_auth.ClaimsTokenObtainPairSerializer,
+        ), name='token_obtain_pair'),
         path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+        path('schema.<str:fmt>', backend.api_schema.SchemaView.as_view(), name='api_schema'),
+        path('ingest/<str:target>/', coreapp.api_views.BulkIngestView.as_view(), name='bulk_ingest'),
     ])),
 ] + (
     static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT) +
@@ -1,19 +1,28 @@
 from collections import abc
+import contextlib
 import datetime as dtm
+import functools
 import json
+import keyword
+import operator
 import os
 import pprint
 import re
 import subprocess
 import sys
 import time
-from typing import Any, Iterable, List, Mapping, Optional, Tuple, Union
-import urllib.request
+from typing import TYPE_CHECKING, Any, Callable, Iterable, List, Mapping, Optional, Tuple, Union
+import urllib.parse
 import logging
 
-from bs4 import BeautifulSoup
-import requests
-# import tldextract
+from .html_decode import decode_html
+from . import jsonlib
+from .public_suffix import hostname_from_url, registered_domain
+
+if TYPE_CHECKING:  # (heavy imports, done only where used)
+    import requests
+
+    from .fetch import Fetcher
 
 
 def pure(func):
@@ -43,6 +52,122 @@ def if_none(a: Any, b: Any) -> Any:
     return b if a is None else a
 
 
+PathKey = Tuple[Any, ...]
+
+
+def _path_key(path: Union[str, List[Any]]) -> PathKey:
+    return tuple(path.split(".")) if type(path) is str else tuple(path)
+
+
+@functools.lru_cache(maxsize=4096)
+def _obj_path_getter(key: PathKey) -> Callable[[Any], Any]:
+    # (one C level call for the whole path)
+    return operator.attrgetter(".".join(key))
+
+
+@functools.lru_cache(maxsize=4096)
+def _dict_path_getter(key: PathKey) -> Callable[[Any], Any]:
+    if len(key) == 1:
+        return operator.itemgetter(key[0])
+    if len(key) == 2:
+        k0, k1 = key
+        return lambda obj: obj[k0][k1]
+    if len(key) == 3:
+        k0, k1, k2 = key
+        return lambda obj: obj[k0][k1][k2]
+
+    def get(obj):
+        for k in key:
+            obj = obj[k]
+        return obj
+
+    return get
+
+
+_DICT_PATH_ERRORS = (IndexError, TypeError, KeyError)
+
+
+def _travelled_path(obj: Any, key: PathKey, get: Callable[[Any, Any], Any], errors) -> str:
+    """The part of path `key` up to where it fails on `obj` (for messages)."""
+    travelled_path = []
+    for fld in key:
+        travelled_path.append(str(fld))
+        try:
+            obj = get(obj, fld)
+        except errors:
+            break
+    return ".".join(travelled_path)
+
+
+@pure
+def compile_obj_path(path: Union[str, List[str]], *args) -> Callable[[Any], Any]:
+    """
+    Accessor function for `path` in object(s), like `get_in_obj` (same
+    optional default) but with the path parsed once, for use in loops.
+
+    Example
+    -------
+    >>> get_number = compile_obj_path('street.number', None)
+    >>> numbers = [get_number(address) for address in addresses]
+    """
+    assert len(args) <= 1
+    key = _path_key(path)
+    getter = _obj_path_getter(key)
+    if args:
+        default = args[0]
+
+        def get_or_default(obj):
+            try:
+                return getter(obj)
+            except AttributeError:
+                return default
+
+        return get_or_default
+
+    def get(obj):
+        try:
+            return getter(obj)
+        except AttributeError:
+            raise AttributeError(f"no attribute '{_travelled_path(obj, key, getattr, AttributeError)}'")
+
+    return get
+
+
+@pure
+def compile_dict_path(path: Union[str, List[Any]], *args) -> Callable[[Any], Any]:
+    """
+    Accessor function for `path` in dict(s) / list(s), like `get_in_dict`
+    (same optional default) but with the path parsed once, for use in loops.
+
+    Example
+    -------
+    >>> get_dept_name = compile_dict_path(['departments', 0, 'name'], 'UNKNOWN')
+    >>> names = [get_dept_name(employee) for employee in employees]
+    """
+    assert len(args) <= 1
+    key = _path_key(path)
+    getter = _dict_path_getter(key)
+    if args:
+        default = args[0]
+
+        def get_or_default(obj):
+            try:
+                return getter(obj)
+            except _DICT_PATH_ERRORS:
+                return default
+
+        return get_or_default
+
+    def get(obj):
+        try:
+            return getter(obj)
+        except _DICT_PATH_ERRORS:
+            travelled_path = _travelled_path(obj, key, operator.getitem, _DICT_PATH_ERRORS)
+            raise AttributeError(f"no value at path '{travelled_path}'")
+
+    return get
+
+
 @pure
 def get_in_obj(obj: Any, path: Union[str, List[str]], *args) -> Any:
     """
@@ -58,42 +183,31 @@ def get_in_obj(obj: Any, path: Union[str, List[str]], *args) -> Any:
 
     ...behaves similarly, but wraps `getattr` calls in `try ... catch`, and
     returns 'UNKNOWN' if AttributeError is thrown.
+
+    (Parsed paths are cached, in loops `compile_obj_path` saves the rest.)
     """
     assert len(args) <= 1
-    has_default = bool(len(args))
-    if has_default:
-        default = args[0]
-
-    path = list(reversed(path.split(".") if type(path) is str else path))
-
-    r = obj
-    travelled_path = []
-    while len(path):
-        fld = path.pop()
-        travelled_path.append(fld)
-        try:
-            r = getattr(r, fld)
-        except AttributeError:
-            if has_default:
-                return default
-            else:
-                raise AttributeError(f"no attribute '{'.'.join(travelled_path)}'")
-
-    return r
+    key = _path_key(path)
+    try:
+        return _obj_path_getter(key)(obj)
+    except AttributeError:
+        if args:
+            return args[0]
+        raise AttributeError(f"no attribute '{_travelled_path(obj, key, getattr, AttributeError)}'")
 
 
 @pure
 def get_in_dict(obj: Any, path: Union[str, List[Any]], *args) -> Any:
     """
-    Get path in object(s) (using getattr), with optional default.
+    Get path in dict(s) / list(s) (using `[]`), with optional default.
 
     Example
     -------
-    >>> get_in_obj(address, 'street.number')
+    >>> get_in_dict(address, 'street.number')
 
     ...does: address['street']['number']
 
-    >>> get_in_obj(employee, ['departents', 0, 'name'], 'UNKNOWN')
+    >>> get_in_dict(employee, ['departents', 0, 'name'], 'UNKNOWN')
 
     ...behaves similarly, but wraps attribute accesses in `try ... catch`, and
     return 'UNKNOWN' if IndexError, TypeError or KeyError is thrown.
@@ -104,53 +218,79 @@ def get_in_dict(obj: Any, path: Union[str, List[Any]], *args) -> Any:
     you must pass the path as a list. A path like `departments.0.name` will index as
     `employee['departments']['0']['name']` - we try not to *guess* the intention of the
     user, maybe a string attribute like "0" was actually intended...
+
+    (Parsed paths are cached, in loops `compile_dict_path` saves the rest.)
     """
     assert len(args) <= 1
-    has_default = bool(len(args))
-    if has_default:
-        default = args[0]
+    key = _path_key(path)
+    try:
+        return _dict_path_getter(key)(obj)
+    except _DICT_PATH_ERRORS:
+        if args:
+            return args[0]
+        travelled_path = _travelled_path(obj, key, operator.getitem, _DICT_PATH_ERRORS)
+        raise AttributeError(f"no value at path '{travelled_path}'")
 
-    path = list(reversed(path.split(".") if type(path) is str else path))
 
-    r = obj
-    travelled_path = []
-    while len(path):
-        fld = path.pop()
-        travelled_path.append(fld)
-        try:
-            r = r[fld]
-        except (IndexError, TypeError, KeyError):
-            if has_default:
-                return default
-            else:
-                raise AttributeError(f"no value at path '{'.'.join(travelled_path)}'")
-
-    return r
+@pure
+def getter_obj(path: Union[str, List[str]], *args) -> Callable[[Any], Any]:
+    return compile_obj_path(path, *args)
 
 
 @pure
-def getter_obj(path: Union[str, List[str]], *args) -> Any:
-    return lambda obj: get_in_obj(obj, path, *args)
+def getter_dict(path: Union[str, List[Any]], *args) -> Callable[[Any], Any]:
+    return compile_dict_path(path, *args)
 
 
 @pure
-def getter_dict(path: Union[str, List[Any]], *args) -> Any:
-    return lambda obj: get_in_obj(obj, path, *args)
-
+def extract(
+    records: Iterable[Any],
+    paths: Mapping[str, Union[str, List[Any], Callable[[Any], Any]]],
+    *args,
+    objects: bool = False,
+    numpy: Union[bool, Mapping[str, Any]] = False,
+) -> dict:
+    """
+    Columns of values at `paths` (dict paths, or object paths if `objects`,
+    or accessor functions) of `records`, iterated only once, with an optional
+    default for missing values. With `numpy` the columns are NumPy arrays
+    (`numpy` can be a dict of dtypes per column).
 
-def _json_converter(o):
-    if isinstance(o, dtm.datetime):
-        return o.isoformat()
-    if hasattr(o, "_json"):
-        return o._json
-    return str(o)
+    Example
+    -------
+    >>> extract(entries, {"title": "title", "author": ["authors", 0, "name"]}, None)
+    {'title': ['A', 'B'], 'author': ['Bob', None]}
+    """
+    compile_path = compile_obj_path if objects else compile_dict_path
+    getters = [p if callable(p) else compile_path(p, *args) for p in paths.values()]
+    if isinstance(records, abc.Sequence):
+        # (a list comprehension per column beats a Python loop appending to all)
+        columns = [[get(record) for record in records] for get in getters]
+    else:  # (iterated once, without keeping the records)
+        columns = [[] for _ in getters]
+        appends = [(c.append, g) for c, g in zip(columns, getters)]
+        for record in records:
+            for append, get in appends:
+                append(get(record))
+
+    if not numpy:
+        return dict(zip(paths, columns))
+    import numpy as np  # (optional dependency)
+
+    dtypes = numpy if isinstance(numpy, abc.Mapping) else {}
+    return {name: np.asarray(column, dtype=dtypes.get(name)) for name, column in zip(paths, columns)}
 
 
 @pure
-def json_dumps(data: Any, indent: int = 2, **kwargs) -> str:
-    """JSON serializer that doesn't choke on datetimes.
+def json_dumps(data: Any, indent: Optional[int] = None, **kwargs) -> str:
+    """JSON serializer that doesn't choke on datetimes, sets, Decimals etc.,
+    compact unless an `indent` is given (see `backend.jsonlib`).
+
+    Extra `json.dumps` kwargs are supported, but force the (slower) stdlib backend.
     """
-    return json.dumps(data, default=_json_converter, indent=indent, **kwargs)
+    if not kwargs or set(kwargs) == {"sort_keys"}:
+        return jsonlib.dumps(data, indent=indent, **kwargs)
+    return json.dumps(data, default=jsonlib.default, indent=indent, **kwargs)
 
 
 IMAGE_FILE_EXTENSIONS = {
@@ -351,12 +491,11 @@ def get_now_utc_iso_str():
     return dtm.datetime.utcnow().replace(tzinfo=dtm.timezone.utc).isoformat()
 
 
-# @pure
-# def get_tld(url: Optional[str]) -> Optional[str]:
-#     if not url:
-#         return None
-#     tldr = tldextract.extract(url)
-#     return "%s.%s" % (tldr.domain, tldr.suffix)
+@pure
+def get_tld(url: Optional[str]) -> Optional[str]:
+    """Registered domain (eTLD+1) of `url`, eg. 'bbc.co.uk' for 'https://news.bbc.co.uk/'.
+    """
+    return registered_domain(hostname_from_url(url))
 
 
 def trace_proc(label: str = ""):
@@ -366,11 +505,57 @@ def trace_proc(label: str = ""):
 
 
 class DataObject:
+    """Attributes object for mappings whose keys can't all be slots (see
+    `record_class`).
+    """
+
     def __repr__(self):
         return str({k: v for k, v in vars(self).items()})
 
 
-def data_to_object(data: Union[Mapping[str, Any], Iterable]) -> object:
+class Record:
+    """Base of the slotted classes made by `record_class`: no per-instance
+    `__dict__`, so a fraction of the memory of a `DataObject`.
+    """
+
+    __slots__ = ()
+    _setters = ()  # (`__set__` of the slots, see `record_class`)
+
+    def _asdict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__ if hasattr(self, k)}
+
+    def __eq__(self, other):
+        return type(other) is type(self) and self._asdict() == other._asdict()
+
+    __hash__ = None
+
+    def __reduce__(self):  # (the classes can't be found by name to pickle)
+        return _record_from_items, (tuple(self._asdict().items()),)
+
+    def __repr__(self):
+        return str(self._asdict())
+
+
+def _is_slot_name(key: Any) -> bool:
+    return (
+        type(key) is str and key.isidentifier() and not keyword.iskeyword(key)
+        and not key.startswith("__") and not hasattr(Record, key)
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def record_class(keys: Tuple[str, ...]) -> Optional[type]:
+    """Slotted `Record` subclass with attributes `keys` (cached per key
+    tuple), or None if they can't all be slots (not identifiers...).
+    """
+    if not all(map(_is_slot_name, keys)):
+        return None
+    cls = type("Record", (Record,), {"__slots__": keys})
+    cls._setters = tuple(getattr(cls, k).__set__ for k in keys)
+    return cls
+
+
+def data_to_object(data: Union[Mapping[str, Any], Iterable], lazy: bool = False) -> object:
     """
     Example
     -------
@@ -378,23 +563,134 @@ def data_to_object(data: Union[Mapping[str, Any], Iterable]) -> object:
     ...     "name": "Bob Howard",
     ...     "positions": [{"department": "ER", "manager_id": 13}],
     ... }
-    ... data_to_object(data).positions[0].manager_id
+    >>> data_to_object(data).positions[0].manager_id
     13
+
+    Mappings become `Record`s (slotted, one class per set of keys), nested
+    dicts / lists are converted too. With `lazy` the data is wrapped instead
+    in read-only views (see `LazyRecord`), converted only as it's read.
     """
+    if lazy:
+        if isinstance(data, abc.Mapping):
+            return LazyRecord(data)
+        elif isinstance(data, abc.Iterable):
+            return [_lazy_value(e) for e in data]
+        return data
     if isinstance(data, abc.Mapping):
-        r = DataObject()
-        for k, v in data.items():
-            if type(v) is dict or type(v) is list:
-                setattr(r, k, data_to_object(v))
-            else:
-                setattr(r, k, v)
-        return r
+        return _to_record(data)
     elif isinstance(data, abc.Iterable):
         return [data_to_object(e) for e in data]
     else:
         return data
 
 
+def _to_value(v: Any) -> Any:
+    t = type(v)
+    if t is dict:
+        return _to_record(v)
+    if t is list:
+        return [_to_value(e) for e in v]
+    return v
+
+
+def _to_record(data: Mapping[str, Any]) -> object:
+    cls = record_class(tuple(data))
+    if cls is None:
+        r = DataObject()
+        for k, v in data.items():
+            setattr(r, k, _to_value(v))
+        return r
+    r = cls.__new__(cls)
+    # (the slots' own setters, in the order of the keys)
+    for set_value, v in zip(cls._setters, data.values()):
+        t = type(v)
+        set_value(r, _to_record(v) if t is dict else [_to_value(e) for e in v] if t is list else v)
+    return r
+
+
+def _record_from_items(items: Tuple[Tuple[str, Any], ...]) -> "Record":
+    cls = record_class(tuple(k for k, _ in items))
+    r = cls.__new__(cls)
+    for k, v in items:
+        setattr(r, k, v)
+    return r
+
+
+class LazyRecord:
+    """Read-only attributes view of a mapping: nested dicts / lists are
+    wrapped as they are read (so nothing is copied, or kept).
+    """
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data: Mapping[str, Any]):
+        object.__setattr__(self, "_data", data)
+
+    def __getattr__(self, name):
+        if name == "_data":  # (not set yet, eg. while copying)
+            raise AttributeError(name)
+        try:
+            v = self._data[name]
+        except KeyError:
+            raise AttributeError(name) from None
+        t = type(v)
+        if t is dict:
+            return LazyRecord(v)
+        if t is list:
+            return LazyList(v)
+        return v
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"can't set attribute {name!r} of a LazyRecord (read-only)")
+
+    def __getstate__(self):
+        return self._data
+
+    def __setstate__(self, data):
+        object.__setattr__(self, "_data", data)
+
+    def __dir__(self):
+        return list(self._data)
+
+    def _asdict(self) -> dict:
+        return dict(self._data)
+
+    def __repr__(self):
+        return str(self._data)
+
+
+class LazyList(abc.Sequence):
+    """Read-only view of a list, wrapping its dicts / lists as they are read."""
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data: list):
+        self._data = data
+
+    def __getitem__(self, i):
+        if type(i) is slice:
+            return LazyList(self._data[i])
+        return _lazy_value(self._data[i])
+
+    def __iter__(self):
+        return map(_lazy_value, self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return repr(self._data)
+
+
+def _lazy_value(v: Any) -> Any:
+    t = type(v)
+    if t is dict:
+        return LazyRecord(v)
+    if t is list:
+        return LazyList(v)
+    return v
+
+
 URL_SHOTENER_DOMAINS = {
     "bit.do",
     "t.co",
@@ -442,15 +738,42 @@ URL_SHOTENER_DOMAINS = {
 def is_shorturl_domain(domain: Optional[str]) -> bool:
     if not domain:
         return False
-    if len(domain) == 4:
-        return True
-    return domain in URL_SHOTENER_DOMAINS
+    return domain in URL_SHOTENER_DOMAINS or registered_domain(domain.lower()) in URL_SHOTENER_DOMAINS
 
 
-def is_shortened_url(url):
+def is_shortened_url(url: Optional[str]) -> bool:
     return get_tld(url) in URL_SHOTENER_DOMAINS
 
 
+# query params only used for tracking, dropped from canonical URLs
+TRACKING_QUERY_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid", "_ga", "_hsenc", "_hsmi",
+}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonical_url(url: str) -> str:
+    """Normalized form of `url` for deduplication: lowercase scheme & host,
+    no default port / credentials / fragment / tracking params (`utm_*`...),
+    sorted query params, "/" for an empty path.
+
+    >>> canonical_url("HTTPS://Example.com:443?utm_source=x&b=2&a=1#top")
+    'https://example.com/?a=1&b=2'
+    """
+    parts = urllib.parse.urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or "").rstrip(".")
+    if ":" in netloc:  # (IPv6, `hostname` drops the brackets)
+        netloc = f"[{netloc}]"
+    if parts.port is not None and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc += f":{parts.port}"
+    query = urllib.parse.urlencode(sorted(
+        (k, v) for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if not k.startswith("utm_") and k not in TRACKING_QUERY_PARAMS
+    ))
+    return urllib.parse.urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+
 def ts_print(*args):
     print("[%s]" % dtm.datetime.now(), *args)
 
@@ -473,14 +796,22 @@ def run(
     shell=False,
     can_fail=False,
     echo=True,
+    timeout_s: Optional[float] = None,
 ) -> Tuple[int, bytes, bytes]:
     """Way to run commands that behaves identically across Python versions.
+    (All the output is kept in memory: to run many commands, or ones with
+    lots of output, see `backend.procs.run_many` / `arun`.)
     """
     if echo:
         ts_print("+", " ".join(cmd))
     try:
         p = subprocess.Popen(cmd, stdout=stdout, stderr=stderr, stdin=stdin, shell=shell,)
-        out, err = p.communicate(cinput)
+        try:
+            out, err = p.communicate(cinput, timeout=timeout_s)
+        except subprocess.TimeoutExpired:
+            p.kill()
+            p.communicate()
+            raise
         r = p.returncode
     except Exception as exc:
         if echo:
@@ -499,16 +830,65 @@ def run(
     return r, out, err
 
 
+def iter_process_cmdlines() -> Iterable[Tuple[int, str]]:
+    """`(pid, command line)` of the running processes, read from `/proc`."""
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except OSError:  # (exited meanwhile, or not ours to see)
+            continue
+        if cmdline:  # (empty for kernel threads and zombies)
+            yield int(name), cmdline.rstrip(b"\0").replace(b"\0", b" ").decode("utf-8", errors="replace")
+
+
 def is_running(script_name: str) -> bool:
-    return_code, out, _err = run(["pgrep", "-f", script_name], can_fail=True, echo=False)
-    if return_code != 0:  # pgrep found nothing (error), so not running
+    """Whether a process other than this one (and its parent) has a command
+    line matching regex `script_name`, like `pgrep -f` (but without forking
+    one, where there is a `/proc`).
+    """
+    own_pids = {os.getpid(), os.getppid()}
+    if not os.path.isdir("/proc"):
+        return_code, out, _err = run(["pgrep", "-f", script_name], can_fail=True, echo=False)
+        if return_code != 0:  # pgrep found nothing (error), so not running
+            return False
+        return any(int(pid) not in own_pids for pid in out.strip(b"\n").split(b"\n"))
+    pattern = re.compile(script_name)
+    return any(
+        pid not in own_pids and pattern.search(cmdline) for pid, cmdline in iter_process_cmdlines()
+    )
+
+
+def is_running_pidfile(path: str) -> bool:
+    """Whether the process whose pid is in the file at `path` is alive."""
+    try:
+        with open(path) as f:
+            pid = int(f.read().strip())
+    except (OSError, ValueError):
         return False
-    this_pid = os.getpid()
-    parent_pid = os.getppid()
-    for pid in map(int, out.strip(b"\n").split(b"\n")):
-        if pid != this_pid and pid != parent_pid:
-            return True
-    return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # (exists, another user's)
+        return True
+    return pid != os.getpid()
+
+
+@contextlib.contextmanager
+def pidfile(path: str):
+    """Write this process' pid to the file at `path` for the duration of the
+    `with` block (see `is_running_pidfile`).
+    """
+    with open(path, "w") as f:
+        f.write(str(os.getpid()))
+    try:
+        yield path
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(path)
 
 
 def unshorten_url(
@@ -518,7 +898,18 @@ def unshorten_url(
     max_depth: int = 10,
     timeout_s: float = 3.0,
     user_agent: Optional[str] = None,
+    fetcher: Optional["Fetcher"] = None,
 ) -> Tuple[Optional[str], Any]:
+    """
+    Follow redirects starting from `url` one hop at a time, returning a
+    `(final_url, error)` pair. Requests go through `fetcher` (default: the
+    process-wide pooled one, see `backend.fetch`), see
+    `backend.unshorten.unshorten_urls` for batches.
+    """
+    if fetcher is None:
+        from .fetch import get_default_fetcher
+
+        fetcher = get_default_fetcher()
     headers = None
     if user_agent is not None:
         headers = {"User-Agent": user_agent}
@@ -542,7 +933,14 @@ def unshorten_url(
                     f"Loop detected while trying to unshorten URL: {url}, {list(seen_urls.keys()) + [curr_url]}"
                 )
 
-            r = requests.get(curr_url, allow_redirects=False, headers=headers, timeout=timeout_s)
+            r = fetcher.get(
+                curr_url,
+                allow_redirects=False,
+                headers=headers,
+                timeout_s=timeout_s,
+                read_body=False,
+                conditional=False,
+            )
 
             seen_urls[curr_url] = True
 
@@ -569,20 +967,10 @@ PAGE_MIME_TYPES = {
 }
 
 
-FAIL_ENCODING = 'ISO-8859-1'
-
-
-def get_html_from_response(response: requests.Response) -> str:
-    """Copied from newspaper.network."""
-    if response.encoding != FAIL_ENCODING:
-        # return response as a unicode string
-        html = response.text
-    else:
-        html = response.content
-        if 'charset' not in response.headers.get('content-type'):
-            encodings = requests.utils.get_encodings_from_content(response.text)
-            if len(encodings) > 0:
-                response.encoding = encodings[0]
-                html = response.text
-
-    return html or ''
+def get_html_from_response(response: "requests.Response") -> str:
+    """
+    Decode `response.content` as HTML, picking the charset once from BOM,
+    headers or `<meta>` and decoding the body a single time (the version
+    copied from newspaper.network decoded it twice, see `backend.html_decode`).
+    """
+    return decode_html(response.content or b"", response.headers.get("content-type"))
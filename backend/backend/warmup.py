@@ -0,0 +1,111 @@
+"""
+Warmup of a freshly started (or recycled) worker, so its first requests
+aren't the ones paying for lazily built state: URL resolver, compiled
+templates, API schema, imports of the views, DB connection.
+
+Configured by `settings.WARMUP` (see `DEFAULTS` below for all keys), run by
+`gunicorn_conf.py` when the `WARMUP` env var is "1": once in the master with
+`preload_app` (workers inherit it all, copy-on-write), else in each worker.
+
+Usage
+-----
+
+    from backend.warmup import warmup
+    timings = warmup()  # {"urlconf": 0.12, "templates": 0.05, ...}
+"""
+import logging
+import time
+from typing import Callable, Dict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # resolve every URL pattern (imports all the views)
+    "URLCONF": True,
+    # compiled into the cached template loaders
+    "TEMPLATES": [
+        "admin/base_site.html",
+        "admin/index.html",
+        "admin/change_list.html",
+        "admin/change_form.html",
+        "admin/login.html",
+        "rest_framework/api.html",
+    ],
+    # load (or build) the OpenAPI schema, see `backend.api_schema`
+    "API_SCHEMA": True,
+    # open a connection to each DB (NOT with `preload_app`: closed before fork)
+    "DB": False,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "WARMUP", {})}
+
+
+def warm_urlconf():
+    from django.urls import get_resolver
+
+    resolver = get_resolver()
+    resolver.reverse_dict  # (populates the reverse lookup tables)
+    _walk_patterns(resolver.url_patterns)
+
+
+def _walk_patterns(patterns):
+    for pattern in patterns:
+        sub_patterns = getattr(pattern, "url_patterns", None)
+        if sub_patterns is not None:  # (an include, resolved lazily)
+            _walk_patterns(sub_patterns)
+
+
+def warm_templates(names):
+    from django.template import TemplateDoesNotExist
+    from django.template.loader import get_template
+
+    for name in names:
+        try:
+            get_template(name)
+        except TemplateDoesNotExist:
+            logger.warning("Warmup: no template %s", name)
+
+
+def warm_api_schema():
+    from .api_schema import get_schema
+
+    get_schema()
+
+
+def warm_db():
+    from django.db import connections
+
+    for alias in connections:
+        connections[alias].ensure_connection()
+
+
+def warmup() -> Dict[str, float]:
+    """Run the configured warmup steps, returning the seconds each took.
+    Steps failing are logged and skipped (they'd fail on the first request
+    instead).
+    """
+    config = get_config()
+    steps: Dict[str, Callable[[], None]] = {}
+    if config["URLCONF"]:
+        steps["urlconf"] = warm_urlconf
+    if config["TEMPLATES"]:
+        steps["templates"] = lambda: warm_templates(config["TEMPLATES"])
+    if config["API_SCHEMA"]:
+        steps["api_schema"] = warm_api_schema
+    if config["DB"]:
+        steps["db"] = warm_db
+
+    timings = {}
+    for name, step in steps.items():
+        t0 = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception("Warmup step %s failed", name)
+        timings[name] = round(time.perf_counter() - t0, 4)
+    logger.info("Warmup done: %s", timings)
+    return timings
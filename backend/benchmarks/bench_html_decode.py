@@ -0,0 +1,115 @@
+"""
+Compare `backend.utils.get_html_from_response` against the version copied from
+newspaper (which decodes most bodies twice) on a corpus of saved pages.
+
+Usage (from the `backend/` dir)
+-----
+$ python -m benchmarks.bench_html_decode [CORPUS_DIR] [--repeat N] [--content-type CT]
+
+CORPUS_DIR (default: `data/local/pages/`) is scanned recursively for files,
+each one taken as a raw response body. Without a corpus a few synthetic
+multi-megabyte pages are generated instead.
+"""
+import argparse
+import os
+import time
+import tracemalloc
+
+import requests
+
+from backend.utils import get_html_from_response
+
+DEFAULT_CORPUS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "local", "pages"
+)
+
+FAIL_ENCODING = 'ISO-8859-1'
+
+
+def legacy_get_html_from_response(response: requests.Response) -> str:
+    """Copied from newspaper.network (the previous implementation)."""
+    if response.encoding != FAIL_ENCODING:
+        # return response as a unicode string
+        html = response.text
+    else:
+        html = response.content
+        if 'charset' not in response.headers.get('content-type'):
+            encodings = requests.utils.get_encodings_from_content(response.text)
+            if len(encodings) > 0:
+                response.encoding = encodings[0]
+                html = response.text
+
+    return html or ''
+
+
+def make_response(body: bytes, content_type: str) -> requests.Response:
+    r = requests.Response()
+    r.status_code = 200
+    r._content = body
+    r._content_consumed = True
+    r.headers["Content-Type"] = content_type
+    r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+    return r
+
+
+def load_corpus(corpus_dir: str):
+    if not os.path.isdir(corpus_dir):
+        return []
+    bodies = []
+    for dir_path, _, file_names in os.walk(corpus_dir):
+        for file_name in sorted(file_names):
+            with open(os.path.join(dir_path, file_name), "rb") as f:
+                bodies.append(f.read())
+    return bodies
+
+
+def synthetic_corpus():
+    paragraph = "<p>Știri și analize — naïve café, 東京, Ελληνικά.</p>\n"
+    body = "".join(paragraph for _ in range(40_000))
+    return [
+        f'<html><head><meta charset="utf-8"></head><body>{body}</body></html>'.encode("utf-8"),
+        (
+            '<html><head><meta http-equiv="Content-Type" content="text/html; charset=windows-1252">'
+            f'</head><body>{"<p>naïve café déjà vu</p>" * 100_000}</body></html>'
+        ).encode("cp1252"),
+    ]
+
+
+def measure(fn, bodies, content_type, repeat):
+    best_s = float("inf")
+    peak_bytes = 0
+    for _ in range(repeat):
+        responses = [make_response(body, content_type) for body in bodies]
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        for r in responses:
+            fn(r)
+        elapsed_s = time.perf_counter() - t0
+        peak_bytes = max(peak_bytes, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        best_s = min(best_s, elapsed_s)
+    return best_s, peak_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus_dir", nargs="?", default=DEFAULT_CORPUS_DIR)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--content-type", default="text/html", help="Content-Type header to simulate")
+    args = parser.parse_args()
+
+    bodies = load_corpus(args.corpus_dir)
+    source = args.corpus_dir
+    if not bodies:
+        bodies = synthetic_corpus()
+        source = "synthetic pages"
+    total_mb = sum(map(len, bodies)) / 1e6
+    print(f"{len(bodies)} pages, {total_mb:.1f} MB ({source}), Content-Type: {args.content_type}")
+
+    for label, fn in (("legacy (newspaper)", legacy_get_html_from_response), ("single-pass", get_html_from_response)):
+        elapsed_s, peak_bytes = measure(fn, bodies, args.content_type, args.repeat)
+        print(f"{label:>20}: {elapsed_s * 1000:8.1f} ms, {total_mb / elapsed_s:7.1f} MB/s, peak {peak_bytes / 1e6:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare JSON serialisation of a large nested payload: the previous stdlib
+`json_dumps` (indent=2, Python `default=` callback), stdlib after a
+`make_json_convertible` pre-walk, and `backend.jsonlib` (orjson if installed).
+
+Usage (from the `backend/` dir)
+-----
+$ python -m benchmarks.bench_json [--items N] [--repeat N]
+"""
+import argparse
+import datetime as dtm
+from decimal import Decimal
+import io
+import json
+import time
+import uuid
+
+from backend import jsonlib
+from backend.helpers import make_json_convertible
+
+
+def legacy_json_converter(o):
+    if isinstance(o, dtm.datetime):
+        return o.isoformat()
+    if hasattr(o, "_json"):
+        return o._json
+    return str(o)
+
+
+def legacy_json_dumps(data, indent=2, **kwargs):
+    return json.dumps(data, default=legacy_json_converter, indent=indent, **kwargs)
+
+
+def make_payload(n_items):
+    now = dtm.datetime.now(dtm.timezone.utc)
+    return {
+        "generated_at": now,
+        "items": [
+            {
+                "id": i,
+                "uuid": uuid.uuid4(),
+                "url": f"https://example.com/articles/{i}",
+                "title": f"Article number {i} — naïve café",
+                "created_at": now - dtm.timedelta(minutes=i),
+                "score": Decimal("0.125") * i,
+                "tags": {"news", "tech", f"t{i % 17}"},
+                "source": {"id": i % 100, "name": f"Source {i % 100}", "weights": [0.1, 0.2, 0.3]},
+            }
+            for i in range(n_items)
+        ],
+    }
+
+
+def best_of(repeat, fn):
+    best_s = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best_s = min(best_s, time.perf_counter() - t0)
+    return best_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    payload = make_payload(args.items)
+    print(f"{args.items} items, jsonlib backend: {jsonlib.BACKEND}")
+    cases = (
+        ("legacy json_dumps", lambda: legacy_json_dumps(payload)),
+        ("pre-walk + json", lambda: json.dumps(make_json_convertible(payload), default=str)),
+        ("jsonlib.dumps", lambda: jsonlib.dumps(payload)),
+        ("jsonlib.dumps_bytes", lambda: jsonlib.dumps_bytes(payload)),
+        ("jsonlib.dump (bytes)", lambda: jsonlib.dump(payload, io.BytesIO())),
+    )
+    baseline_s = None
+    for label, fn in cases:
+        elapsed_s = best_of(args.repeat, fn)
+        baseline_s = baseline_s or elapsed_s
+        print(f"{label:>22}: {elapsed_s * 1000:8.1f} ms  ({baseline_s / elapsed_s:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
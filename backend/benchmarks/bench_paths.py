@@ -0,0 +1,87 @@
+"""
+Compare reading nested values out of many feed-entry-like dicts: the previous
+`get_in_dict` (path parsed on every call), the cached `get_in_dict`, a
+`compile_dict_path` accessor, and `extract` of all the columns in one pass.
+
+Usage (from the `backend/` dir)
+-----
+$ python -m benchmarks.bench_paths [--entries N] [--repeat N]
+"""
+import argparse
+import time
+
+from backend.utils import compile_dict_path, extract, get_in_dict
+
+PATHS = {
+    "title": "title",
+    "author": ["authors", 0, "name"],
+    "link": "links.alternate.href",
+    "missing": "media.thumbnail.url",
+}
+
+
+def legacy_get_in_dict(obj, path, *args):
+    has_default = bool(len(args))
+    if has_default:
+        default = args[0]
+    path = list(reversed(path.split(".") if type(path) is str else path))
+    r = obj
+    while len(path):
+        fld = path.pop()
+        try:
+            r = r[fld]
+        except (IndexError, TypeError, KeyError):
+            if has_default:
+                return default
+            raise AttributeError(fld)
+    return r
+
+
+def make_entries(n_entries):
+    return [
+        {
+            "title": f"Entry {i}",
+            "authors": [{"name": f"Author {i % 50}"}],
+            "links": {"alternate": {"href": f"https://example.com/{i}"}},
+        }
+        for i in range(n_entries)
+    ]
+
+
+def best_of(repeat, fn):
+    best_s = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best_s = min(best_s, time.perf_counter() - t0)
+    return best_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    entries = make_entries(args.entries)
+    getters = {name: compile_dict_path(path, None) for name, path in PATHS.items()}
+    print(f"{args.entries} entries, {len(PATHS)} paths")
+    cases = (
+        ("legacy get_in_dict", lambda: {
+            name: [legacy_get_in_dict(e, path, None) for e in entries] for name, path in PATHS.items()
+        }),
+        ("get_in_dict", lambda: {
+            name: [get_in_dict(e, path, None) for e in entries] for name, path in PATHS.items()
+        }),
+        ("compile_dict_path", lambda: {name: [get(e) for e in entries] for name, get in getters.items()}),
+        ("extract", lambda: extract(entries, PATHS, None)),
+    )
+    baseline_s = None
+    for label, fn in cases:
+        elapsed_s = best_of(args.repeat, fn)
+        baseline_s = baseline_s or elapsed_s
+        print(f"{label:>22}: {elapsed_s * 1000:8.1f} ms  ({baseline_s / elapsed_s:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
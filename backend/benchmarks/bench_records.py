@@ -0,0 +1,99 @@
+"""
+Compare memory use and time of `data_to_object` on a large feed-like JSON
+payload: the previous `DataObject` version (a `__dict__` per mapping), the
+slotted `Record`s, and lazy mode (`LazyRecord`) reading two fields per entry.
+
+Usage (from the `backend/` dir)
+-----
+$ python -m benchmarks.bench_records [--entries N]
+"""
+import argparse
+from collections import abc
+import gc
+import time
+import tracemalloc
+
+from backend.utils import DataObject, data_to_object
+
+
+def legacy_data_to_object(data):
+    if isinstance(data, abc.Mapping):
+        r = DataObject()
+        for k, v in data.items():
+            if type(v) is dict or type(v) is list:
+                setattr(r, k, legacy_data_to_object(v))
+            else:
+                setattr(r, k, v)
+        return r
+    elif isinstance(data, abc.Iterable):
+        return [legacy_data_to_object(e) for e in data]
+    else:
+        return data
+
+
+def make_payload(n_entries):
+    return {
+        "feed": {"title": "Example feed", "link": "https://example.com/", "language": "en"},
+        "entries": [
+            {
+                "id": f"urn:entry:{i}",
+                "title": f"Entry number {i}",
+                "link": f"https://example.com/entries/{i}",
+                "published": "2020-05-01T12:00:00Z",
+                "summary": "Lorem ipsum dolor sit amet",
+                "authors": [{"name": f"Author {i % 50}", "email": None}],
+                "tags": [{"term": "news", "scheme": None}, {"term": f"t{i % 17}", "scheme": None}],
+                "media": {"thumbnail": {"url": f"https://example.com/{i}.jpg", "width": 120, "height": 90}},
+            }
+            for i in range(n_entries)
+        ],
+    }
+
+
+def measure(fn):
+    """`(allocated bytes still held by the result, seconds)` of `fn()` (timed
+    separately, without tracing).
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    held_bytes, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    gc.collect()
+    t0 = time.perf_counter()
+    fn()
+    return held_bytes, time.perf_counter() - t0
+
+
+def read_two_fields(obj):
+    for e in obj.entries:
+        e.title, e.authors[0].name
+    return obj
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=50_000)
+    args = parser.parse_args()
+
+    payload = make_payload(args.entries)
+    print(f"{args.entries} entries")
+    cases = (
+        ("legacy DataObject", lambda: legacy_data_to_object(payload)),
+        ("Record (slots)", lambda: data_to_object(payload)),
+        ("Record + 2 fields read", lambda: read_two_fields(data_to_object(payload))),
+        ("lazy + 2 fields read", lambda: read_two_fields(data_to_object(payload, lazy=True))),
+    )
+    baseline_bytes = None
+    for label, fn in cases:
+        held_bytes, elapsed_s = measure(fn)
+        baseline_bytes = baseline_bytes or held_bytes
+        print(
+            f"{label:>22}: {held_bytes / 2 ** 20:7.1f} MiB ({held_bytes / baseline_bytes:4.0%})"
+            f" {elapsed_s * 1000:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
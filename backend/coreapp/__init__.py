@@ -0,0 +1 @@
+default_app_config = 'coreapp.apps.CoreappConfig'
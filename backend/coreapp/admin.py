@@ -7,6 +7,7 @@ from django.utils.html import mark_safe
 import nested_admin
 
 from coreapp import models as m
+from coreapp.admin_mixins import ApproximateCountAdminMixin, AutoRelatedAdminMixin
 
 
 admin.site.site_header = "RAD Django DRF SK Admin"
@@ -14,7 +15,7 @@ admin.site.site_title = "RAD Django DRF SK Admin"
 admin.site.index_title = "Welcome to RAD Django DRF SK Admin"
 
 
-class DBViewAdmin(admin.ModelAdmin):
+class DBViewAdmin(ApproximateCountAdminMixin, AutoRelatedAdminMixin, admin.ModelAdmin):
     list_display_links = None
     actions = None
 
@@ -22,8 +23,30 @@ class DBViewAdmin(admin.ModelAdmin):
         return False
 
 
+class StatsRollupAdmin(DBViewAdmin):
+    list_display = ("bucket_start", "source", "count")
+    list_filter = ("source",)
+    ordering = ("-bucket_start", "source")
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(m.HourlyStatsRollup)
+class HourlyStatsRollupAdmin(StatsRollupAdmin):
+    pass
+
+
+@admin.register(m.DailyStatsRollup)
+class DailyStatsRollupAdmin(StatsRollupAdmin):
+    pass
+
+
 @admin.register(m.User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(ApproximateCountAdminMixin, AutoRelatedAdminMixin, BaseUserAdmin):
     fieldsets = (
         (None, {"fields": ("email", "password")}),
         (_("Personal info"), {"fields": ("full_name",)}),
@@ -57,7 +80,7 @@ class UserAdmin(BaseUserAdmin):
 
 
 @admin.register(Permission)
-class PermissionAdmin(admin.ModelAdmin):
+class PermissionAdmin(ApproximateCountAdminMixin, AutoRelatedAdminMixin, admin.ModelAdmin):
     model = Permission
     list_display = (
         "desc",
@@ -0,0 +1,266 @@
+"""
+Admin changelists that run a fixed number of queries whatever the page size.
+
+`AutoRelatedAdminMixin` plans the changelist's `select_related` /
+`prefetch_related` from `list_display`: the first time a changelist is shown,
+it renders every column for ONE object while watching what gets loaded:
+- FKs / one-to-ones followed (eg. `str(obj)` using `obj.content_type`, at any
+  depth) become `select_related` paths
+- queries on the related table of a many-to-many / reverse FK (eg.
+  `obj.groups.all()`) become `prefetch_related`
+It then re-renders the object fetched with that plan, and logs a warning
+naming the columns that still query per row. Add those by hand with
+`list_select_related` / `list_prefetch_related` (merged into the plan).
+
+With `DEBUG` on, every changelist page logs its number of queries and returns
+it in an `X-Changelist-Queries` header.
+
+`ApproximateCountAdminMixin` avoids the `SELECT COUNT(*)`s of changelists on
+huge tables: the number of results comes from the planner statistics (see
+`coreapp.db_stats`) when that says there are more than
+`approximate_count_threshold` rows, exact counts (below it, or when there's
+no estimate) are cached for `count_cache_ttl` seconds, and the "N total"
+count of the unfiltered table is off (`show_full_result_count`).
+
+Usage
+-----
+
+    @admin.register(m.Item)
+    class ItemAdmin(ApproximateCountAdminMixin, AutoRelatedAdminMixin, admin.ModelAdmin):
+        list_display = ("title", "source", "tag_names")
+        list_prefetch_related = ("source__tags",)  # optional, for what isn't detected
+"""
+from collections import namedtuple
+import hashlib
+import logging
+
+from django.conf import settings
+from django.contrib.admin.utils import lookup_field
+from django.contrib.admin.views.main import ChangeList
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .db_stats import estimate_count
+
+logger = logging.getLogger(__name__)
+
+ADMIN_APPROXIMATE_COUNT_THRESHOLD = getattr(settings, "ADMIN_APPROXIMATE_COUNT_THRESHOLD", 100_000)
+ADMIN_COUNT_CACHE_TTL = getattr(settings, "ADMIN_COUNT_CACHE_TTL", 30)
+
+RelatedPlan = namedtuple("RelatedPlan", ["select_related", "prefetch_related"])
+
+
+class QueryCounter:
+    """`connection.execute_wrapper` recording the SQL run."""
+
+    def __init__(self):
+        self.sqls = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.sqls.append(sql)
+        return execute(sql, params, many, context)
+
+    def install(self):
+        for alias in connections:
+            connections[alias].execute_wrappers.append(self)
+
+    def uninstall(self):
+        for alias in connections:
+            wrappers = connections[alias].execute_wrappers
+            if self in wrappers:
+                wrappers.remove(self)
+
+
+class PrefetchingChangeList(ChangeList):
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        prefetch = self.model_admin.get_list_prefetch_related(request)
+        return qs.prefetch_related(*prefetch) if prefetch else qs
+
+
+class AutoRelatedAdminMixin:
+    list_prefetch_related = ()
+
+    def get_changelist(self, request, **kwargs):
+        return PrefetchingChangeList
+
+    def get_list_select_related(self, request):
+        declared = self.list_select_related
+        if declared is True:
+            return True
+        return (*(declared or ()), *self.get_related_plan(request).select_related)
+
+    def get_list_prefetch_related(self, request):
+        return (*self.list_prefetch_related, *self.get_related_plan(request).prefetch_related)
+
+    def get_related_plan(self, request) -> RelatedPlan:
+        list_display = tuple(self.get_list_display(request))
+        plans = self.__dict__.setdefault("_related_plans", {})
+        if list_display in plans:
+            return plans[list_display]
+        obj = super().get_queryset(request).order_by().first()
+        if obj is None:  # nothing to look at, plan again next time
+            return RelatedPlan((), ())
+        plans[list_display] = plan = self._plan_related(request, list_display, obj)
+        return plan
+
+    def _plan_related(self, request, list_display, obj):
+        counter = QueryCounter()
+        counter.install()
+        try:
+            self._render_row(obj, list_display)
+        finally:
+            counter.uninstall()
+        select_related = tuple(sorted(_cached_relation_paths(obj)))
+        prefetch_related = tuple(sorted(self._queried_relations(counter.sqls)))
+        plan = RelatedPlan(select_related, prefetch_related)
+
+        # check it, with the declared relations too
+        qs = super().get_queryset(request).filter(pk=obj.pk)
+        if self.list_select_related is not True:
+            qs = qs.select_related(*(self.list_select_related or ()), *select_related)
+        obj = qs.prefetch_related(*self.list_prefetch_related, *prefetch_related).first()
+        counter = QueryCounter()
+        counter.install()
+        try:
+            slow_columns = [
+                name for name in list_display
+                if _counting(counter, lambda: self._render_row(obj, (name,)))
+            ]
+        finally:
+            counter.uninstall()
+        if slow_columns:
+            logger.warning(
+                "%s: list_display columns %s still run queries for each row, add the relations "
+                "they use to list_select_related / list_prefetch_related",
+                self.__class__.__name__, ", ".join(map(str, slow_columns)),
+            )
+        logger.debug("%s: changelist related plan: %s", self.__class__.__name__, plan)
+        return plan
+
+    def _render_row(self, obj, list_display):
+        for name in list_display:
+            if name == "action_checkbox":
+                continue
+            try:
+                f, attr, value = lookup_field(name, obj, self)
+                if f is not None and f.is_relation and value is not None:
+                    str(value)  # (displayed as the related object's `__str__`)
+            except Exception:  # let the changelist itself show / raise errors
+                pass
+        str(obj)  # (for the links of `list_display_links`, `__str__` if not set)
+
+    def _queried_relations(self, sqls):
+        """Many valued relations of the model whose tables were queried."""
+        relations = set()
+        for field in self.model._meta.get_fields():
+            if not (field.many_to_many or field.one_to_many):
+                continue
+            name = field.name if field.concrete else field.get_accessor_name()
+            table = field.related_model._meta.db_table
+            if any(_selects_from(sql, table) for sql in sqls):
+                relations.add(name)
+        return relations
+
+    def changelist_view(self, request, extra_context=None):
+        if not settings.DEBUG:
+            return super().changelist_view(request, extra_context)
+
+        counter = QueryCounter()
+        counter.install()
+        try:
+            response = super().changelist_view(request, extra_context)
+        except Exception:
+            counter.uninstall()
+            raise
+        if not hasattr(response, "add_post_render_callback"):  # eg. redirects
+            counter.uninstall()
+            return response
+
+        def report(response):
+            counter.uninstall()
+            cl = response.context_data.get("cl")
+            rows = len(cl.result_list) if cl is not None else 0
+            logger.info(
+                "%s changelist: %d queries for %d rows", self.model._meta.label, len(counter.sqls), rows
+            )
+            response["X-Changelist-Queries"] = str(len(counter.sqls))
+
+        response.add_post_render_callback(report)
+        return response
+
+
+class ApproximateCountPaginator(Paginator):
+    """Paginator of a queryset using its estimated count when above
+    `threshold`, and a (briefly) cached exact count otherwise.
+    """
+
+    def __init__(self, *args, threshold=ADMIN_APPROXIMATE_COUNT_THRESHOLD,
+                 cache_ttl=ADMIN_COUNT_CACHE_TTL, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threshold = threshold
+        self.cache_ttl = cache_ttl
+        self.is_approximate = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        estimate = estimate_count(queryset)
+        if estimate is not None and estimate > self.threshold:
+            self.is_approximate = True
+            return estimate
+
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        key = "admin:count:" + hashlib.sha256(repr((queryset.db, sql, params)).encode("utf-8")).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            if self.cache_ttl:
+                cache.set(key, count, self.cache_ttl)
+        return count
+
+
+class ApproximateCountAdminMixin:
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    approximate_count_threshold = ADMIN_APPROXIMATE_COUNT_THRESHOLD
+    count_cache_ttl = ADMIN_COUNT_CACHE_TTL
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return self.paginator(
+            queryset, per_page, orphans, allow_empty_first_page,
+            threshold=self.approximate_count_threshold, cache_ttl=self.count_cache_ttl,
+        )
+
+
+def _counting(counter, f):
+    n = len(counter.sqls)
+    f()
+    return len(counter.sqls) - n
+
+
+def _cached_relation_paths(obj, prefix=""):
+    """`a`, `a__b`... paths of the related objects loaded on `obj`."""
+    paths = set()
+    for name, related in obj._state.fields_cache.items():
+        try:
+            field = obj._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.related_model is None:  # eg. generic FKs, can't be select_related
+            continue
+        path = prefix + name
+        paths.add(path)
+        if related is not None:
+            paths |= _cached_relation_paths(related, path + "__")
+    return paths
+
+
+def _selects_from(sql, table):
+    return f'FROM "{table}"' in sql or f"FROM `{table}`" in sql or f"FROM {table} " in sql
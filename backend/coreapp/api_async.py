@@ -0,0 +1,121 @@
+"""
+Async DRF views and viewsets, run in the event loop by the ASGI handler
+(`backend.asgi_handler`), so a worker can serve many requests waiting on
+slow I/O at once instead of one per thread.
+
+`dispatch` runs authentication / permissions / throttling, and every sync
+handler (eg. the `list` / `retrieve`... of DRF's model mixins), in the DB
+threads of `backend.async_db`. `async def` handlers run in the event loop and
+should await their I/O: `run_in_db_thread` / `db_sync_to_async` for the ORM,
+`Fetcher.aget` (`backend.fetch`) for HTTP.
+
+They go through Django's middleware like the other views (sessions, CSRF,
+`request.user`...), see `ASGIHandler.load_async_middleware`. Called
+synchronously (WSGI, `manage.py runserver`, the test client) they run in an
+event loop of their own with `async_to_sync`.
+
+Usage
+-----
+
+    class FeedPreviewView(AsyncAPIView):
+        async def get(self, request, source_id):
+            source = await run_in_db_thread(m.Source.objects.get, pk=source_id)
+            r = await get_default_fetcher().aget(source.url)
+            return Response({"status": r.status_code, "size": len(r.content)})
+
+    class ItemViewSet(AsyncReadOnlyModelViewSet):  # list / retrieve in DB threads
+        queryset = m.Item.objects.all()
+        serializer_class = ItemSerializer
+"""
+import asyncio
+import functools
+
+from asgiref.sync import async_to_sync
+from rest_framework import generics, mixins
+from rest_framework.views import APIView
+from rest_framework.viewsets import ViewSetMixin
+
+from backend.async_db import run_in_db_thread
+
+
+def async_view(view):
+    """Sync view calling `view` (which returns a coroutine), that keeps it as
+    `async_view` for the ASGI handler to await in the event loop instead.
+    """
+
+    async def call(request, *args, **kwargs):
+        return await view(request, *args, **kwargs)
+
+    @functools.wraps(view)
+    def sync_view(request, *args, **kwargs):
+        return async_to_sync(call)(request, *args, **kwargs)
+
+    sync_view.async_view = call
+    return sync_view
+
+
+class AsyncAPIView(APIView):
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return async_view(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        # (same as `APIView.dispatch`, awaiting the handler)
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            # (authenticators, permissions and throttles can query the DB)
+            await run_in_db_thread(self.initial, request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if asyncio.iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await run_in_db_thread(handler, request, *args, **kwargs)
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncGenericAPIView(AsyncAPIView, generics.GenericAPIView):
+    pass
+
+
+class AsyncViewSetMixin(ViewSetMixin):
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        return async_view(super().as_view(actions, **initkwargs))
+
+
+class AsyncViewSet(AsyncViewSetMixin, AsyncAPIView):
+    pass
+
+
+class AsyncGenericViewSet(AsyncViewSetMixin, AsyncGenericAPIView):
+    pass
+
+
+class AsyncReadOnlyModelViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, AsyncGenericViewSet):
+    pass
+
+
+class AsyncModelViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.UpdateModelMixin,
+    mixins.DestroyModelMixin,
+    mixins.ListModelMixin,
+    AsyncGenericViewSet,
+):
+    pass
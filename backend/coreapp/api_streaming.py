@@ -0,0 +1,104 @@
+"""
+Streaming list responses for DRF viewsets, in constant memory.
+
+Usage
+-----
+    class ItemViewSet(StreamingListMixin, viewsets.ReadOnlyModelViewSet):
+        queryset = m.Item.objects.order_by("id")
+        serializer_class = ItemSerializer
+
+`GET /items/` (or `?format=json`) then streams a plain JSON array and
+`GET /items/?format=ndjson` (or `Accept: application/x-ndjson`) one JSON
+object per line. Rows are read with `queryset.iterator(chunk_size=...)`
+(server-side cursors on Postgres), serialised one by one and written out in
+batches, so memory use doesn't depend on the number of rows. There's no
+pagination and no `COUNT(*)`. The browsable API still gets the regular
+paginated `list`.
+
+NOTE: `iterator()` ignores `prefetch_related` on Django 3.0, use
+`select_related` (or annotations) in streamed querysets.
+Under ASGI this needs the handler from `backend.asgi_handler` (the default
+in `backend/asgi.py`), as Django's own one iterates the stream in the event
+loop where DB access is forbidden.
+"""
+from typing import Any, Iterable, Iterator
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+
+from backend import jsonlib
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Newline delimited JSON: one line per item of a list (non-streamed)."""
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if isinstance(data, dict) and "results" in data:  # a paginated page
+            data = data["results"]
+        if not isinstance(data, list):
+            data = [data]
+        return b"".join(render_ndjson_stream(data))
+
+
+def render_ndjson_stream(rows: Iterable[Any], batch_size: int = 500) -> Iterator[bytes]:
+    """Yield NDJSON bytes for `rows`, `batch_size` rows at a time."""
+    batch = []
+    for row in rows:
+        batch.append(jsonlib.dumps_bytes(row))
+        if len(batch) >= batch_size:
+            batch.append(b"")
+            yield b"\n".join(batch)
+            batch = []
+    if batch:
+        batch.append(b"")
+        yield b"\n".join(batch)
+
+
+def render_json_array_stream(rows: Iterable[Any], batch_size: int = 500) -> Iterator[bytes]:
+    """Yield the bytes of a JSON array of `rows`, `batch_size` rows at a time."""
+    yield b"["
+    batch = []
+    first = True
+    for row in rows:
+        batch.append(jsonlib.dumps_bytes(row))
+        if len(batch) >= batch_size:
+            yield (b"" if first else b",") + b",".join(batch)
+            first = False
+            batch = []
+    if batch:
+        yield (b"" if first else b",") + b",".join(batch)
+    yield b"]"
+
+
+class StreamingListMixin:
+    """Mixin for DRF `GenericViewSet`s making `list` stream all rows."""
+
+    stream_chunk_size = 2000  # rows fetched from the DB at a time
+    stream_batch_size = 500  # rows serialised per written chunk
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [NDJSONRenderer]
+
+    def list(self, request, *args, **kwargs):
+        renderer_format = getattr(request.accepted_renderer, "format", None)
+        if renderer_format not in ("json", "ndjson"):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer()
+        rows = (
+            serializer.to_representation(obj)
+            for obj in queryset.iterator(chunk_size=self.stream_chunk_size)
+        )
+        if renderer_format == "ndjson":
+            content = render_ndjson_stream(rows, self.stream_batch_size)
+            content_type = NDJSONRenderer.media_type
+        else:
+            content = render_json_array_stream(rows, self.stream_batch_size)
+            content_type = "application/json"
+        return StreamingHttpResponse(content, content_type=content_type)
@@ -0,0 +1,37 @@
+from django.http import Http404
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.parsers import BaseParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .bulk_ingest import BulkIngester, get_targets, iter_ndjson
+
+
+class NDJSONParser(BaseParser):
+    """Newline delimited JSON: an iterator over the values of the lines of the
+    body, read as it's consumed (see `bulk_ingest.iter_ndjson`).
+    """
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return iter_ndjson(stream if stream is not None else ())
+
+
+class BulkIngestView(APIView):
+    """`POST` an NDJSON body of rows for bulk ingest target `target` (see
+    `coreapp.bulk_ingest`), needs the "add" permission of its model.
+    Responds with the ingest report.
+    """
+
+    parser_classes = [NDJSONParser]
+
+    def post(self, request, target):
+        config = get_targets().get(target)
+        if config is None:
+            raise Http404(f"No bulk ingest target {target!r}")
+        ingester = BulkIngester(target, config)
+        if not request.user.has_perm(ingester.permission):
+            raise PermissionDenied()
+        report = ingester.ingest(request.data)
+        return Response(report.as_dict())
@@ -1,21 +1,112 @@
 from __future__ import unicode_literals
+import hashlib
+import uuid
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import transaction
 
 UserModel = get_user_model()
 
+# Seconds to remember that an email has no account. NOTE: with the default
+# per-process LocMemCache, a signup only clears its own process's entry, so
+# keep this short unless a shared cache (eg. Redis) is configured.
+NEGATIVE_CACHE_TTL = getattr(settings, "AUTH_UNKNOWN_EMAIL_CACHE_TTL", 30)
+
+
+def _unknown_email_key(email):
+    return "auth:unknown-email:" + hashlib.sha256(email.encode("utf-8")).hexdigest()
+
+
+def forget_unknown_email(email):
+    cache.delete(_unknown_email_key(UserModel.objects.normalize_email(email)))
+
+
+# Seconds to cache a user's permission strings (also the bound on staleness
+# for other processes when the cache isn't shared, see above).
+PERMISSION_CACHE_TTL = getattr(settings, "AUTH_PERMISSION_CACHE_TTL", 300)
+_PERMISSIONS_STAMP_KEY = "auth:perms-stamp"
+
+
+def _permissions_key(user_id):
+    # the stamp changes when group permissions / permissions themselves change,
+    # which invalidates every user's entry at once
+    stamp = cache.get(_PERMISSIONS_STAMP_KEY)
+    if stamp is None:
+        cache.add(_PERMISSIONS_STAMP_KEY, uuid.uuid4().hex, None)
+        stamp = cache.get(_PERMISSIONS_STAMP_KEY)
+    return f"auth:perms:{stamp}:{user_id}"
+
+
+# (both on commit of the current transaction on DB `using`: done earlier,
+# other requests could cache the permissions still committed again)
+def forget_user_permissions(user_id, using=None):
+    transaction.on_commit(lambda: cache.delete(_permissions_key(user_id)), using=using)
+
+
+def forget_all_permissions(using=None):
+    transaction.on_commit(lambda: cache.set(_PERMISSIONS_STAMP_KEY, uuid.uuid4().hex, None), using=using)
+
+
+def get_cached_permissions(user_obj):
+    """`{"user": {"app.codename", ...}, "group": {...}}` for an active user,
+    computed with at most 2 queries and then cached (invalidated by the
+    signals in `coreapp.signals`).
+    """
+    key = _permissions_key(user_obj.pk)
+    perms = cache.get(key)
+    if perms is None:
+        if user_obj.is_superuser:
+            all_perms = _perm_strings(Permission.objects.all())
+            perms = {"user": all_perms, "group": all_perms}
+        else:
+            perms = {
+                "user": _perm_strings(Permission.objects.filter(user__id=user_obj.pk)),
+                "group": _perm_strings(Permission.objects.filter(group__user__id=user_obj.pk)),
+            }
+        cache.set(key, perms, PERMISSION_CACHE_TTL)
+    return perms
+
+
+def _perm_strings(permissions):
+    rows = permissions.values_list("content_type__app_label", "codename").order_by()
+    return {f"{app_label}.{codename}" for app_label, codename in rows}
+
 
 class CustomModelBackend(ModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
         if username is None:
             username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return
+        # CASE-INSENSITIVE email comparison on login! Emails are stored
+        # lowercased (see `UserManager.normalize_email`) so this is an exact,
+        # index backed lookup.
+        email = UserModel.objects.normalize_email(username)
+        unknown_key = _unknown_email_key(email)
         try:
-            # CASE-INSENSITIVE email comparison on login!
-            user = UserModel._default_manager.get(email__iexact=username)
+            if cache.get(unknown_key):
+                raise UserModel.DoesNotExist
+            user = UserModel._default_manager.get(email=email)
         except UserModel.DoesNotExist:
-            # Run the default password hasher once to reduce the timing
-            # difference between an existing and a nonexistent user (#20760).
+            # Don't hit the DB again for this email for a while (credential
+            # stuffing bursts), but still run the default password hasher
+            # once to reduce the timing difference between an existing and a
+            # nonexistent user (#20760).
+            cache.set(unknown_key, True, NEGATIVE_CACHE_TTL)
             UserModel().set_password(password)
         else:
             if user.check_password(password) and self.user_can_authenticate(user):
                 return user
+
+    def _get_permissions(self, user_obj, obj, from_name):
+        # same as ModelBackend's, but shared across requests through the cache
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        perm_cache_name = "_%s_perm_cache" % from_name
+        if not hasattr(user_obj, perm_cache_name):
+            setattr(user_obj, perm_cache_name, get_cached_permissions(user_obj)[from_name])
+        return getattr(user_obj, perm_cache_name)
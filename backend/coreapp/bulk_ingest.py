@@ -0,0 +1,397 @@
+"""
+Bulk ingestion of rows (eg. feed items) into a model, thousands of rows per
+second instead of one `save()` each.
+
+Targets are configured in settings, eg.:
+
+    BULK_INGEST_TARGETS = {
+        "items": {
+            "model": "coreapp.Item",
+            # unique column rows are deduplicated on (MUST have a unique index)
+            "unique_field": "url_canonical",
+            # optional: fill `unique_field` with `canonical_url(row[...])`
+            "canonical_url_from": "url",
+            # optional: fields accepted from input (default: all concrete ones)
+            "fields": ["url", "title", "published_at", "source_id"],
+            # optional: "ignore" (default) or "update" rows already there
+            "on_conflict": "ignore",
+        },
+    }
+
+Each batch is validated with the model fields' own `to_python` / validators
+(no DRF serializer, no model instances on Postgres), deduplicated, then
+written in one transaction:
+- Postgres: `COPY` into a temporary staging table (one per DB session and
+  set of columns, emptied for each batch), then
+  `INSERT ... SELECT ... ON CONFLICT (unique_field) DO NOTHING / UPDATE`
+- other DBs: `bulk_create(..., ignore_conflicts=True)` (and `bulk_update` of
+  the existing rows with "update")
+NOTE: this skips `save()` and signals, `auto_now(_add)` fields are filled in.
+
+Usage
+-----
+
+    report = ingest("items", rows)  # rows: iterable of dicts
+    report = ingest_ndjson("items", open("items.ndjson", "rb"))
+    report.inserted, report.rows_per_s
+
+or `POST /api/v1/ingest/items/` with an NDJSON body (see `api_views`).
+"""
+import datetime as dtm
+import decimal
+import hashlib
+import io
+import logging
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.db.models import DateTimeField
+from django.utils import timezone
+
+from backend import jsonlib
+from backend.utils import canonical_url
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+
+
+class InvalidLine(NamedTuple):
+    """An input line that isn't valid JSON."""
+    line_no: int
+    error: str
+
+
+class BatchReport(NamedTuple):
+    rows: int
+    inserted: int
+    updated: int
+    seconds: float
+
+
+class IngestReport:
+    def __init__(self, target: str):
+        self.target = target
+        self.received = 0
+        self.invalid = 0
+        self.duplicates = 0  # same unique value as an earlier row of the input
+        self.inserted = 0
+        self.updated = 0
+        self.existing = 0  # already in the DB (and not updated)
+        self.seconds = 0.0
+        self.batches: List[BatchReport] = []
+        self.errors: List[Dict[str, Any]] = []  # (first `MAX_REPORTED_ERRORS`)
+
+    @property
+    def rows_per_s(self) -> float:
+        return self.received / self.seconds if self.seconds else 0.0
+
+    def add_error(self, row_no: int, errors: Any):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_no, "errors": errors})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "target": self.target,
+            "received": self.received,
+            "invalid": self.invalid,
+            "duplicates": self.duplicates,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "existing": self.existing,
+            "seconds": round(self.seconds, 3),
+            "rows_per_s": round(self.rows_per_s, 1),
+            "batches": [b._asdict() for b in self.batches],
+            "errors": self.errors,
+        }
+
+
+def get_targets() -> Dict[str, dict]:
+    return getattr(settings, "BULK_INGEST_TARGETS", {})
+
+
+class BulkIngester:
+    def __init__(self, name: str, config: dict):
+        self.name = name
+        self.model = apps.get_model(config["model"])
+        opts = self.model._meta
+        self.unique_field = opts.get_field(config["unique_field"])
+        self.canonical_url_from = config.get("canonical_url_from")
+        self.on_conflict = config.get("on_conflict", "ignore")
+        if self.on_conflict not in ("ignore", "update"):
+            raise ValueError(f"Bad on_conflict for bulk ingest target {name!r}: {self.on_conflict!r}")
+
+        # all concrete fields but auto pks are written (defaults for missing ones)
+        self.fields = [f for f in opts.concrete_fields if not f.auto_created and f is not opts.auto_field]
+        accepted = config.get("fields")
+        if accepted is None:
+            self.accepted = {f.attname for f in self.fields} | {f.name for f in self.fields}
+        else:
+            self.accepted = set(accepted)
+        if self.canonical_url_from:  # (computed, never taken from the input)
+            self.accepted -= {self.unique_field.name, self.unique_field.attname}
+
+    @property
+    def permission(self) -> str:
+        return f"{self.model._meta.app_label}.add_{self.model._meta.model_name}"
+
+    # Validation
+    #################################################################
+
+    def clean_row(self, row: Any) -> Dict[str, Any]:
+        """Dict of `attname: python value` for all fields written, or raise
+        `ValidationError` (with a dict of errors per field).
+        """
+        if not isinstance(row, dict):
+            raise ValidationError({"__all__": ["Expected a JSON object."]})
+        errors = {}
+        unknown = set(row) - self.accepted
+        if unknown:
+            errors["__all__"] = [f"Unknown fields: {', '.join(sorted(unknown))}"]
+        if self.canonical_url_from:
+            try:
+                row = {**row, self.unique_field.name: canonical_url(row[self.canonical_url_from])}
+            except (KeyError, TypeError, ValueError, AttributeError):
+                errors[self.canonical_url_from] = ["A valid URL is required."]
+
+        now = timezone.now()
+        cleaned = {}
+        for field in self.fields:
+            if field.name in row:
+                value = row[field.name]
+            elif field.attname in row:
+                value = row[field.attname]
+            elif getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False):
+                cleaned[field.attname] = now if isinstance(field, DateTimeField) else now.date()
+                continue
+            elif field.has_default() or field.null:
+                cleaned[field.attname] = field.get_default()
+                continue
+            elif field.blank and field.empty_strings_allowed:
+                cleaned[field.attname] = ""
+                continue
+            else:
+                errors[field.name] = ["This field is required."]
+                continue
+            try:
+                if field.is_relation:
+                    # (just the FK value: checking the related row exists is left to the DB)
+                    value = field.target_field.to_python(value)
+                    if value is None and not field.null:
+                        raise ValidationError("This field cannot be null.")
+                else:
+                    value = field.clean(value, None)
+            except ValidationError as e:
+                errors[field.name] = e.messages
+                continue
+            cleaned[field.attname] = value
+        if self.canonical_url_from in errors:  # (already reported, as its source field)
+            errors.pop(self.unique_field.name, None)
+        if errors:
+            raise ValidationError(errors)
+        return cleaned
+
+    # Writing
+    #################################################################
+
+    def ingest(self, rows: Iterable[Any], batch_size: int = DEFAULT_BATCH_SIZE,
+               report: Optional[IngestReport] = None) -> IngestReport:
+        report = report or IngestReport(self.name)
+        t0 = time.perf_counter()
+        seen = set()
+        batch = []
+        unique_attname = self.unique_field.attname
+        for row in rows:
+            report.received += 1
+            if isinstance(row, InvalidLine):
+                report.add_error(row.line_no, {"__all__": [row.error]})
+                continue
+            try:
+                cleaned = self.clean_row(row)
+            except ValidationError as e:
+                report.add_error(report.received, e.message_dict)
+                continue
+            key = cleaned[unique_attname]
+            if key in seen:
+                report.duplicates += 1
+                continue
+            seen.add(key)
+            batch.append(cleaned)
+            if len(batch) >= batch_size:
+                self.write_batch(batch, report)
+                batch = []
+                # (keep memory bounded, rows duplicating ones of earlier
+                # batches are caught by the DB)
+                seen = set()
+        if batch:
+            self.write_batch(batch, report)
+        report.seconds = time.perf_counter() - t0
+        logger.info(
+            "Bulk ingest %s: %d rows (%d inserted, %d updated, %d existing, %d invalid, %d duplicates) "
+            "in %.2fs, %.0f rows/s",
+            self.name, report.received, report.inserted, report.updated, report.existing,
+            report.invalid, report.duplicates, report.seconds, report.rows_per_s,
+        )
+        return report
+
+    def write_batch(self, rows: List[Dict[str, Any]], report: IngestReport):
+        t0 = time.perf_counter()
+        using = router.db_for_write(self.model)
+        connection = connections[using]
+        with transaction.atomic(using=using):
+            if connection.vendor == "postgresql":
+                inserted, updated = self._write_postgresql(connection, rows)
+            else:
+                inserted, updated = self._write_bulk_create(using, rows)
+        seconds = time.perf_counter() - t0
+        report.inserted += inserted
+        report.updated += updated
+        report.existing += len(rows) - inserted - updated
+        report.batches.append(BatchReport(len(rows), inserted, updated, round(seconds, 4)))
+        logger.debug("Bulk ingest %s: batch of %d rows in %.3fs", self.name, len(rows), seconds)
+
+    def _write_postgresql(self, connection, rows):
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        columns = ", ".join(qn(f.column) for f in self.fields)
+        staging = qn(self._staging_table(connection))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging} "
+                f"(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+            )
+            # (emptied on commit only: batches in an outer transaction would
+            # insert the earlier batches' rows again)
+            cursor.execute(f"TRUNCATE {staging}")
+            try:
+                data = self._copy_data(connection, rows)
+            except _NotCopyable:
+                # eg. array columns: INSERT the staging rows the slower way
+                placeholders = "(" + ", ".join(["%s"] * len(self.fields)) + ")"
+                cursor.executemany(
+                    f"INSERT INTO {staging} ({columns}) VALUES {placeholders}",
+                    [[f.get_db_prep_save(row[f.attname], connection) for f in self.fields] for row in rows],
+                )
+            else:
+                cursor.cursor.copy_expert(f"COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)", data)
+
+            conflict = f"ON CONFLICT ({qn(self.unique_field.column)}) DO NOTHING"
+            if self.on_conflict == "update":
+                updated_columns = [
+                    qn(f.column) for f in self.fields
+                    if f is not self.unique_field and not getattr(f, "auto_now_add", False)
+                ]
+                conflict = (
+                    f"ON CONFLICT ({qn(self.unique_field.column)}) DO UPDATE SET "
+                    + ", ".join(f"{c} = EXCLUDED.{c}" for c in updated_columns)
+                )
+            # (`xmax = 0` for rows inserted, not updated)
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} {conflict} "
+                f"RETURNING (xmax = 0)"
+            )
+            results = [inserted for inserted, in cursor.fetchall()]
+        inserted = sum(results)
+        return inserted, len(results) - inserted
+
+    def _staging_table(self, connection) -> str:
+        """Name of the temporary staging table, keyed by the columns (and
+        their types) written: it's created once per DB session, and a session
+        (persistent / pooled connection) can outlive a migration of the table.
+        """
+        columns = ",".join(f"{f.column} {f.db_type(connection)}" for f in self.fields)
+        key = hashlib.md5(columns.encode("utf-8")).hexdigest()[:12]
+        # (key first: Postgres truncates names to 63 characters)
+        return f"bulk_ingest_{key}_{self.model._meta.db_table}"[:63]
+
+    def _copy_data(self, connection, rows):
+        buf = io.StringIO()
+        for row in rows:
+            buf.write(",".join(
+                _copy_value(f.get_db_prep_save(row[f.attname], connection)) for f in self.fields
+            ))
+            buf.write("\n")
+        buf.seek(0)
+        return buf
+
+    def _write_bulk_create(self, using, rows):
+        unique_attname = self.unique_field.attname
+        manager = self.model._default_manager.db_manager(using)
+        keys = [r[unique_attname] for r in rows]
+        existing = {}
+        for i in range(0, len(keys), 500):  # (bounded number of query params)
+            existing.update(
+                manager.filter(**{f"{unique_attname}__in": keys[i:i + 500]}).values_list(unique_attname, "pk")
+            )
+        new = [self.model(**r) for r in rows if r[unique_attname] not in existing]
+        # (batches sized by the DB backend, eg. SQLite limits query params)
+        manager.bulk_create(new, ignore_conflicts=True)
+        updated = 0
+        if self.on_conflict == "update" and existing:
+            fields = [
+                f.name for f in self.fields
+                if f is not self.unique_field and not getattr(f, "auto_now_add", False)
+            ]
+            objs = []
+            for r in rows:
+                pk = existing.get(r[unique_attname])
+                if pk is not None:
+                    obj = self.model(**r)
+                    obj.pk = pk
+                    objs.append(obj)
+            manager.bulk_update(objs, fields, batch_size=500)
+            updated = len(objs)
+        return len(new), updated
+
+
+def ingest(target: str, rows: Iterable[Any], batch_size: int = DEFAULT_BATCH_SIZE) -> IngestReport:
+    return BulkIngester(target, get_targets()[target]).ingest(rows, batch_size)
+
+
+def iter_ndjson(lines: Iterable[bytes]) -> Iterable[Any]:
+    """Parsed values of NDJSON `lines` (blank ones skipped), an `InvalidLine`
+    for each line that isn't valid JSON.
+    """
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield jsonlib.loads(line)
+        except ValueError as e:
+            yield InvalidLine(line_no, f"Invalid JSON: {e}")
+
+
+def ingest_ndjson(target: str, lines: Iterable[bytes], batch_size: int = DEFAULT_BATCH_SIZE) -> IngestReport:
+    return ingest(target, iter_ndjson(lines), batch_size)
+
+
+class _NotCopyable(Exception):
+    pass
+
+
+def _copy_value(value) -> str:
+    """`value` (as prepared for the DB) as a CSV field for `COPY`: quoted,
+    except for NULLs (unquoted empty fields).
+    """
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        value = "t" if value else "f"
+    elif isinstance(value, (int, float, decimal.Decimal, uuid.UUID)):
+        value = str(value)
+    elif isinstance(value, (dtm.datetime, dtm.date, dtm.time)):
+        value = value.isoformat()
+    elif hasattr(value, "adapted") and hasattr(value, "dumps"):  # JSON adapters
+        value = value.dumps(value.adapted)
+    elif not isinstance(value, str):
+        raise _NotCopyable(type(value))
+    return '"' + value.replace('"', '""') + '"'
+
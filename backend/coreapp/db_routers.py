@@ -1,24 +1,395 @@
-# class CoreDBRouter:
-#     meta_db = 'mindfeeder_core'
-#     route_to_db = 'mindfeeder_core'
-#     migrations_allowed = False
-
-#     def db_for_read(self, model, **hints):
-#         # import ipdb; ipdb.set_trace()
-#         if getattr(model, '_db', None) == self.meta_db:
-#             return self.route_to_db
-#         return None  # None means "let other routers decide (eg. default)"
-
-#     def db_for_write(self, model, **hints):
-#         if getattr(model, '_db', None) == self.meta_db:
-#             return self.route_to_db
-#         return None  # None means "let other routers decide (eg. default)"
-
-#     def allow_relation(self, obj1, obj2, **hints):
-#         # only objects in same db can be related
-#         return getattr(obj1, '_db', -1) == getattr(obj2._meta, '_db', -2)
-
-#     def allow_migrate(self, db, app_label, model_name=None, **hints):
-#         if db == self.meta_db:
-#             return self.migrations_allowed
-#         return None  # None means "let other routers decide
+"""
+Database routing: reads of selected models from read replicas, everything
+else (and all writes) on the primary, models hinted to another database with
+a `_db` class attribute on that one.
+
+Configured by `settings.DB_ROUTING` (see `DEFAULTS` below for all keys):
+
+    DATABASES = {"default": {...}, "replica1": {...}, "replica2": {...}}
+    DB_ROUTING = {
+        "REPLICAS": {"replica1": 2, "replica2": 1},  # alias: weight
+        "REPLICATED_MODELS": ["coreapp.Item", "coreapp.ItemWeekTopic"],  # or app labels, or "__all__"
+        "STICKY_SECONDS": 5,
+        "MAX_LAG_SECONDS": 30,
+    }
+
+Reads
+- go to the replicas in (smooth) weighted round-robin, skipping the ones
+  down or lagging more than `MAX_LAG_SECONDS` (checked at most every
+  `HEALTH_CHECK_INTERVAL` seconds per process, on a connection of its own
+  opened with a `HEALTH_CHECK_TIMEOUT`), and to the primary when none is
+  usable
+- go to another replica, or the primary, when the one picked can't be
+  connected to, and it's skipped until its next check (same after any
+  query failing with an `OperationalError` on it, but that query isn't
+  retried)
+- stay on the primary for `STICKY_SECONDS` after a write, in the same
+  thread / request, and for the next requests of the same client (cookie)
+  or user (cache), see `PrimaryPinningMiddleware`, so users see their own
+  writes despite the replication lag
+- stay on the primary inside transactions, and on the DB of the instance
+  for its related objects
+
+Models with a `_db` attribute (eg. `_db = "mindfeeder_core"`) are read from
+and written to `MODEL_DATABASES.get(_db, _db)` when that's a configured DB
+(with no migrations run there), and can only be related to each other.
+
+Usage
+-----
+
+    DATABASE_ROUTERS = ["coreapp.db_routers.ReplicaRouter"]
+    MIDDLEWARE = [..., "coreapp.db_routers.PrimaryPinningMiddleware"]  # (after auth)
+"""
+import contextvars
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.db.backends.signals import connection_created
+from django.utils.functional import cached_property, empty
+
+from backend.async_db import run_in_db_thread
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "PRIMARY": DEFAULT_DB_ALIAS,
+    "REPLICAS": {},  # alias: weight
+    # "app_label.ModelName"s and / or "app_label"s read from the replicas
+    "REPLICATED_MODELS": (),
+    # reads stay on the primary for this long after a write
+    "STICKY_SECONDS": 5,
+    "STICKY_COOKIE": "db_pinned",
+    "HEALTH_CHECK_INTERVAL": 10,
+    # connect timeout of the checks, run inline by the request doing them
+    "HEALTH_CHECK_TIMEOUT": 2,
+    # replicas lagging more are skipped (Postgres only, None: no check)
+    "MAX_LAG_SECONDS": 30,
+    # `_db` model attribute value: DB alias (default: the same name)
+    "MODEL_DATABASES": {},
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "DB_ROUTING", {})}
+
+
+class _PinState:
+    """Primary pinning of the current request (or thread, outside requests)."""
+
+    __slots__ = ("pinned_until", "wrote", "user_checked")
+
+    def __init__(self, pinned_until=0.0):
+        self.pinned_until = pinned_until
+        self.wrote = False
+        self.user_checked = False
+
+
+_pin_state = contextvars.ContextVar("db_pin_state", default=None)
+_request = contextvars.ContextVar("db_pin_request", default=None)
+
+
+def _get_pin_state() -> _PinState:
+    state = _pin_state.get()
+    if state is None:
+        state = _PinState()
+        _pin_state.set(state)
+    return state
+
+
+def pin_to_primary(seconds: Optional[float] = None):
+    """Send the reads of the current request / thread to the primary, for
+    `seconds` (default: `STICKY_SECONDS`).
+    """
+    state = _get_pin_state()
+    seconds = get_config()["STICKY_SECONDS"] if seconds is None else seconds
+    state.pinned_until = max(state.pinned_until, time.monotonic() + seconds)
+
+
+def _user_pin_key(user_pk) -> str:
+    return f"db:pinned:{user_pk}"
+
+
+class ReplicaHealth:
+    """Up / lag status of a replica, re-checked at most every `interval` s."""
+
+    def __init__(self, alias: str, interval: float, max_lag_s: Optional[float], timeout_s: float = 2):
+        self.alias = alias
+        self.interval = interval
+        self.max_lag_s = max_lag_s
+        self.timeout_s = timeout_s
+        self.healthy = True
+        self.lag_s: Optional[float] = None
+        self.checked_at = float("-inf")
+        self._lock = threading.Lock()
+        self._checking = False
+
+    def is_healthy(self) -> bool:
+        if time.monotonic() - self.checked_at >= self.interval:
+            with self._lock:  # (one thread checks, the others use the last status)
+                check = not self._checking
+                self._checking = True
+            if check:
+                try:
+                    self.check()
+                finally:
+                    self._checking = False
+        return self.healthy
+
+    def check(self):
+        vendor = connections[self.alias].vendor
+        try:
+            conn = self._connect()
+            try:
+                cursor = conn.cursor()
+                if vendor == "postgresql":
+                    # (caught up when all the WAL received is replayed, NULLs
+                    # when not replaying, eg. on a primary)
+                    cursor.execute(
+                        "SELECT pg_last_wal_receive_lsn() IS NULL"
+                        " OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn(),"
+                        " EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())"
+                    )
+                    caught_up, lag_s = cursor.fetchone()
+                    if caught_up:
+                        self.lag_s = 0.0
+                    else:
+                        self.lag_s = float(lag_s) if lag_s is not None else float("inf")
+                else:
+                    cursor.execute("SELECT 1")
+                    self.lag_s = 0.0
+            finally:
+                conn.close()
+        except Exception as exc:
+            if self.healthy:
+                logger.warning("DB replica %s is down: %s", self.alias, exc)
+            self.healthy = False
+            self.lag_s = None
+        else:
+            healthy = self.max_lag_s is None or self.lag_s <= self.max_lag_s
+            if healthy != self.healthy:
+                logger.warning("DB replica %s is %s (lag %.1fs)", self.alias, "up" if healthy else "lagging", self.lag_s)
+            self.healthy = healthy
+        self.checked_at = time.monotonic()
+
+    def _connect(self):
+        """A new DB-API connection to the replica, outside of Django's (and of
+        any pool), opened with `timeout_s`.
+        """
+        connection = connections[self.alias]
+        params = connection.get_connection_params()
+        if connection.vendor in ("postgresql", "mysql"):
+            params["connect_timeout"] = max(int(self.timeout_s), 1)
+        return connection.Database.connect(**params)
+
+    def mark_down(self, exc=None):
+        """Skip this replica until its next check (eg. after a query failed)."""
+        if self.healthy:
+            logger.warning("DB replica %s is down: %s", self.alias, exc)
+        self.healthy = False
+        self.checked_at = time.monotonic()
+
+
+class ReplicaRouter:
+    def __init__(self):
+        config = get_config()
+        self.primary = config["PRIMARY"]
+        self.weights: Dict[str, int] = {
+            alias: weight for alias, weight in config["REPLICAS"].items()
+            if alias in settings.DATABASES and weight > 0
+        }
+        self.health = {
+            alias: ReplicaHealth(
+                alias, config["HEALTH_CHECK_INTERVAL"], config["MAX_LAG_SECONDS"], config["HEALTH_CHECK_TIMEOUT"]
+            )
+            for alias in self.weights
+        }
+        if self.weights:
+            connection_created.connect(self._on_connection_created)
+        replicated = {label.lower() for label in config["REPLICATED_MODELS"]}
+        self.replicate_all = "__all__" in replicated
+        self.replicated = replicated
+        self.sticky_s = config["STICKY_SECONDS"]
+        self.model_databases = config["MODEL_DATABASES"]
+        self._current_weights = {alias: 0 for alias in self.weights}
+        self._lock = threading.Lock()
+
+    # Routing
+    #################################################################
+
+    def db_for_read(self, model, **hints):
+        db = self._hinted_db(model)
+        if db is not None:
+            return db
+        if not self.weights or not self._is_replicated(model):
+            return None
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return None  # (related objects come from the instance's DB)
+        if self._is_pinned():
+            return self.primary
+        return self._connectable_replica() or self.primary
+
+    def db_for_write(self, model, **hints):
+        db = self._hinted_db(model)
+        if db is not None:
+            return db
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db and self._db_group(instance._state.db) != self.primary:
+            # (eg. related objects of an instance of a test DB, or of the DB
+            # of `migrate --database`)
+            return instance._state.db
+        if self.weights:
+            state = _get_pin_state()
+            state.wrote = True
+            state.pinned_until = max(state.pinned_until, time.monotonic() + self.sticky_s)
+        return self.primary
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # primary & replicas hold the same data, other DBs only their own
+        return self._db_group(obj1._state.db) == self._db_group(obj2._state.db)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in self.weights:
+            return False  # (replicated from the primary)
+        if db in self._hinted_dbs:
+            return False  # (managed elsewhere)
+        return None
+
+    # Replicas
+    #################################################################
+
+    def pick_replica(self) -> Optional[str]:
+        """Next healthy replica in smooth weighted round-robin, or None."""
+        healthy = [alias for alias in self.weights if self.health[alias].is_healthy()]
+        if not healthy:
+            return None
+        with self._lock:
+            total = 0
+            for alias in healthy:
+                self._current_weights[alias] += self.weights[alias]
+                total += self.weights[alias]
+            alias = max(healthy, key=self._current_weights.__getitem__)
+            self._current_weights[alias] -= total
+        return alias
+
+    def _connectable_replica(self) -> Optional[str]:
+        """`pick_replica()`, skipping (and marking down) the replicas that
+        can't be connected to.
+        """
+        for _ in range(len(self.weights)):
+            alias = self.pick_replica()
+            if alias is None:
+                return None
+            try:
+                connections[alias].ensure_connection()  # (no-op when connected)
+            except OperationalError as exc:
+                self.health[alias].mark_down(exc)
+                continue
+            return alias
+        return None
+
+    def _on_connection_created(self, sender, connection, **kwargs):
+        if connection.alias in self.health and self._replica_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self._replica_query)
+
+    def _replica_query(self, execute, sql, params, many, context):
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as exc:
+            self.health[context["connection"].alias].mark_down(exc)
+            raise
+
+    def _is_replicated(self, model) -> bool:
+        opts = model._meta
+        return self.replicate_all or opts.label_lower in self.replicated or opts.app_label in self.replicated
+
+    def _is_pinned(self) -> bool:
+        if connections[self.primary].in_atomic_block:
+            return True
+        state = _get_pin_state()
+        if state.pinned_until > time.monotonic():
+            return True
+        if not state.user_checked:
+            # (once per request, when authentication has already loaded the user)
+            request = _request.get()
+            user = getattr(request, "user", None) if request is not None else None
+            if user is not None and getattr(user, "_wrapped", None) is not empty:
+                state.user_checked = True
+                if user.is_authenticated and cache.get(_user_pin_key(user.pk)):
+                    pin_to_primary(self.sticky_s)
+                    return True
+        return False
+
+    # `_db` hints
+    #################################################################
+
+    def _hinted_db(self, model) -> Optional[str]:
+        hint = getattr(model, "_db", None)
+        if hint is None:
+            return None
+        db = self.model_databases.get(hint, hint)
+        return db if db in settings.DATABASES else None
+
+    @cached_property
+    def _hinted_dbs(self):
+        return {self._hinted_db(model) for model in apps.get_models()} - {None}
+
+    def _db_group(self, db):
+        return self.primary if db is None or db in self.weights else db
+
+
+class PrimaryPinningMiddleware:
+    """Keeps the reads of a client (cookie) or user (cache) on the primary
+    for `STICKY_SECONDS` after a request of theirs wrote to the DB.
+    """
+
+    def __init__(self, get_response):
+        config = get_config()
+        if not config["REPLICAS"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sticky_s = config["STICKY_SECONDS"]
+        self.cookie = config["STICKY_COOKIE"]
+
+    def __call__(self, request):
+        state = self._new_state(request)
+        state_token = _pin_state.set(state)
+        request_token = _request.set(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _pin_state.reset(state_token)
+            _request.reset(request_token)
+        return self._pin_client(request, response, state)
+
+    async def async_call(self, request):
+        # (async views, see `backend.asgi_handler`: the DB threads run their
+        # queries in a copy of this context, sharing `state`)
+        state = self._new_state(request)
+        state_token = _pin_state.set(state)
+        request_token = _request.set(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pin_state.reset(state_token)
+            _request.reset(request_token)
+        return await run_in_db_thread(self._pin_client, request, response, state)
+
+    def _new_state(self, request):
+        pinned_until = time.monotonic() + self.sticky_s if request.COOKIES.get(self.cookie) else 0.0
+        return _PinState(pinned_until)
+
+    def _pin_client(self, request, response, state):
+        if state.wrote:
+            response.set_cookie(self.cookie, "1", max_age=self.sticky_s, httponly=True, samesite="Lax")
+            user = getattr(request, "user", None)
+            if user is not None and user.is_authenticated:
+                cache.set(_user_pin_key(user.pk), 1, self.sticky_s)
+        return response
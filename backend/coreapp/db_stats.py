@@ -0,0 +1,46 @@
+"""
+Cheap row count estimates from the DB's planner statistics, for when an exact
+`COUNT(*)` over a huge table is too slow and "about N" is good enough.
+
+- Postgres: `pg_class.reltuples` for a whole table, the planner's row estimate
+  (`EXPLAIN`) for a filtered queryset
+- SQLite: `sqlite_stat1` (only filled in after `ANALYZE`), whole tables only
+- anything else / no stats yet: None (callers should fall back to `count()`)
+"""
+from typing import Optional
+
+from django.db import DatabaseError, connections, router
+from django.db.models import QuerySet
+
+
+def estimate_count(queryset: QuerySet) -> Optional[int]:
+    """Approximate `queryset.count()`, or None if no estimate is available."""
+    using = queryset.db or router.db_for_read(queryset.model)
+    connection = connections[using]
+    query = queryset.query
+    is_whole_table = not query.where and not query.distinct and not query.low_mark and query.high_mark is None
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                if is_whole_table:
+                    cursor.execute(
+                        "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+                        [connection.ops.quote_name(queryset.model._meta.db_table)],
+                    )
+                    row = cursor.fetchone()
+                    # reltuples is -1 (0 before PG 14) for never analyzed tables
+                    return row[0] if row and row[0] > 0 else None
+                sql, params = query.sql_with_params()
+                cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+                plan = cursor.fetchone()[0]
+                return int(plan[0]["Plan"]["Plan Rows"])
+            if connection.vendor == "sqlite" and is_whole_table:
+                cursor.execute(
+                    "SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+                return int(row[0].split()[0]) if row else None
+    except DatabaseError:  # eg. sqlite_stat1 doesn't exist before the first ANALYZE
+        return None
+    return None
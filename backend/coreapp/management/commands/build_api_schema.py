@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from backend.api_schema import get_code_version, get_config, get_schema
+
+
+class Command(BaseCommand):
+    help = "Build the OpenAPI schema of the current code version and save it (see backend.api_schema)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="rebuild even if already saved")
+
+    def handle(self, *args, **options):
+        schema = get_schema(rebuild=options["force"])
+        self.stdout.write(f"API schema for code version {get_code_version()} in {get_config()['CACHE_DIR']}:")
+        for fmt, body in schema.items():
+            sizes = ", ".join(f"{encoding} {len(content)}" for encoding, content in body.encoded.items())
+            self.stdout.write(f"  {fmt}: {len(body.content)} bytes ({sizes}), ETag {body.etag}")
@@ -0,0 +1,70 @@
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+# "import time: <self us> | <cumulative us> | <indentation><module>"
+IMPORTTIME_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+# what a worker imports on boot (the settings module is set from the env)
+BOOT_CODE = """
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+import {application}
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Profile the imports of a worker booting (`python -X importtime` in a fresh "
+        "process): slowest packages and modules, by cumulative or self time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--application", default="backend.wsgi", help="module of the app (default: backend.wsgi)")
+        parser.add_argument("--top", type=int, default=25, help="number of modules listed")
+        parser.add_argument("--sort", choices=("cumulative", "self"), default="cumulative")
+        parser.add_argument("--warmup", action="store_true", help="also run `backend.warmup.warmup()`")
+
+    def handle(self, *args, **options):
+        code = BOOT_CODE.format(application=options["application"])
+        if options["warmup"]:
+            code += "from backend.warmup import warmup\nwarmup()\n"
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "backend.settings")}
+        p = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code], stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE, env=env,
+        )
+        err = p.stderr.decode("utf-8", errors="replace")
+        if p.returncode != 0:
+            raise CommandError(f"Booting failed:\n{err[-3000:]}")
+
+        modules = []  # (self us, cumulative us, depth, name)
+        for line in err.splitlines():
+            m = IMPORTTIME_LINE_RE.match(line)
+            if m:
+                self_us, cumulative_us, indent, name = m.groups()
+                modules.append((int(self_us), int(cumulative_us), len(indent) // 2, name))
+        if not modules:
+            raise CommandError("No import times in the output (is this Python >= 3.7?)")
+
+        total_us = sum(m[0] for m in modules)
+        by_package = defaultdict(int)
+        for self_us, _cumulative_us, _depth, name in modules:
+            by_package[name.partition(".")[0]] += self_us
+
+        self.stdout.write(f"{len(modules)} modules imported in {total_us / 1000:.1f} ms\n")
+        self.stdout.write("By top level package (self time):")
+        for package, self_us in sorted(by_package.items(), key=lambda kv: -kv[1])[:options["top"]]:
+            self.stdout.write(f"  {self_us / 1000:8.1f} ms  {self_us / total_us:5.1%}  {package}")
+
+        key = 1 if options["sort"] == "cumulative" else 0
+        self.stdout.write(f"\nModules (by {options['sort']} time):")
+        self.stdout.write(f"  {'self ms':>8} {'cumul ms':>9}  module")
+        for self_us, cumulative_us, depth, name in sorted(modules, key=lambda m: -m[key])[:options["top"]]:
+            self.stdout.write(f"  {self_us / 1000:8.1f} {cumulative_us / 1000:9.1f}  {name}")
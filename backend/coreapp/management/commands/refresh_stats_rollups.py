@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from coreapp.stats_rollups import get_sources, refresh_rollups
+
+
+class Command(BaseCommand):
+    help = "Incrementally refresh the hourly / daily stats rollups (see coreapp.stats_rollups)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("sources", nargs="*", help="sources to refresh (default: all configured)")
+        parser.add_argument("--full", action="store_true", help="rebuild from scratch instead")
+
+    def handle(self, *args, **options):
+        sources = options["sources"] or None
+        unknown = set(sources or ()) - set(get_sources())
+        if unknown:
+            raise CommandError(f"Unknown stats rollup sources: {', '.join(sorted(unknown))}")
+        for source, n_buckets in refresh_rollups(sources, full=options["full"]).items():
+            self.stdout.write(f"{source}: {n_buckets} buckets refreshed")
@@ -0,0 +1,65 @@
+# Generated by Django 3.0.5 on 2026-10-17 01:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coreapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsRollupWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=64, unique=True)),
+                ('last_pk', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StatsRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=64)),
+                ('granularity', models.CharField(choices=[('hour', 'hour'), ('day', 'day')], max_length=8)),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': '[Rollup] Stats',
+                'verbose_name_plural': '[Rollup] Stats',
+                'ordering': ('-bucket_start', 'source'),
+                'unique_together': {('source', 'granularity', 'bucket_start')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyStatsRollup',
+            fields=[
+            ],
+            options={
+                'verbose_name': '[Rollup] Created by Day',
+                'verbose_name_plural': '[Rollup] Created by Day',
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('coreapp.statsrollup',),
+        ),
+        migrations.CreateModel(
+            name='HourlyStatsRollup',
+            fields=[
+            ],
+            options={
+                'verbose_name': '[Rollup] Created by Hour',
+                'verbose_name_plural': '[Rollup] Created by Hour',
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('coreapp.statsrollup',),
+        ),
+    ]
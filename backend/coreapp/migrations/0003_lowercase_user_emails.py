@@ -0,0 +1,34 @@
+# Generated by Django 3.0.5 on 2026-10-17 02:05
+
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def lowercase_emails(apps, schema_editor):
+    User = apps.get_model('coreapp', 'User')
+    users = User.objects.using(schema_editor.connection.alias)
+    clashes = list(
+        users.annotate(email_lower=Lower('email'))
+        .values('email_lower')
+        .annotate(n=Count('id'))
+        .filter(n__gt=1)
+        .values_list('email_lower', flat=True)
+    )
+    if clashes:
+        raise RuntimeError(
+            "Can't lowercase user emails, some differ only by case (merge or rename "
+            "these accounts first): " + ", ".join(clashes)
+        )
+    users.exclude(email=Lower('email')).update(email=Lower('email'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coreapp', '0002_stats_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(lowercase_emails, migrations.RunPython.noop),
+    ]
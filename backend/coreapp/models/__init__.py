@@ -1,3 +1,4 @@
 from .auth_models import User
+from .stats_models import StatsRollup, StatsRollupWatermark, HourlyStatsRollup, DailyStatsRollup
 from .mindfeeder_core_models import *  # edit this
 from .mindfeeder_core_views import *  # edit this
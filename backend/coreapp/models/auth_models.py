@@ -41,6 +41,16 @@ from django.utils.translation import ugettext_lazy as _
 class UserManager(DefaultUserManager):
     """Define a model manager for User model with no username field."""
 
+    @classmethod
+    def normalize_email(cls, email):
+        """Lowercase the WHOLE address, so logins can do an exact (indexed)
+        lookup instead of a case-insensitive one.
+        """
+        return super().normalize_email(email).lower()
+
+    def get_by_natural_key(self, username):
+        return self.get(**{self.model.USERNAME_FIELD: self.normalize_email(username)})
+
     def _create_user(self, email, password, **extra_fields):
         """
         Create and save a user with the given username, email, and password.
@@ -78,5 +88,44 @@ class User(AbstractUser,):
 
     updated_at = models.DateTimeField(auto_now=True)
 
+    # bumped to revoke all issued JWTs (see `coreapp.token_auth`)
+    token_version = models.PositiveIntegerField(default=0, editable=False)
+    # (copied into the JWTs, changing them revokes the tokens)
+    TOKEN_CLAIM_FIELDS = ("email", "is_staff", "is_superuser")
+
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_token_fields()
+        return instance
+
+    def _remember_token_fields(self):
+        # (deferred fields aren't in `__dict__`, and can't have changed)
+        self._loaded_token_fields = {
+            name: self.__dict__[name] for name in ("is_active", *self.TOKEN_CLAIM_FIELDS) if name in self.__dict__
+        }
+
+    def _token_fields_changed(self, update_fields):
+        loaded = getattr(self, "_loaded_token_fields", {})
+        if not self.is_active and loaded.get("is_active", False):
+            return True  # (deactivated)
+        return any(
+            getattr(self, name) != loaded[name]
+            for name in self.TOKEN_CLAIM_FIELDS
+            if name in loaded and (update_fields is None or name in update_fields)
+        )
+
+    def save(self, *args, **kwargs):
+        # (`clean()` only runs for forms, this covers `create()`, scripts etc.)
+        self.email = self.__class__.objects.normalize_email(self.email)
+        # password / token claims changed or account deactivated => existing tokens are revoked
+        update_fields = kwargs.get("update_fields")
+        if self._password is not None or self._token_fields_changed(update_fields):
+            self.token_version += 1
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "token_version"}
+        super().save(*args, **kwargs)
+        self._remember_token_fields()
@@ -0,0 +1,69 @@
+from django.db import models
+
+
+# Stats rollups ("materialised views" refreshed by `manage.py refresh_stats_rollups`)
+#####################################################################
+
+
+class StatsRollup(models.Model):
+    """Number of rows of a source (see `settings.STATS_ROLLUP_SOURCES`)
+    created in each hour / day bucket.
+    """
+    HOUR = "hour"
+    DAY = "day"
+    GRANULARITY_CHOICES = ((HOUR, "hour"), (DAY, "day"))
+
+    source = models.CharField(max_length=64)
+    granularity = models.CharField(max_length=8, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    count = models.BigIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = (("source", "granularity", "bucket_start"),)
+        ordering = ("-bucket_start", "source")
+        verbose_name = "[Rollup] Stats"
+        verbose_name_plural = verbose_name
+
+    def __str__(self):
+        return f"{self.source} {self.granularity} {self.bucket_start:%Y-%m-%d %H:%M}: {self.count}"
+
+
+class StatsRollupWatermark(models.Model):
+    """Highest pk of a source already counted into the rollups."""
+    source = models.CharField(max_length=64, unique=True)
+    last_pk = models.BigIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source}: {self.last_pk}"
+
+
+class HourlyStatsRollupManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(granularity=StatsRollup.HOUR)
+
+
+class DailyStatsRollupManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(granularity=StatsRollup.DAY)
+
+
+class HourlyStatsRollup(StatsRollup):
+    objects = HourlyStatsRollupManager()
+
+    class Meta:
+        proxy = True
+        verbose_name = "[Rollup] Created by Hour"
+        verbose_name_plural = verbose_name
+
+
+class DailyStatsRollup(StatsRollup):
+    objects = DailyStatsRollupManager()
+
+    class Meta:
+        proxy = True
+        verbose_name = "[Rollup] Created by Day"
+        verbose_name_plural = verbose_name
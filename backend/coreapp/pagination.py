@@ -0,0 +1,170 @@
+"""
+Keyset ("seek") pagination: the project's default DRF pagination class.
+
+Each page is fetched with `WHERE (ordering columns) > (values of the last row
+seen) ORDER BY ... LIMIT page_size + 1`, so with an index on the ordering
+columns every page costs the same, however deep. Cursors are opaque, there's
+no page number and no `COUNT(*)` (pass `?with_count=1` to get a cheap
+`approximate_count` from the planner statistics instead).
+
+Ordering comes from (first one set): the view's `keyset_ordering`, an
+`OrderingFilter` on the view, or `KeysetPagination.ordering` ("-pk"). The
+primary key is appended as a tie-breaker when not already there. Ordering
+columns must be non-nullable fields of the model itself (no `__` lookups),
+eg. `keyset_ordering = ("-created_at", "-id")` backed by an index on
+`(created_at, id)`.
+"""
+import base64
+import binascii
+from collections import namedtuple
+from functools import reduce
+import operator
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from backend import jsonlib
+
+from .db_stats import estimate_count
+
+KeysetCursor = namedtuple("KeysetCursor", ["reverse", "position"])
+
+
+class KeysetPagination(CursorPagination):
+    ordering = "-pk"
+    page_size_query_param = "page_size"
+    max_page_size = 10000
+    count_query_param = "with_count"
+    count_query_description = _("Include an approximate total count (from DB statistics).")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.model = queryset.model
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+
+        self.approximate_count = None
+        if request.query_params.get(self.count_query_param) in ("1", "true"):
+            self.approximate_count = estimate_count(queryset)
+
+        if reverse:
+            queryset = queryset.order_by(*[_flip(f) for f in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(self._after_position_q(self.cursor.position, reverse))
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = self.cursor is not None, has_more
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, "keyset_ordering", None)
+        if ordering is None:
+            ordering = super().get_ordering(request, queryset, view)
+        ordering = list(ordering)
+        pk_names = {"pk", self.model._meta.pk.name}
+        if not any(f.lstrip("-") in pk_names for f in ordering):
+            ordering.append("-pk" if ordering[-1].startswith("-") else "pk")
+        return tuple(ordering)
+
+    def _field(self, name):
+        return self.model._meta.pk if name == "pk" else self.model._meta.get_field(name)
+
+    def _after_position_q(self, position, reverse):
+        """Rows after `position` in ordering (or before it, when `reverse`)."""
+        clauses = []
+        for i, field_name in enumerate(self.ordering):
+            name = field_name.lstrip("-")
+            desc = field_name.startswith("-") != reverse
+            lookups = {prev.lstrip("-"): position[j] for j, prev in enumerate(self.ordering[:i])}
+            lookups[f"{name}__{'lt' if desc else 'gt'}"] = position[i]
+            clauses.append(Q(**lookups))
+        return reduce(operator.or_, clauses)
+
+    def _get_position_from_instance(self, instance, ordering):
+        return [getattr(instance, self._field(f.lstrip("-")).attname) for f in ordering]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            data = jsonlib.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            values = data["p"]
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [self._field(f.lstrip("-")).to_python(v) for f, v in zip(self.ordering, values)]
+            return KeysetCursor(reverse=bool(data.get("r")), position=position)
+        except (TypeError, ValueError, KeyError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        data = {"p": cursor.position}
+        if cursor.reverse:
+            data["r"] = 1
+        encoded = base64.urlsafe_b64encode(jsonlib.dumps_bytes(data)).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(KeysetCursor(reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:  # went past the end, start over
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        position = self._get_position_from_instance(self.page[0], self.ordering)
+        return self.encode_cursor(KeysetCursor(reverse=True, position=position))
+
+    def get_paginated_response(self, data):
+        response = {"next": self.get_next_link(), "previous": self.get_previous_link()}
+        if self.approximate_count is not None:
+            response["approximate_count"] = self.approximate_count
+        response["results"] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema["properties"]["approximate_count"] = {"type": "integer", "nullable": True}
+        return schema
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters[0]["schema"] = {"type": "string"}
+        parameters.append(
+            {
+                "name": self.count_query_param,
+                "required": False,
+                "in": "query",
+                "description": str(self.count_query_description),
+                "schema": {"type": "boolean"},
+            }
+        )
+        return parameters
+
+
+def _flip(field_name):
+    return field_name[1:] if field_name.startswith("-") else "-" + field_name
@@ -0,0 +1,66 @@
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from .auth import forget_all_permissions, forget_unknown_email, forget_user_permissions
+from .models import User
+from .token_auth import forget_token_version, revoke_user_tokens
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, using, update_fields, **kwargs):
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return  # (saved on every login, by `update_last_login`)
+    # a new account (or changed email) must be able to log in right away
+    forget_unknown_email(instance.email)
+    # token_version / is_active / is_superuser may have changed
+    forget_token_version(instance.pk, using=using)
+    forget_user_permissions(instance.pk, using=using)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, using, **kwargs):
+    forget_token_version(instance.pk, using=using)
+    forget_user_permissions(instance.pk, using=using)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, using, **kwargs):
+    # group ids are embedded in tokens, reissue them
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            revoke_user_tokens(instance)
+            forget_user_permissions(instance.pk, using=using)
+        return
+    if action in ("post_add", "post_remove"):
+        users = User.objects.filter(pk__in=pk_set)
+    elif action == "pre_clear":  # (pk_set isn't given for clears)
+        users = instance.user_set.all()
+    else:
+        return
+    for user in users:
+        revoke_user_tokens(user)
+        forget_user_permissions(user.pk, using=using)
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def user_permissions_changed(sender, instance, action, reverse, using, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        if reverse:
+            forget_all_permissions(using=using)
+        else:
+            forget_user_permissions(instance.pk, using=using)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_permissions_changed(sender, action, using, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        forget_all_permissions(using=using)
+
+
+@receiver(post_migrate)  # (new permissions are bulk created, no post_save)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def permissions_changed(sender, using, **kwargs):
+    forget_all_permissions(using=using)
@@ -0,0 +1,167 @@
+import contextvars
+from unittest import mock
+
+from django.db import OperationalError, connections
+from django.test import SimpleTestCase, override_settings
+
+from coreapp.db_routers import ReplicaHealth, ReplicaRouter, pin_to_primary
+from coreapp.models import StatsRollup, User
+
+DB_ROUTING = {
+    "REPLICAS": {"replica1": 2, "replica2": 1},
+    "REPLICATED_MODELS": ["coreapp.StatsRollup"],
+}
+
+
+class FakeCursor:
+    def __init__(self, row):
+        self.row = row
+        self.sql = None
+
+    def execute(self, sql):
+        self.sql = sql
+
+    def fetchone(self):
+        return self.row
+
+
+class FakeConnection:
+    def __init__(self, row):
+        self.cursor_ = FakeCursor(row)
+        self.closed = False
+
+    def cursor(self):
+        return self.cursor_
+
+    def close(self):
+        self.closed = True
+
+
+@override_settings(DB_ROUTING=DB_ROUTING)
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        for health in self.router.health.values():
+            patcher = mock.patch.object(health, "check")
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for alias in self.router.weights:  # (connected)
+            patcher = mock.patch.object(connections[alias], "ensure_connection")
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # (each test in its own context: the pinning state is a context var)
+        self.context = contextvars.copy_context()
+
+    def read(self, model=StatsRollup):
+        return self.context.run(self.router.db_for_read, model)
+
+    def test_weighted_round_robin(self):
+        self.assertEqual(
+            [self.router.pick_replica() for _ in range(6)],
+            ["replica1", "replica2", "replica1", "replica1", "replica2", "replica1"],
+        )
+
+    def test_only_replicated_models_read_from_replicas(self):
+        self.assertIn(self.read(), ("replica1", "replica2"))
+        self.assertIsNone(self.read(User))
+
+    def test_reads_pinned_to_primary_after_write(self):
+        self.context.run(self.router.db_for_write, StatsRollup)
+        self.assertEqual(self.read(), "default")
+        self.assertIn(contextvars.copy_context().run(self.router.db_for_read, StatsRollup), ("replica1", "replica2"))
+
+    def test_pin_to_primary(self):
+        self.context.run(pin_to_primary, 60)
+        self.assertEqual(self.read(), "default")
+
+    def test_unhealthy_replicas_skipped(self):
+        self.router.health["replica1"].healthy = False
+        self.assertEqual({self.read() for _ in range(3)}, {"replica2"})
+        self.router.health["replica2"].healthy = False
+        self.assertEqual(self.read(), "default")
+
+    def test_replica_failing_to_connect_is_marked_down(self):
+        with mock.patch.object(connections["replica1"], "ensure_connection", side_effect=OperationalError("down")):
+            self.assertEqual(self.read(), "replica2")
+        self.assertFalse(self.router.health["replica1"].healthy)
+        self.assertEqual(self.read(), "replica2")
+
+    def test_all_replicas_failing_to_connect_fall_back_to_primary(self):
+        with mock.patch.object(connections["replica1"], "ensure_connection", side_effect=OperationalError("down")), \
+                mock.patch.object(connections["replica2"], "ensure_connection", side_effect=OperationalError("down")):
+            self.assertEqual(self.read(), "default")
+        self.assertFalse(any(health.healthy for health in self.router.health.values()))
+
+    def test_failed_query_marks_replica_down(self):
+        def execute(sql, params, many, context):
+            raise OperationalError("connection lost")
+
+        with self.assertRaises(OperationalError):
+            self.router._replica_query(execute, "SELECT 1", (), False, {"connection": connections["replica2"]})
+        self.assertFalse(self.router.health["replica2"].healthy)
+        self.assertTrue(self.router.health["replica1"].healthy)
+
+
+class ReplicaHealthTests(SimpleTestCase):
+    def check(self, row=None, vendor="postgresql", error=None):
+        health = ReplicaHealth("replica1", interval=10, max_lag_s=30)
+        conn = FakeConnection(row)
+        with mock.patch.object(type(connections["replica1"]), "vendor", vendor), \
+                mock.patch.object(health, "_connect", return_value=conn, side_effect=error):
+            health.check()
+        if error is None:
+            self.assertTrue(conn.closed)
+        return health
+
+    def test_caught_up(self):
+        health = self.check((True, 120.0))  # (no writes replayed for a while)
+        self.assertEqual((health.healthy, health.lag_s), (True, 0.0))
+
+    def test_lagging(self):
+        health = self.check((False, 45.0))
+        self.assertEqual((health.healthy, health.lag_s), (False, 45.0))
+        health = self.check((False, 5.0))
+        self.assertEqual((health.healthy, health.lag_s), (True, 5.0))
+
+    def test_down(self):
+        health = self.check(error=OperationalError("timeout expired"))
+        self.assertEqual((health.healthy, health.lag_s), (False, None))
+
+    def test_other_vendors(self):
+        health = self.check((1,), vendor="sqlite")
+        self.assertEqual((health.healthy, health.lag_s), (True, 0.0))
+
+    def test_connect_timeout(self):
+        health = ReplicaHealth("replica1", interval=10, max_lag_s=30, timeout_s=3)
+        with mock.patch.object(type(connections["replica1"]), "vendor", "postgresql"), \
+                mock.patch.object(connections["replica1"], "get_connection_params", return_value={"host": "db"}), \
+                mock.patch.object(connections["replica1"], "Database") as database:
+            health._connect()
+        database.connect.assert_called_once_with(host="db", connect_timeout=3)
+
+    def test_sqlite_check(self):
+        health = ReplicaHealth("replica1", interval=10, max_lag_s=30)
+        self.assertTrue(health.is_healthy())
+        self.assertEqual(health.lag_s, 0.0)
+
+
+class InstanceHintTests(SimpleTestCase):
+    def instance(self, db):
+        instance = StatsRollup()
+        instance._state.db = db
+        return instance
+
+    @override_settings(DB_ROUTING=DB_ROUTING)
+    def test_write_to_the_db_of_the_hinted_instance(self):
+        router = ReplicaRouter()
+        context = contextvars.copy_context()
+        self.assertEqual(context.run(router.db_for_write, StatsRollup, instance=self.instance("other")), "other")
+        # (replicas are read only)
+        self.assertEqual(context.run(router.db_for_write, StatsRollup, instance=self.instance("replica1")), "default")
+        self.assertEqual(context.run(router.db_for_write, StatsRollup), "default")
+
+    def test_relations_on_another_db(self):
+        router = ReplicaRouter()  # (no replicas)
+        db = contextvars.copy_context().run(router.db_for_write, StatsRollup, instance=self.instance("other"))
+        self.assertEqual(db, "other")
+        self.assertTrue(router.allow_relation(self.instance(db), self.instance("other")))
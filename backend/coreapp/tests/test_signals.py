@@ -0,0 +1,63 @@
+from django.contrib.auth.models import Group, update_last_login
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TransactionTestCase
+
+from coreapp.auth import _permissions_key, get_cached_permissions
+from coreapp.models import User
+from coreapp.token_auth import _version_key, get_token_version, revoke_user_tokens
+
+
+class TokenVersionInvalidationTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="user@example.com")
+        self.key = _version_key(self.user.pk)
+
+    def test_forgotten_on_commit(self):
+        get_token_version(self.user.pk)
+        with transaction.atomic():
+            self.user.set_password("new password")
+            self.user.save()
+            self.assertIsNotNone(cache.get(self.key))  # (until the new version is committed)
+        self.assertIsNone(cache.get(self.key))
+        self.assertEqual(get_token_version(self.user.pk), 1)
+
+    def test_kept_on_rollback(self):
+        get_token_version(self.user.pk)
+        with self.assertRaises(ZeroDivisionError), transaction.atomic():
+            revoke_user_tokens(self.user)
+            1 / 0
+        self.assertEqual(cache.get(self.key), 0)
+
+    def test_revoke_user_tokens(self):
+        get_token_version(self.user.pk)
+        revoke_user_tokens(self.user)
+        self.assertEqual(self.user.token_version, 1)
+        self.assertEqual(get_token_version(self.user.pk), 1)
+
+
+class PermissionInvalidationTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="user@example.com")
+        self.key = _permissions_key(self.user.pk)
+        get_cached_permissions(self.user)
+        get_token_version(self.user.pk)
+
+    def test_forgotten_on_commit(self):
+        group = Group.objects.create(name="editors")
+        with transaction.atomic():
+            self.user.groups.add(group)
+            self.assertIsNotNone(cache.get(self.key))
+        self.assertIsNone(cache.get(self.key))
+
+    def test_kept_on_login(self):
+        update_last_login(None, self.user)
+        self.assertIsNotNone(cache.get(self.key))
+        self.assertIsNotNone(cache.get(_version_key(self.user.pk)))
+
+    def test_forgotten_on_other_saves(self):
+        self.user.full_name = "User"
+        self.user.save(update_fields=["full_name", "last_login"])
+        self.assertIsNone(cache.get(self.key))
@@ -0,0 +1,48 @@
+import datetime as dtm
+
+from django.test import TestCase
+from django.utils import timezone
+
+from coreapp.models import HourlyStatsRollup, StatsRollupWatermark, User
+from coreapp.stats_rollups import refresh_source
+
+SOURCE = {"model": "coreapp.User", "timestamp_field": "date_joined"}
+
+
+def total_count():
+    return sum(HourlyStatsRollup.objects.filter(source="users").values_list("count", flat=True))
+
+
+class RefreshSourceTests(TestCase):
+    def create_user(self, pk, date_joined=None):
+        return User.objects.create(pk=pk, email=f"user{pk}@example.com", date_joined=date_joined or timezone.now())
+
+    def test_counts_new_rows(self):
+        self.create_user(1)
+        self.create_user(2)
+        refresh_source("users", SOURCE)
+        self.assertEqual(total_count(), 2)
+        self.assertEqual(StatsRollupWatermark.objects.get(source="users").last_pk, 2)
+        self.create_user(3)
+        refresh_source("users", SOURCE)
+        self.assertEqual(total_count(), 3)
+
+    def test_counts_rows_committed_late(self):
+        self.create_user(1)
+        self.create_user(4)
+        refresh_source("users", SOURCE)
+        self.assertEqual(total_count(), 2)
+        self.create_user(3)  # (pk below the watermark, as committed after the refresh)
+        refresh_source("users", SOURCE)
+        self.assertEqual(total_count(), 3)
+
+    def test_old_rows_below_the_watermark_need_a_full_refresh(self):
+        old = timezone.now() - dtm.timedelta(days=3)
+        self.create_user(1, old)
+        self.create_user(4, old)
+        refresh_source("users", SOURCE)
+        self.create_user(3, old)
+        refresh_source("users", SOURCE)
+        self.assertEqual(total_count(), 2)
+        refresh_source("users", SOURCE, full=True)
+        self.assertEqual(total_count(), 3)
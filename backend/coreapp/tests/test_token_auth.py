@@ -0,0 +1,53 @@
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.test import TransactionTestCase
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from coreapp.models import User
+from coreapp.token_auth import ClaimsTokenObtainPairSerializer, JWTTokenUserAuthentication
+
+
+class TokenRevocationTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="admin@example.com", is_staff=True, is_superuser=True)
+        self.refresh = ClaimsTokenObtainPairSerializer.get_token(self.user)
+        self.auth = JWTTokenUserAuthentication()
+
+    def authenticate(self, token):
+        return self.auth.get_user(self.auth.get_validated_token(str(token)))
+
+    def assertRevoked(self, token):
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_demoted_superuser(self):
+        self.assertTrue(self.authenticate(self.refresh.access_token).has_perm("coreapp.delete_user"))
+        user = User.objects.get(pk=self.user.pk)
+        user.is_superuser = False
+        user.save()
+        self.assertRevoked(self.refresh.access_token)
+        # (nor can the refresh token make new access tokens with the old claims)
+        self.assertRevoked(RefreshToken(str(self.refresh)).access_token)
+
+    def test_claims_changed_with_update_fields(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.is_staff = False
+        user.save(update_fields=["is_staff"])
+        self.assertRevoked(self.refresh.access_token)
+
+    def test_email_changed(self):
+        self.user.email = "other@example.com"
+        self.user.save()
+        self.assertRevoked(self.refresh.access_token)
+
+    def test_groups_changed(self):
+        self.user.groups.add(Group.objects.create(name="editors"))
+        self.assertRevoked(self.refresh.access_token)
+
+    def test_other_changes_keep_tokens(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.full_name = "Admin"
+        user.save()
+        self.assertEqual(self.authenticate(self.refresh.access_token).pk, self.user.pk)
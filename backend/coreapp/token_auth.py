@@ -0,0 +1,215 @@
+"""
+Stateless JWT authentication: API requests authenticated with an access token
+get a `TokenUser` built from the token's claims, WITHOUT loading the `User`
+row from the DB.
+
+Tokens issued by the `api/v1/token/` views carry, besides the user id:
+`email`, `is_staff`, `is_superuser`, `groups` (ids) and `ver` (the user's
+`token_version`). Revocation:
+- `revoke_user_tokens(user)` (called automatically when a user's password,
+  email, is_staff, is_superuser or groups change, or they're deactivated)
+  bumps the user's `token_version`, rejecting all tokens issued before,
+  refresh tokens and the access tokens made from them included
+- `deny_token(token)` rejects a single token (eg. on logout) until it expires
+
+Both are checked through the Django cache (one cache hit per request, the DB
+is only read on a cache miss), so use a shared cache (eg. Redis) when running
+more than one process, with the default per-process LocMemCache a revocation
+only reaches the other processes when their cached version expires
+(`JWT_TOKEN_VERSION_CACHE_TTL`).
+
+NOTE: changes bypassing `User.save()` and the groups' m2m signals (eg.
+`User.objects.update(is_superuser=False)`) don't revoke anything: the stale
+claims stay valid, through refreshes (they're copied), for up to
+`REFRESH_TOKEN_LIFETIME`, call `revoke_user_tokens()` after them.
+
+Usage
+-----
+
+Opt in by replacing simplejwt's authentication class in settings:
+
+    REST_FRAMEWORK = {
+        "DEFAULT_AUTHENTICATION_CLASSES": (
+            "coreapp.token_auth.JWTTokenUserAuthentication",
+            ...
+
+`request.user.get_db_user()` gives the full `User` when a view needs it.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import PermissionsMixin
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+TOKEN_VERSION_CACHE_TTL = getattr(settings, "JWT_TOKEN_VERSION_CACHE_TTL", 300)
+
+UserModel = get_user_model()
+
+
+# Issuing
+#####################################################################
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        # (copied to the access tokens made from this refresh token too)
+        token["email"] = user.email
+        token["is_staff"] = user.is_staff
+        token["is_superuser"] = user.is_superuser
+        token["groups"] = list(user.groups.values_list("id", flat=True))
+        token["ver"] = user.token_version
+        return token
+
+
+# Revocation
+#####################################################################
+
+
+def _version_key(user_id):
+    return f"auth:token-version:{user_id}"
+
+
+def _denied_key(jti):
+    return f"auth:denied-token:{jti}"
+
+
+def get_token_version(user_id):
+    """Current `token_version` of a user (None if there's no such user)."""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = (
+            UserModel._default_manager.filter(pk=user_id, is_active=True)
+            .values_list("token_version", flat=True)
+            .first()
+        )
+        # (-1 caches "no such / inactive user", no token has a negative version)
+        cache.set(key, -1 if version is None else version, TOKEN_VERSION_CACHE_TTL)
+    return None if version == -1 else version
+
+
+def revoke_user_tokens(user):
+    """Reject all tokens issued to `user` so far."""
+    using = router.db_for_write(UserModel, instance=user)
+    UserModel._default_manager.db_manager(using).filter(pk=user.pk).update(token_version=F("token_version") + 1)
+    user.refresh_from_db(using=using, fields=["token_version"])
+    forget_token_version(user.pk, using=using)
+
+
+def forget_token_version(user_id, using=None):
+    """Drop the cached version of a user once the current transaction (on DB
+    `using`) commits: dropped earlier, it could be cached again from the
+    version still committed, until the TTL.
+    """
+    transaction.on_commit(lambda: cache.delete(_version_key(user_id)), using=using)
+
+
+def deny_token(token):
+    """Reject a single (validated) token until it expires."""
+    jti = token.get(api_settings.JTI_CLAIM)
+    if jti is not None:
+        ttl = max(int(token["exp"] - token.current_time.timestamp()), 1)
+        cache.set(_denied_key(jti), True, ttl)
+
+
+# Authenticating
+#####################################################################
+
+
+class TokenUser:
+    """Stateless stand-in for `User`, backed by a validated token's claims.
+
+    Permission checks go through the auth backends (so the permission cache
+    of `coreapp.auth`), anything else not in the token loads the real user
+    (once per request), see `get_db_user()`.
+    """
+    __slots__ = (
+        "id", "email", "is_staff", "is_superuser", "group_ids", "token", "_db_user",
+        # (ModelBackend's per-instance permission caches)
+        "_perm_cache", "_user_perm_cache", "_group_perm_cache",
+    )
+
+    is_active = True
+    is_anonymous = False
+    is_authenticated = True
+
+    def __init__(self, token):
+        self.id = token[api_settings.USER_ID_CLAIM]
+        self.email = token.get("email", "")
+        self.is_staff = token.get("is_staff", False)
+        self.is_superuser = token.get("is_superuser", False)
+        self.group_ids = frozenset(token.get("groups", ()))
+        self.token = token
+        self._db_user = None
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.email
+
+    def __repr__(self):
+        return f"<TokenUser {self.id}: {self.email}>"
+
+    def __eq__(self, other):
+        return isinstance(other, (TokenUser, UserModel)) and self.pk == other.pk
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def get_username(self):
+        return self.email
+
+    def get_db_user(self):
+        if self._db_user is None:
+            self._db_user = UserModel._default_manager.get(pk=self.id)
+        return self._db_user
+
+    get_user_permissions = PermissionsMixin.get_user_permissions
+    get_group_permissions = PermissionsMixin.get_group_permissions
+    get_all_permissions = PermissionsMixin.get_all_permissions
+    has_perm = PermissionsMixin.has_perm
+    has_perms = PermissionsMixin.has_perms
+    has_module_perms = PermissionsMixin.has_module_perms
+
+    def __getattr__(self, name):
+        # anything else (full_name, groups...) comes from the DB user
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.get_db_user(), name)
+
+
+class JWTTokenUserAuthentication(JWTAuthentication):
+    """simplejwt's `JWTAuthentication`, but returning a `TokenUser` instead of
+    fetching the user from the DB. Tokens without our claims (issued before
+    this was enabled) fall back to the DB user.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        if jti is not None and cache.get(_denied_key(jti)):
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+
+        if "ver" not in validated_token:
+            return super().get_user(validated_token)
+
+        version = get_token_version(user_id)
+        if version is None:
+            raise AuthenticationFailed(_("User not found or inactive"), code="user_inactive")
+        if validated_token["ver"] != version:
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+        return TokenUser(validated_token)
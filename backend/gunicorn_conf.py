@@ -1,7 +1,68 @@
 # FROM: https://raw.githubusercontent.com/tiangolo/uvicorn-gunicorn-docker/master/python3.7/gunicorn_conf.py
+# (extended: sized by cgroup CPU / memory limits and the DB connection budget,
+# preloading, worker recycling)
+#
+# Workers = the smallest of:
+# - CPU:    WORKERS_PER_CORE * usable cores (cgroup CPU quota / CPU affinity,
+#           not the host's core count), at least 2
+# - memory: (memory limit - MEMORY_RESERVE_MB) / WORKER_MEMORY_MB
+# - DB:     DB_MAX_CONNECTIONS / (request threads * DB_CONNECTIONS_PER_THREAD),
+#           ie. the part of the DB server's max_connections this deployment
+#           may use (each request thread keeps its own connection, see
+#           CONN_MAX_AGE; with the pooled DB backend set
+#           DB_CONNECTIONS_PER_THREAD so that request threads * it = its POOL
+#           MAX_SIZE). Request threads: ASGI_THREADS (default 10, see
+#           `backend/asgi_handler.py`) for uvicorn workers, else THREADS
+# ...or exactly WEB_CONCURRENCY if set. MAX_WORKERS caps it.
+import gc
 import json
+import math
 import multiprocessing
 import os
+import sys
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _cgroup_cpu_limit():
+    """CPUs allowed by the cgroup CPU quota (v2 or v1), or None."""
+    cpu_max = _read("/sys/fs/cgroup/cpu.max")  # v2: "<quota|max> <period>"
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    quota = _read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")  # v1
+    period = _read("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def _memory_limit_bytes():
+    """Memory allowed by the cgroup (v2 or v1), else the machine's RAM."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        limit = _read(path)
+        # (v1 "unlimited" is a huge number instead of "max")
+        if limit and limit != "max" and int(limit) < 2 ** 60:
+            return int(limit)
+    meminfo = _read("/proc/meminfo") or ""
+    for line in meminfo.splitlines():
+        if line.startswith("MemTotal:"):
+            return int(line.split()[1]) * 1024
+    return None
+
+
+def _env_int(name, default=None):
+    value = os.getenv(name)
+    return int(value) if value else default
+
 
 workers_per_core_str = os.getenv("WORKERS_PER_CORE", "1")
 web_concurrency_str = os.getenv("WEB_CONCURRENCY", None)
@@ -14,29 +75,141 @@ if bind_env:
 else:
     use_bind = f"{host}:{port}"
 
-cores = multiprocessing.cpu_count()
+# NOTE: THREADS only matters for sync (gthread) workers, uvicorn workers run
+# their requests in ASGI_THREADS threads, plus ASYNC_DB_THREADS for the ORM
+# calls of async views (same env vars as in the settings)
+threads_per_worker = _env_int("THREADS", 1)
+asgi_threads = _env_int("ASGI_THREADS", 10)
+async_db_threads = _env_int("ASYNC_DB_THREADS", 10)
+max_workers = _env_int("MAX_WORKERS")
+worker_memory_mb = _env_int("WORKER_MEMORY_MB", 200)
+memory_reserve_mb = _env_int("MEMORY_RESERVE_MB", 256)
+db_max_connections = _env_int("DB_MAX_CONNECTIONS")
+db_connections_per_thread = _env_int("DB_CONNECTIONS_PER_THREAD", 1)
+
+# CPU
+host_cores = multiprocessing.cpu_count()
+try:
+    affinity_cores = len(os.sched_getaffinity(0))
+except AttributeError:  # (not on macOS)
+    affinity_cores = host_cores
+cgroup_cpus = _cgroup_cpu_limit()
+cores = affinity_cores if cgroup_cpus is None else max(min(affinity_cores, math.ceil(cgroup_cpus)), 1)
 workers_per_core = float(workers_per_core_str)
 default_web_concurrency = workers_per_core * cores
+cpu_workers = max(int(default_web_concurrency), 2)
+
+# memory
+memory_limit = _memory_limit_bytes()
+memory_workers = None
+if memory_limit is not None:
+    memory_workers = max((memory_limit // 2 ** 20 - memory_reserve_mb) // worker_memory_mb, 1)
+
+# DB connections
+# (uvicorn workers unless WORKER_CLASS is set, keep it the same as any `-k`)
+worker_class_str = os.getenv("WORKER_CLASS", "uvicorn.workers.UvicornWorker")
+if "uvicorn" in worker_class_str.lower():
+    request_threads = asgi_threads + async_db_threads
+else:
+    request_threads = threads_per_worker
+db_workers = None
+if db_max_connections is not None:
+    db_workers = max(db_max_connections // (request_threads * db_connections_per_thread), 1)
+
 if web_concurrency_str:
     web_concurrency = int(web_concurrency_str)
     assert web_concurrency > 0
+    limited_by = "WEB_CONCURRENCY"
 else:
-    web_concurrency = max(int(default_web_concurrency), 2)
+    limits = {"cpu": cpu_workers, "memory": memory_workers, "db_connections": db_workers}
+    limited_by, web_concurrency = min(
+        ((k, v) for k, v in limits.items() if v is not None), key=lambda kv: kv[1]
+    )
+if max_workers is not None and web_concurrency > max_workers:
+    web_concurrency = max_workers
+    limited_by = "MAX_WORKERS"
 
 # Gunicorn config variables
 loglevel = use_loglevel
 workers = web_concurrency
+worker_class = worker_class_str
+threads = threads_per_worker
 bind = use_bind
-keepalive = 120
+keepalive = _env_int("KEEP_ALIVE", 120)
+timeout = _env_int("TIMEOUT", 60)
+graceful_timeout = _env_int("GRACEFUL_TIMEOUT", 30)
+# recycle workers (against slow leaks / fragmentation), jittered so they
+# don't all restart at the same time
+max_requests = _env_int("MAX_REQUESTS", 10000)
+max_requests_jitter = _env_int("MAX_REQUESTS_JITTER", max_requests // 10)
+# PRELOAD=1: load the app once in the master, workers share its memory
+# copy-on-write. NOTE: a HUP reload then restarts the workers with the code
+# the master loaded, deploy new code with a restart (or USR2, see gunicorn's
+# docs on upgrading the binary) instead
+preload_app = os.getenv("PRELOAD", "0") == "1"
+# worker heartbeat files on tmpfs (a disk backed /tmp can stall them)
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
 errorlog = "-"
+# build URL resolver, templates, API schema... before the first request (see
+# `backend/warmup.py`), in the master if preloading, else in each worker
+warmup = os.getenv("WARMUP", "0") == "1"
+
+
+def _warmup():
+    from backend.warmup import warmup as run_warmup
+    run_warmup()
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    if warmup:
+        _warmup()
+    # DB connections opened while loading the app must not be shared by workers
+    if "django.db" in sys.modules:
+        from django.db import connections
+        connections.close_all()
+    if "backend.db.pool" in sys.modules:
+        from backend.db.pool import close_all_pools
+        close_all_pools()
+    # keep the GC of the workers from touching (and so copying) the pages of
+    # everything loaded in the master
+    gc.collect()
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    if warmup and not preload_app:
+        _warmup()
+
 
 # For debugging and testing
 log_data = {
     "loglevel": loglevel,
     "workers": workers,
+    "worker_class": worker_class,
+    "threads": threads,
     "bind": bind,
+    "timeout": timeout,
+    "graceful_timeout": graceful_timeout,
+    "keepalive": keepalive,
+    "max_requests": max_requests,
+    "max_requests_jitter": max_requests_jitter,
+    "preload_app": preload_app,
+    "warmup": warmup,
     # Additional, non-gunicorn variables
+    "workers_limited_by": limited_by,
     "workers_per_core": workers_per_core,
+    "cores": cores,
+    "host_cores": host_cores,
+    "cgroup_cpus": cgroup_cpus,
+    "cpu_workers": cpu_workers,
+    "memory_limit_mb": memory_limit // 2 ** 20 if memory_limit else None,
+    "memory_workers": memory_workers,
+    "db_max_connections": db_max_connections,
+    "request_threads": request_threads,
+    "db_connections_total": workers * request_threads * db_connections_per_thread,
+    "db_workers": db_workers,
     "host": host,
     "port": port,
 }